@@ -1706,6 +1706,60 @@ def perfmergecopies(ui, repo, **opts):
     fm.end()
 
 
+@command(
+    b'perf::simplemerge|perfsimplemerge',
+    [
+        (b'r', b'rev', b'.', b'rev to merge against'),
+        (b'', b'from', b'', b'rev to merge from'),
+        (b'', b'base', b'', b'the revision to use as base'),
+        (b'', b'chunked', False, b'use the chunked merge of large files'),
+        (b'', b'memory', False, b'report the peak memory of one merge'),
+    ]
+    + formatteropts,
+    b'FILE',
+)
+def perfsimplemerge(ui, repo, file_, **opts):
+    """benchmark the 3-way merge of the content of a file
+
+    The merge is rendered with conflict markers, like the ``:merge`` internal
+    tool. With ``--chunked``, the texts are not split into lists of lines (see
+    ``experimental.merge.chunked``).
+
+    With ``--memory``, the peak of the memory allocated by one merge is
+    reported before the timing.
+    """
+    from mercurial import simplemerge
+
+    opts = _byteskwargs(opts)
+    timer, fm = gettimer(ui, opts)
+    wctx, rctx, ancestor = _getmergerevs(repo, opts)
+    basetext, atext, btext = [c[file_].data() for c in (ancestor, wctx, rctx)]
+    merge3 = simplemerge.Merge3Text
+    if opts[b'chunked']:
+        merge3 = getattr(simplemerge, 'ChunkedMerge3Text', None)
+        if merge3 is None:
+            raise error.Abort(b'this version has no chunked merge')
+
+    def d():
+        m3 = merge3(basetext, atext, btext)
+        lines, conflicts = simplemerge.render_minimized(m3)
+        b''.join(lines)
+
+    if opts[b'memory']:
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            d()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        ui.writenoi18n(b'peak memory: %d bytes\n' % peak)
+
+    timer(d)
+    fm.end()
+
+
 @command(b'perf::pathcopies|perfpathcopies', [], b"REV REV")
 def perfpathcopies(ui, repo, rev1, rev2, **opts):
     """benchmark the copy tracing logic"""
@@ -2909,12 +2963,14 @@ def perffncacheencode(ui, repo, **opts):
     fm.end()
 
 
-def _bdiffworker(q, blocks, xdiff, ready, done):
+def _bdiffworker(q, blocks, xdiff, ready, done, histogram=False):
     while not done.is_set():
         pair = q.get()
         while pair is not None:
             if xdiff:
                 mdiff.bdiff.xdiffblocks(*pair)
+            elif histogram:
+                mdiff.bdiff.histogramblocks(*pair)
             elif blocks:
                 mdiff.bdiff.blocks(*pair)
             else:
@@ -2952,6 +3008,7 @@ def _manifestrevision(repo, mnode):
         (b'', b'threads', 0, b'number of thread to use (disable with 0)'),
         (b'', b'blocks', False, b'test computing diffs into blocks'),
         (b'', b'xdiff', False, b'use xdiff algorithm'),
+        (b'', b'histogram', False, b'use histogram algorithm'),
     ],
     b'-c|-m|FILE REV',
 )
@@ -2971,6 +3028,8 @@ def perfbdiff(ui, repo, file_, rev=None, count=None, threads=0, **opts):
 
     if opts[b'xdiff'] and not opts[b'blocks']:
         raise error.CommandError(b'perfbdiff', b'--xdiff requires --blocks')
+    if opts[b'histogram'] and not opts[b'blocks']:
+        raise error.CommandError(b'perfbdiff', b'--histogram requires --blocks')
 
     if opts[b'alldata']:
         opts[b'changelog'] = True
@@ -2982,6 +3041,7 @@ def perfbdiff(ui, repo, file_, rev=None, count=None, threads=0, **opts):
 
     blocks = opts[b'blocks']
     xdiff = opts[b'xdiff']
+    histogram = opts[b'histogram']
     textpairs = []
 
     r = cmdutil.openrevlog(repo, b'perfbdiff', file_, opts)
@@ -3015,6 +3075,8 @@ def perfbdiff(ui, repo, file_, rev=None, count=None, threads=0, **opts):
             for pair in textpairs:
                 if xdiff:
                     mdiff.bdiff.xdiffblocks(*pair)
+                elif histogram:
+                    mdiff.bdiff.histogramblocks(*pair)
                 elif blocks:
                     mdiff.bdiff.blocks(*pair)
                 else:
@@ -3028,7 +3090,8 @@ def perfbdiff(ui, repo, file_, rev=None, count=None, threads=0, **opts):
         done = threading.Event()
         for i in _xrange(threads):
             threading.Thread(
-                target=_bdiffworker, args=(q, blocks, xdiff, ready, done)
+                target=_bdiffworker,
+                args=(q, blocks, xdiff, ready, done, histogram),
             ).start()
         q.join()
 
@@ -3406,6 +3469,7 @@ def perfrevlogindex(ui, repo, file_=None, **opts):
         (b'd', b'dist', 100, b'distance between the revisions'),
         (b's', b'startrev', 0, b'revision to start reading at'),
         (b'', b'reverse', False, b'read in reverse'),
+        (b'', b'read-stats', False, b'display statistics about data reads'),
     ],
     b'-c|-m|FILE',
 )
@@ -3418,6 +3482,11 @@ def perfrevlogrevisions(
     the specified revlog.
 
     The start revision can be defined via ``-s/--startrev``.
+
+    With ``--read-stats``, the statistics of the data file reads (cache hits
+    and misses, bytes read) and of the revision cache accumulated over all
+    the runs are displayed afterward, when the Mercurial version provides
+    them.
     """
     opts = _byteskwargs(opts)
 
@@ -3447,6 +3516,21 @@ def perfrevlogrevisions(
     timer(d)
     fm.end()
 
+    if opts[b'read_stats']:
+        inner = getattr(rl, '_inner', None)
+        segmentfile = getattr(inner, '_segmentfile', None)
+        read_stats = getattr(segmentfile, 'read_stats', None)
+        if read_stats is None:
+            ui.warn((b'read statistics are not available\n'))
+        else:
+            stats = read_stats()
+            revision_cache = getattr(inner, '_revision_cache', None)
+            if revision_cache is not None:
+                owner = inner.revision_cache_owner
+                stats.update(revision_cache.stats(owner))
+            for key, value in sorted(stats.items()):
+                ui.write(b'%s: %d\n' % (key, value))
+
 
 @command(
     b'perf::revlogwrite|perfrevlogwrite',
@@ -246,6 +246,14 @@ be controlled by the `clone-bundles.trigger.below-bundled-ratio` option
     trigger.below-bundled-ratio=0.95
     trigger.revs=1000
 
+New bundles can also be generated once the store of the repository grew by a
+given amount of data since the last bundle, whatever the number of revisions
+involved, with the `clone-bundles.trigger.bytes` option (disabled by
+default)::
+
+    [clone-bundles]
+    trigger.bytes=100MB
+
 This logic can be manually triggered using the `admin::clone-bundles-refresh`
 command, or automatically on each repository change if
 `clone-bundles.auto-generate.on-change` is set to `yes`::
@@ -254,6 +262,9 @@ command, or automatically on each repository change if
     auto-generate.on-change=yes
     auto-generate.formats= zstd-v2, gzip-v2
 
+The `admin::clone-bundles-status` command reports how far behind the
+repository the advertised bundles are, and which ones would be regenerated.
+
 Automatic Inline serving
 ........................
 
@@ -316,12 +327,14 @@ from mercurial.i18n import _
 
 from mercurial import (
     bundlecaches,
+    cmdutil,
     commands,
     error,
     extensions,
     localrepo,
     lock,
     node,
+    pycompat,
     registrar,
     util,
     wireprotov1server,
@@ -366,6 +379,7 @@ configitem(b'clone-bundles', b'auto-generate.formats', default=list)
 configitem(b'clone-bundles', b'auto-generate.serve-inline', default=False)
 configitem(b'clone-bundles', b'trigger.below-bundled-ratio', default=0.95)
 configitem(b'clone-bundles', b'trigger.revs', default=1000)
+configitem(b'clone-bundles', b'trigger.bytes', default=0)
 
 configitem(b'clone-bundles', b'upload-command', default=None)
 
@@ -378,6 +392,12 @@ configitem(b'devel', b'debug.clonebundles', default=False)
 
 # category for the post-close transaction hooks
 CAT_POSTCLOSE = b"clonebundles-autobundles"
+# category for the transaction hooks tracking the store size, its post-close
+# hook runs before the CAT_POSTCLOSE one
+CAT_STORE_GROWTH = b"clonebundles-00-store-growth"
+
+# the size of the store, with the tip it was computed for (in .hg/cache)
+STORE_SIZE_FILE = b"clonebundles-store-size"
 
 # template for bundle file names
 BUNDLE_MASK = (
@@ -396,17 +416,19 @@ class BundleBase(object):
     :revs:        the number of revisions in the repo at bundle creation time
     :tip_rev:     the rev-num of the tip revision
     :tip_node:    the node id of the tip-most revision in the bundle
+    :store_size:  the size of the store at bundle creation time, if known
 
     :ready:       True if the bundle is ready to be served
     """
 
     ready = False
 
-    def __init__(self, bundle_type, revs, tip_rev, tip_node):
+    def __init__(self, bundle_type, revs, tip_rev, tip_node, store_size=None):
         self.bundle_type = bundle_type
         self.revs = revs
         self.tip_rev = tip_rev
         self.tip_node = tip_node
+        self.store_size = store_size
 
     def valid_for(self, repo):
         """is this bundle applicable to the current repository
@@ -438,7 +460,16 @@ class RequestedBundle(BundleBase):
     :op_id:       a "unique" identifier for the operation triggering the change
     """
 
-    def __init__(self, bundle_type, revs, tip_rev, tip_node, head_revs, op_id):
+    def __init__(
+        self,
+        bundle_type,
+        revs,
+        tip_rev,
+        tip_node,
+        head_revs,
+        op_id,
+        store_size=None,
+    ):
         self.head_revs = head_revs
         self.op_id = op_id
         super(RequestedBundle, self).__init__(
@@ -446,6 +477,7 @@ class RequestedBundle(BundleBase):
             revs,
             tip_rev,
             tip_node,
+            store_size,
         )
 
     @property
@@ -488,6 +520,7 @@ class RequestedBundle(BundleBase):
             hostname,
             pid,
             file_path,
+            self.store_size,
         )
 
 
@@ -506,19 +539,31 @@ class GeneratingBundle(BundleBase):
     ready = False
 
     def __init__(
-        self, bundle_type, revs, tip_rev, tip_node, hostname, pid, filepath
+        self,
+        bundle_type,
+        revs,
+        tip_rev,
+        tip_node,
+        hostname,
+        pid,
+        filepath,
+        store_size=None,
     ):
         self.hostname = hostname
         self.pid = pid
         self.filepath = filepath
         super(GeneratingBundle, self).__init__(
-            bundle_type, revs, tip_rev, tip_node
+            bundle_type, revs, tip_rev, tip_node, store_size
         )
 
     @classmethod
     def from_line(cls, line):
         """create an object by deserializing a line from AUTO_GEN_FILE"""
-        assert line.startswith(b'PENDING-v1 ')
+        assert line.startswith((b'PENDING-v1 ', b'PENDING-v2 '))
+        fields = line.split()
+        store_size = None
+        if fields[0] == b'PENDING-v2':
+            store_size = int(fields.pop())
         (
             __,
             bundle_type,
@@ -528,14 +573,21 @@ class GeneratingBundle(BundleBase):
             hostname,
             pid,
             filepath,
-        ) = line.split()
+        ) = fields
         hostname = util.urlreq.unquote(hostname)
         filepath = util.urlreq.unquote(filepath)
         revs = int(revs)
         tip_rev = int(tip_rev)
         pid = int(pid)
         return cls(
-            bundle_type, revs, tip_rev, tip_node, hostname, pid, filepath
+            bundle_type,
+            revs,
+            tip_rev,
+            tip_node,
+            hostname,
+            pid,
+            filepath,
+            store_size,
         )
 
     def to_line(self):
@@ -550,6 +602,10 @@ class GeneratingBundle(BundleBase):
             self.pid,
             util.urlreq.quote(self.filepath),
         )
+        if self.store_size is not None:
+            # v1 lines stay readable by older versions
+            templ = b"PENDING-v2 %s %d %d %s %s %d %s %d"
+            data += (self.store_size,)
         return templ % data
 
     def __eq__(self, other):
@@ -568,6 +624,7 @@ class GeneratingBundle(BundleBase):
             self.tip_node,
             url,
             basename,
+            self.store_size,
         )
 
 
@@ -586,18 +643,29 @@ class GeneratedBundle(BundleBase):
     ready = True
 
     def __init__(
-        self, bundle_type, revs, tip_rev, tip_node, file_url, basename
+        self,
+        bundle_type,
+        revs,
+        tip_rev,
+        tip_node,
+        file_url,
+        basename,
+        store_size=None,
     ):
         self.file_url = file_url
         self.basename = basename
         super(GeneratedBundle, self).__init__(
-            bundle_type, revs, tip_rev, tip_node
+            bundle_type, revs, tip_rev, tip_node, store_size
         )
 
     @classmethod
     def from_line(cls, line):
         """create an object by deserializing a line from AUTO_GEN_FILE"""
-        assert line.startswith(b'DONE-v1 ')
+        assert line.startswith((b'DONE-v1 ', b'DONE-v2 '))
+        fields = line.split()
+        store_size = None
+        if fields[0] == b'DONE-v2':
+            store_size = int(fields.pop())
         (
             __,
             bundle_type,
@@ -606,11 +674,19 @@ class GeneratedBundle(BundleBase):
             tip_node,
             file_url,
             basename,
-        ) = line.split()
+        ) = fields
         revs = int(revs)
         tip_rev = int(tip_rev)
         file_url = util.urlreq.unquote(file_url)
-        return cls(bundle_type, revs, tip_rev, tip_node, file_url, basename)
+        return cls(
+            bundle_type,
+            revs,
+            tip_rev,
+            tip_node,
+            file_url,
+            basename,
+            store_size,
+        )
 
     def to_line(self):
         """serialize the object to include as a line in AUTO_GEN_FILE"""
@@ -623,6 +699,10 @@ class GeneratedBundle(BundleBase):
             util.urlreq.quote(self.file_url),
             self.basename,
         )
+        if self.store_size is not None:
+            # v1 lines stay readable by older versions
+            templ = b"DONE-v2 %s %d %d %s %s %s %d"
+            data += (self.store_size,)
         return templ % data
 
     def manifest_line(self):
@@ -642,9 +722,9 @@ def parse_auto_gen(content):
     """parse the AUTO_GEN_FILE to return a list of Bundle object"""
     bundles = []
     for line in content.splitlines():
-        if line.startswith(b'PENDING-v1 '):
+        if line.startswith((b'PENDING-v1 ', b'PENDING-v2 ')):
             bundles.append(GeneratingBundle.from_line(line))
-        elif line.startswith(b'DONE-v1 '):
+        elif line.startswith((b'DONE-v1 ', b'DONE-v2 ')):
             bundles.append(GeneratedBundle.from_line(line))
     return bundles
 
@@ -849,17 +929,24 @@ def auto_bundle_needed_actions(repo, bundles, op_id):
         repo.ui.config(b'clone-bundles', b'trigger.below-bundled-ratio')
     )
     abs_revs = repo.ui.configint(b'clone-bundles', b'trigger.revs')
+    abs_bytes = repo.ui.configbytes(b'clone-bundles', b'trigger.bytes')
     revs = len(repo.changelog)
+    size = None
+    if abs_bytes:
+        size = store_size(repo)
     generic_data = {
         'revs': revs,
         'head_revs': repo.changelog.headrevs(),
         'tip_rev': repo.changelog.tiprev(),
         'tip_node': node.hex(repo.changelog.tip()),
         'op_id': op_id,
+        'store_size': size,
     }
     for t in targets:
         t = bundlecaches.parsebundlespec(repo, t, strict=False).as_spec()
-        if new_bundle_needed(repo, bundles, ratio, abs_revs, t, revs):
+        if new_bundle_needed(
+            repo, bundles, ratio, abs_revs, t, revs, abs_bytes, size
+        ):
             data = generic_data.copy()
             data['bundle_type'] = t
             b = RequestedBundle(**data)
@@ -868,14 +955,110 @@ def auto_bundle_needed_actions(repo, bundles, op_id):
     return create_bundles, delete_bundles
 
 
-def new_bundle_needed(repo, bundles, ratio, abs_revs, bundle_type, revs):
-    """consider the current cached content and trigger new bundles if needed"""
+def _store_key(repo):
+    return node.hex(repo.unfiltered().changelog.tip())
+
+
+def _read_store_size(repo):
+    """return the cached (size, key) of the store, or None"""
+    try:
+        size, key = repo.cachevfs.read(STORE_SIZE_FILE).split()
+        return int(size), key
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_store_size(repo, size, key):
+    try:
+        with repo.cachevfs(STORE_SIZE_FILE, b'w', atomictemp=True) as fp:
+            fp.write(b'%d %s\n' % (size, key))
+    except (IOError, OSError, error.Abort) as inst:
+        repo.ui.debug(b"couldn't write store size: %s\n" % inst)
+
+
+def store_size(repo):
+    """the size of the files of the store of the repository
+
+    The size is cached with the tip it was computed for, and the transactions
+    add their growth to it (see `track_store_growth`). All the files of the
+    store are only looked at when the cache is missing or outdated."""
+    key = _store_key(repo)
+    cached = _read_store_size(repo)
+    if cached is not None and cached[1] == key:
+        return cached[0]
+    vfs = repo.store.vfs
+    size = 0
+    for entry in repo.store.walk():
+        for f in entry.files():
+            size += f.file_size(vfs)
+    _write_store_size(repo, size, key)
+    return size
+
+
+def track_store_growth(source_repo, tr):
+    """add the growth of the store during `tr` to its cached size
+
+    The growth is derived from the offsets of the journal of the transaction,
+    the size of the files it appended to or created. A file truncated by the
+    transaction (e.g. stripped) invalidates the cache, the files it removed
+    are not accounted for."""
+    reporef = weakref.ref(source_repo)
+    before = _store_key(source_repo)
+    offsets = {}
+
+    def record(tr):
+        # the journal is gone once the transaction is closed
+        for f, offset in tr.readjournal():
+            offsets.setdefault(f, offset)
+
+    def update(tr):
+        repo = reporef()
+        assert repo is not None
+        cached = _read_store_size(repo)
+        if cached is None or cached[1] != before:
+            return
+        size = cached[0]
+        for f, offset in offsets.items():
+            try:
+                current = repo.svfs.stat(f).st_size
+            except FileNotFoundError:
+                current = 0
+            if current < offset:
+                repo.cachevfs.tryunlink(STORE_SIZE_FILE)
+                return
+            size += current - offset
+        _write_store_size(repo, size, _store_key(repo))
+
+    tr.addfinalize(CAT_STORE_GROWTH, record)
+    tr.addpostclose(CAT_STORE_GROWTH, update)
+
+
+def new_bundle_needed(
+    repo,
+    bundles,
+    ratio,
+    abs_revs,
+    bundle_type,
+    revs,
+    abs_bytes=0,
+    size=None,
+):
+    """consider the current cached content and trigger new bundles if needed
+
+    The size threshold only applies to bundles whose store size is known."""
     threshold = max((revs * ratio), (revs - abs_revs))
     for b in bundles:
         if not b.valid_for(repo) or b.bundle_type != bundle_type:
             continue
-        if b.revs > threshold:
-            return False
+        if b.revs <= threshold:
+            continue
+        if (
+            abs_bytes
+            and b.store_size is not None
+            and size - b.store_size >= abs_bytes
+        ):
+            continue
+        return False
     return True
 
 
@@ -965,6 +1148,9 @@ def reposetup(ui, repo):
     class autobundlesrepo(repo.__class__):
         def transaction(self, *args, **kwargs):
             tr = super(autobundlesrepo, self).transaction(*args, **kwargs)
+            if repo.ui.configbytes(b'clone-bundles', b'trigger.bytes'):
+                if tr.getpostclose(CAT_STORE_GROWTH) is None:
+                    track_store_growth(self, tr)
             enabled = repo.ui.configbool(
                 b'clone-bundles',
                 b'auto-generate.on-change',
@@ -1088,3 +1274,76 @@ def cmd_admin_clone_bundles_clear(ui, repo: localrepo.localrepository):
     for o in delete:
         delete_bundle(repo, o)
     update_bundle_list(repo, del_bundles=delete)
+
+
+@command(b'admin::clone-bundles-status', cmdutil.formatteropts, b'')
+def cmd_admin_clone_bundles_status(ui, repo: localrepo.localrepository, **opts):
+    """report how up to date the clone bundles are
+
+    For each format of `clone-bundles.auto-generate.formats`, this shows how
+    many revisions the advertised bundle lacks, how many bytes the store grew
+    since it was generated when `clone-bundles.trigger.bytes` is set, and the
+    number of newer bundles being generated. Bundles that the configuration
+    would regenerate are reported as stale.
+
+    Returns 0 if all bundles are up to date, 1 otherwise.
+    """
+    bundles = read_auto_gen(repo)
+    repo = repo.filtered(b"immutable")
+    targets = repo.ui.configlist(b'clone-bundles', b'auto-generate.formats')
+    ratio = float(
+        repo.ui.config(b'clone-bundles', b'trigger.below-bundled-ratio')
+    )
+    abs_revs = repo.ui.configint(b'clone-bundles', b'trigger.revs')
+    abs_bytes = repo.ui.configbytes(b'clone-bundles', b'trigger.bytes')
+    revs = len(repo.changelog)
+    size = None
+    if abs_bytes:
+        size = store_size(repo)
+
+    ret = 0
+    fm = ui.formatter(b'clone-bundles-status', pycompat.byteskwargs(opts))
+    for t in targets:
+        t = bundlecaches.parsebundlespec(repo, t, strict=False).as_spec()
+        current = None
+        generating = 0
+        for b in bundles:
+            if b.bundle_type != t or not b.valid_for(repo):
+                continue
+            if not b.ready:
+                generating += 1
+            elif current is None or current.revs < b.revs:
+                current = b
+        advertised = [current] if current is not None else []
+        stale = new_bundle_needed(
+            repo, advertised, ratio, abs_revs, t, revs, abs_bytes, size
+        )
+        if stale:
+            ret = 1
+
+        fm.startitem()
+        fm.write(b'bundle_type', b'%s:', t)
+        if current is None:
+            fm.plain(_(b' no bundle'))
+        else:
+            fm.write(
+                b'revs_behind',
+                _(b' %d revisions behind'),
+                revs - current.revs,
+            )
+            if size is not None and current.store_size is not None:
+                fm.write(
+                    b'bytes_behind',
+                    _(b', %d bytes behind'),
+                    size - current.store_size,
+                )
+        if generating:
+            fm.write(b'generating', _(b', %d being generated'), generating)
+        fm.data(stale=stale)
+        if stale:
+            fm.plain(_(b' (stale)'))
+        fm.plain(b'\n')
+        if current is not None:
+            fm.condwrite(ui.verbose, b'url', b'  %s\n', current.file_url)
+    fm.end()
+    return ret
@@ -269,6 +269,11 @@ class gittreemanifestctx:
     def readfast(self, shallow=False):
         return self.read()
 
+    def diff(self, other, match=None, clean=False):
+        if match is None:
+            return self.read().diff(other.read(), clean=clean)
+        return self.read().diff(other.read(), match=match, clean=clean)
+
     def copy(self):
         # NB: it's important that we return a memgittreemanifestctx
         # because the caller expects a mutable manifest.
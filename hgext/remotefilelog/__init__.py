@@ -654,7 +654,7 @@ def trydiff(
 
 # Prevent verify from processing files
 # a stub for mercurial.hg.verify()
-def _verify(orig, repo, level=None):
+def _verify(orig, repo, level=None, incremental=False):
     lock = repo.lock()
     try:
         return shallowverifier.shallowverifier(repo).verify()
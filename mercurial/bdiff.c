@@ -275,12 +275,164 @@ static struct bdiff_hunk *recurse(struct bdiff_line *a, struct bdiff_line *b,
 	}
 }
 
-int bdiff_diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
-               struct bdiff_hunk *base)
+/*
+ * Histogram diff
+ *
+ * The matching blocks are anchored on the lines that are the least common
+ * in a: the longest run of matching lines containing the rarest lines is
+ * selected, and the regions on either side of it are processed the same
+ * way. Regions where all the common lines are too common are handed to the
+ * bdiff algorithm above.
+ */
+
+/* lines occurring more often than this in a region are never anchors */
+#define HISTOGRAM_MAX_CHAIN 64
+
+struct histentry {
+	int e;     /* equivalence class of the line, -1 for free slots */
+	int head;  /* first occurrence of the line in the region of a */
+	int count; /* occurrences of the line in the region of a */
+};
+
+struct histogram {
+	struct histentry *table;
+	int *next; /* next occurrence of a line of a, indexed like a */
+};
+
+static inline struct histentry *histlookup(struct histentry *table,
+                                           unsigned mask, int e)
+{
+	unsigned j;
+
+	for (j = ((unsigned)e * 2654435761U) & mask; table[j].e != -1;
+	     j = (j + 1) & mask) {
+		if (table[j].e == e) {
+			break;
+		}
+	}
+	return table + j;
+}
+
+static int histogram_match(struct bdiff_line *a, struct bdiff_line *b,
+                           struct histogram *h, int a1, int a2, int b1,
+                           int b2, int *omi, int *omj)
+{
+	int i, j, k, c, rc, ai, bj, ae, be, nextj;
+	int mi = a1, mj = b1, mk = 0, bestcount = HISTOGRAM_MAX_CHAIN;
+	unsigned size = 2, mask;
+	struct histentry *t = h->table, *entry;
+
+	/* at least half of the slots stay free */
+	while (size < 2 * (unsigned)(a2 - a1)) {
+		size *= 2;
+	}
+	mask = size - 1;
+	for (k = 0; k < (int)size; k++) {
+		t[k].e = -1;
+	}
+
+	/* walk backwards, so that occurrences are chained in order */
+	for (i = a2 - 1; i >= a1; i--) {
+		entry = histlookup(t, mask, a[i].e);
+		if (entry->e == -1) {
+			entry->e = a[i].e;
+			entry->head = -1;
+			entry->count = 0;
+		}
+		h->next[i] = entry->head;
+		entry->head = i;
+		entry->count++;
+	}
+
+	for (j = b1; j < b2; j = nextj) {
+		nextj = j + 1;
+		entry = histlookup(t, mask, b[j].e);
+		if (entry->e == -1 || entry->count > bestcount) {
+			continue;
+		}
+		for (i = entry->head; i != -1; i = h->next[i]) {
+			/* extend the match around a[i] == b[j], tracking the
+			   occurrences of its rarest line */
+			rc = entry->count;
+			for (ai = i, bj = j; ai > a1 && bj > b1 &&
+			                     a[ai - 1].e == b[bj - 1].e;
+			     ai--, bj--) {
+				if (rc > 1) {
+					c = histlookup(t, mask, a[ai - 1].e)->count;
+					rc = c < rc ? c : rc;
+				}
+			}
+			for (ae = i + 1, be = j + 1;
+			     ae < a2 && be < b2 && a[ae].e == b[be].e;
+			     ae++, be++) {
+				if (rc > 1) {
+					c = histlookup(t, mask, a[ae].e)->count;
+					rc = c < rc ? c : rc;
+				}
+			}
+			if (nextj < be) {
+				nextj = be;
+			}
+			if (ae - ai > mk || rc < bestcount) {
+				mi = ai;
+				mj = bj;
+				mk = ae - ai;
+				bestcount = rc;
+			}
+		}
+	}
+
+	*omi = mi;
+	*omj = mj;
+	return mk;
+}
+
+static struct bdiff_hunk *
+histogram_recurse(struct bdiff_line *a, struct bdiff_line *b,
+                  struct histogram *h, struct pos *pos, int a1, int a2,
+                  int b1, int b2, struct bdiff_hunk *l)
+{
+	int i, j, k;
+
+	while (a1 < a2 && b1 < b2) {
+		k = histogram_match(a, b, h, a1, a2, b1, b2, &i, &j);
+		if (!k) {
+			/* only lines too common to be anchors are shared */
+			return recurse(a, b, pos, a1, a2, b1, b2, l);
+		}
+
+		l = histogram_recurse(a, b, h, pos, a1, i, b1, j, l);
+		if (!l) {
+			return NULL;
+		}
+
+		l->next =
+		    (struct bdiff_hunk *)malloc(sizeof(struct bdiff_hunk));
+		if (!l->next) {
+			return NULL;
+		}
+
+		l = l->next;
+		l->a1 = i;
+		l->a2 = i + k;
+		l->b1 = j;
+		l->b2 = j + k;
+		l->next = NULL;
+
+		a1 = i + k;
+		b1 = j + k;
+	}
+	return l;
+}
+
+static int diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
+                struct bdiff_hunk *base, int histogram)
 {
 	struct bdiff_hunk *curr;
 	struct pos *pos;
+	struct histogram h = {NULL, NULL};
 	int t, count = 0;
+	size_t hsize = 2;
 
 	/* allocate and fill arrays */
 	t = equatelines(a, an, b, bn);
@@ -289,8 +441,27 @@ int bdiff_diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
 	if (pos && t) {
 		/* generate the matching block list */
 
-		curr = recurse(a, b, pos, 0, an, 0, bn, base);
+		if (histogram) {
+			/* as large as the largest table histogram_match uses */
+			while (hsize < 2 * (size_t)an) {
+				hsize *= 2;
+			}
+			h.table = (struct histentry *)malloc(
+			    hsize * sizeof(struct histentry));
+			h.next = (int *)malloc((an ? an : 1) * sizeof(int));
+			if (!h.table || !h.next) {
+				curr = NULL;
+			} else {
+				curr = histogram_recurse(a, b, &h, pos, 0, an,
+				                         0, bn, base);
+			}
+			free(h.table);
+			free(h.next);
+		} else {
+			curr = recurse(a, b, pos, 0, an, 0, bn, base);
+		}
 		if (!curr) {
+			free(pos);
 			return -1;
 		}
 
@@ -298,6 +469,7 @@ int bdiff_diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
 		curr->next =
 		    (struct bdiff_hunk *)malloc(sizeof(struct bdiff_hunk));
 		if (!curr->next) {
+			free(pos);
 			return -1;
 		}
 		curr = curr->next;
@@ -334,6 +506,18 @@ int bdiff_diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
 	return count;
 }
 
+int bdiff_diff(struct bdiff_line *a, int an, struct bdiff_line *b, int bn,
+               struct bdiff_hunk *base)
+{
+	return diff(a, an, b, bn, base, 0);
+}
+
+int bdiff_histogram(struct bdiff_line *a, int an, struct bdiff_line *b,
+                    int bn, struct bdiff_hunk *base)
+{
+	return diff(a, an, b, bn, base, 1);
+}
+
 /* deallocate list of hunks; l may be NULL */
 void bdiff_freehunks(struct bdiff_hunk *l)
 {
@@ -1243,17 +1243,23 @@ class bundlepart:
     def _payloadchunks(self):
         """yield chunks of a the part payload
 
-        Exists to handle the different methods to provide data to a part."""
-        # we only support fixed size data now.
-        # This will be improved in the future.
+        Exists to handle the different methods to provide data to a part.
+
+        Payloads are framed in chunks of at most `preferedchunksize` bytes,
+        generators are only consumed as the chunks are sent."""
         if hasattr(self.data, 'next') or hasattr(self.data, '__next__'):
             buff = util.chunkbuffer(self.data)
             chunk = buff.read(preferedchunksize)
             while chunk:
                 yield chunk
                 chunk = buff.read(preferedchunksize)
-        elif len(self.data):
-            yield self.data
+        elif len(self.data) <= preferedchunksize:
+            if len(self.data):
+                yield self.data
+        else:
+            data = self.data
+            for offset in range(0, len(data), preferedchunksize):
+                yield data[offset : offset + preferedchunksize]
 
 
 flaginterrupt = -1
@@ -1850,12 +1856,14 @@ def addpartrevbranchcache(repo, bundler, outgoing):
     # (as an optional parts)
     cache = repo.revbranchcache()
     cl = repo.unfiltered().changelog
-    branchesdata = collections.defaultdict(lambda: (set(), set()))
-    for node in outgoing.missing:
-        branch, close = cache.branchinfo(cl.rev(node))
-        branchesdata[branch][close].add(node)
 
     def generate():
+        # only gathered when the part is sent, not while the previous parts
+        # (e.g. the changegroup) are
+        branchesdata = collections.defaultdict(lambda: (set(), set()))
+        for node in outgoing.missing:
+            branch, close = cache.branchinfo(cl.rev(node))
+            branchesdata[branch][close].add(node)
         for branch, (nodes, closed) in sorted(branchesdata.items()):
             utf8branch = encoding.fromlocal(branch)
             yield rbcstruct.pack(len(utf8branch), len(nodes), len(closed))
@@ -1984,12 +1992,45 @@ def buildobsmarkerspart(bundler, markers, mandatory=True):
     if not markers:
         return None
 
+    version = _obsmarkersformat(bundler)
+    stream = obsolete.encodemarkers(markers, True, version=version)
+    return bundler.newpart(b'obsmarkers', data=stream, mandatory=mandatory)
+
+
+def buildlazyobsmarkerspart(bundler, getmarkers, mandatory=True):
+    """add an obsmarker part to the bundler with the markers of <getmarkers>
+
+    <getmarkers> is only called when the part is sent, so the markers are not
+    held in memory while the previous parts are. The caller is responsible
+    for not creating a part without markers.
+    Raises ValueError if the bundler doesn't support any known obsmarker format.
+    """
+    version = _obsmarkersformat(bundler)
+
+    def generate():
+        # the markers are encoded one by one, group them in frames: the
+        # part payload buffers many of these small chunks
+        buf = []
+        size = 0
+        for chunk in obsolete.encodemarkers(getmarkers(), True, version):
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= preferedchunksize:
+                yield b''.join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield b''.join(buf)
+
+    return bundler.newpart(b'obsmarkers', data=generate(), mandatory=mandatory)
+
+
+def _obsmarkersformat(bundler):
     remoteversions = obsmarkersversion(bundler.capabilities)
     version = obsolete.commonversion(remoteversions)
     if version is None:
         raise ValueError(b'bundler does not support common obsmarker format')
-    stream = obsolete.encodemarkers(markers, True, version=version)
-    return bundler.newpart(b'obsmarkers', data=stream, mandatory=mandatory)
+    return version
 
 
 def writebundle(
@@ -4,6 +4,7 @@
 # GNU General Public License version 2 or any later version.
 
 import collections
+import stat
 import typing
 
 from typing import (
@@ -13,6 +14,7 @@ from typing import (
 )
 
 from .i18n import _
+from .node import hex
 
 from .thirdparty import attr
 
@@ -24,10 +26,14 @@ if typing.TYPE_CHECKING:
 from . import (
     error,
     requirements as requirementsmod,
+    scmutil,
     sslutil,
     util,
 )
-from .utils import stringutil
+from .utils import (
+    hashutil,
+    stringutil,
+)
 
 urlreq = util.urlreq
 
@@ -566,3 +572,148 @@ def sortclonebundleentries(ui, entries):
 
     items = sorted(clonebundleentry(v, prefers) for v in entries)
     return [i.value for i in items]
+
+
+GETBUNDLE_CACHE_DIR = b'getbundle'
+
+# the configuration changing the content of a getbundle response
+_GETBUNDLE_CACHE_CONFIG = [
+    (b'devel', b'bundle.delta'),
+    (b'experimental', b'evolution'),
+    (b'experimental', b'evolution.exchange'),
+    (b'phases', b'publish'),
+]
+
+
+class getbundlecache:
+    """Cache of the responses to `getbundle` requests
+
+    Clients pulling the same range of changesets over and over (e.g. from a
+    continuous integration system) make the server generate the same bundle
+    every time. With the `server.getbundle-cache.size` option, the bundle2
+    streams generated for `getbundle` are kept in `.hg/cache/getbundle/` and
+    sent as is to the following identical requests.
+
+    Entries are keyed by the arguments of the request (common and heads,
+    bundle capabilities, which include the changegroup versions, and the
+    requested parts) and by the state of the repository the response depends
+    on: the visible changesets, the phases, the bookmarks, the
+    obsolescence markers and the configuration used to build it (e.g.
+    `phases.publish`). Entries made stale by a change of that state are not
+    used anymore and age out of the cache.
+
+    The least recently used entries are removed to keep the cache under its
+    size, a response larger than the whole cache is not kept.
+    """
+
+    def __init__(self, repo):
+        self._repo = repo
+        self._vfs = repo.cachevfs
+        self.size = repo.ui.configbytes(b'server', b'getbundle-cache.size')
+
+    def _path(self, key):
+        return b'%s/%s' % (GETBUNDLE_CACHE_DIR, key)
+
+    def key(self, opts):
+        """return the key of the response to a getbundle with `opts`"""
+        repo = self._repo
+        h = hashutil.sha1()
+
+        def add(data):
+            h.update(b'%d:%s' % (len(data), data))
+
+        add(repo.filtername or b'')
+        for section, name in _GETBUNDLE_CACHE_CONFIG:
+            add(stringutil.forcebytestr(repo.ui.config(section, name)))
+        for name, value in sorted(opts.items()):
+            add(name)
+            if isinstance(value, (list, set)):
+                add(b'%d' % len(value))
+                for item in sorted(value):
+                    add(item)
+            elif isinstance(value, bool):
+                add(b'%d' % value)
+            else:
+                add(value)
+
+        cl = repo.changelog
+        tiprev = cl.tiprev()
+        add(cl.node(tiprev))
+        filtered = scmutil.combined_filtered_and_obsolete_hash(
+            repo, tiprev, needobsolete=True
+        )
+        add(filtered or b'')
+        add(repo.svfs.tryread(b'phaseroots'))
+        for name, node in sorted(repo._bookmarks.items()):
+            add(name)
+            add(node)
+        try:
+            obssize = repo.svfs.stat(b'obsstore').st_size
+        except FileNotFoundError:
+            obssize = 0
+        add(b'%d' % obssize)
+        return hex(h.digest())
+
+    def get(self, key):
+        """return a generator of the cached response for `key`, or None"""
+        path = self._path(key)
+        try:
+            fp = self._vfs(path, b'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            # the eviction of entries is based on their modification time
+            self._vfs.utime(path)
+        except OSError:
+            pass
+        self._repo.ui.log(b'getbundlecache', b'sending cached bundle %s\n', key)
+
+        def generate():
+            with fp:
+                for chunk in util.filechunkiter(fp):
+                    yield chunk
+
+        return generate()
+
+    def write(self, key, chunks):
+        """yield `chunks`, keeping them as the response for `key`
+
+        The response is only kept once all of it has been sent."""
+        fp = self._vfs(self._path(key), b'wb', atomictemp=True)
+        size = 0
+        try:
+            for chunk in chunks:
+                if fp is not None:
+                    size += len(chunk)
+                    if size > self.size:
+                        fp.discard()
+                        fp = None
+                    else:
+                        fp.write(chunk)
+                yield chunk
+        except BaseException:
+            if fp is not None:
+                fp.discard()
+            raise
+        if fp is not None:
+            fp.close()
+            msg = b'caching bundle %s (%d bytes)\n'
+            self._repo.ui.log(b'getbundlecache', msg, key, size)
+            self._evict()
+
+    def _evict(self):
+        """remove the least recently used entries above the cache size"""
+        entries = []
+        for name, kind, st in self._vfs.readdir(GETBUNDLE_CACHE_DIR, stat=True):
+            # skip the temporary files of the entries being written
+            if kind == stat.S_IFREG and not name.startswith(b'.'):
+                entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.size:
+                break
+            self._repo.ui.log(
+                b'getbundlecache', b'removing cached bundle %s\n', name
+            )
+            self._vfs.tryunlink(self._path(name))
+            total -= size
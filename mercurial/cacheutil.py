@@ -20,4 +20,5 @@ def cachetocopy(srcrepo):
     cachefiles += [b'tags2']
     cachefiles += [b'tags2-%s' % f for f in repoview.filtertable]
     cachefiles += [b'hgtagsfnodes1']
+    cachefiles += [b'mrc-revs-v1']
     return cachefiles
@@ -20,12 +20,17 @@
 #include "thirdparty/xdiff/xdiff.h"
 #include "util.h"
 
-static PyObject *blocks(PyObject *self, PyObject *args)
+typedef int (*difffunc)(struct bdiff_line *, int, struct bdiff_line *, int,
+                        struct bdiff_hunk *);
+
+static PyObject *matchingblocks(PyObject *args, difffunc diff)
 {
 	PyObject *sa, *sb, *rl = NULL, *m;
 	struct bdiff_line *a, *b;
 	struct bdiff_hunk l, *h;
-	int an, bn, count, pos = 0;
+	int an, bn, count = -1, pos = 0;
+	const char *pa, *pb;
+	Py_ssize_t la, lb;
 
 	l.next = NULL;
 
@@ -33,14 +38,20 @@ static PyObject *blocks(PyObject *self, PyObject *args)
 		return NULL;
 	}
 
-	an = bdiff_splitlines(PyBytes_AsString(sa), PyBytes_Size(sa), &a);
-	bn = bdiff_splitlines(PyBytes_AsString(sb), PyBytes_Size(sb), &b);
-
-	if (!a || !b) {
-		goto nomem;
+	pa = PyBytes_AsString(sa);
+	la = PyBytes_Size(sa);
+	pb = PyBytes_AsString(sb);
+	lb = PyBytes_Size(sb);
+
+	/* bytes are immutable, other threads can run while we diff them */
+	Py_BEGIN_ALLOW_THREADS
+	an = bdiff_splitlines(pa, la, &a);
+	bn = bdiff_splitlines(pb, lb, &b);
+	if (a && b) {
+		count = diff(a, an, b, bn, &l);
 	}
+	Py_END_ALLOW_THREADS
 
-	count = bdiff_diff(a, an, b, bn, &l);
 	if (count < 0) {
 		goto nomem;
 	}
@@ -63,6 +74,16 @@ nomem:
 	return rl ? rl : PyErr_NoMemory();
 }
 
+static PyObject *blocks(PyObject *self, PyObject *args)
+{
+	return matchingblocks(args, bdiff_diff);
+}
+
+static PyObject *histogramblocks(PyObject *self, PyObject *args)
+{
+	return matchingblocks(args, bdiff_histogram);
+}
+
 static PyObject *bdiff(PyObject *self, PyObject *args)
 {
 	Py_buffer ba, bb;
@@ -326,6 +347,8 @@ static PyMethodDef methods[] = {
     {"bdiff", bdiff, METH_VARARGS, "calculate a binary diff\n"},
     {"blocks", blocks, METH_VARARGS, "find a list of matching lines\n"},
     {"fixws", fixws, METH_VARARGS, "normalize diff whitespaces\n"},
+    {"histogramblocks", histogramblocks, METH_VARARGS,
+     "find a list of matching lines using the histogram algorithm\n"},
     {"splitnewlines", splitnewlines, METH_VARARGS,
      "like str.splitlines, but only split on newlines\n"},
     {"xdiffblocks", xdiffblocks, METH_VARARGS,
@@ -333,7 +356,7 @@ static PyMethodDef methods[] = {
     {NULL, NULL},
 };
 
-static const int version = 3;
+static const int version = 4;
 
 static struct PyModuleDef bdiff_module = {
     PyModuleDef_HEAD_INIT, "bdiff", mdiff_doc, -1, methods,
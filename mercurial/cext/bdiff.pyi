@@ -8,5 +8,6 @@ version: int
 def bdiff(a: bytes, b: bytes) -> bytes: ...
 def blocks(a: bytes, b: bytes) -> List[Tuple[int, int, int, int]]: ...
 def fixws(s: bytes, allws: bool) -> bytes: ...
+def histogramblocks(a: bytes, b: bytes) -> List[Tuple[int, int, int, int]]: ...
 def splitnewlines(text: bytes) -> List[bytes]: ...
 def xdiffblocks(a: bytes, b: bytes) -> List[Tuple[int, int, int, int]]: ...
@@ -944,8 +944,15 @@ def _dobackout(ui, repo, node=None, rev=None, **opts):
             _(b'CMD'),
         ),
         (b'U', b'noupdate', False, _(b'do not update to target')),
+        (
+            b'',
+            b'jobs',
+            1,
+            _(b'number of changesets to check at the same time with --command'),
+            _(b'NUM'),
+        ),
     ],
-    _(b"[-gbsr] [-U] [-c CMD] [REV]"),
+    _(b"[-gbsr] [-U] [-c CMD [--jobs NUM]] [REV]"),
     helpcategory=command.CATEGORY_CHANGE_NAVIGATION,
 )
 def bisect(
@@ -960,6 +967,7 @@ def bisect(
     skip=None,
     extend=None,
     noupdate=None,
+    jobs=1,
 ):
     """subdivision search of changesets
 
@@ -983,6 +991,11 @@ def bisect(
     bisection, and any other non-zero exit status means the revision
     is bad.
 
+    With --jobs, the command checks several changesets at the same time,
+    spread over the remaining range, each of them in a working copy
+    sharing the repository (see :hg:`help share`). These working copies
+    are kept under ``.hg/bisect-jobs`` until the bisection is reset.
+
     .. container:: verbose
 
       Some examples:
@@ -1020,6 +1033,10 @@ def bisect(
           hg bisect --good 12
           hg bisect --command "make && make tests"
 
+      - use 'make && make tests' to check 8 changesets at the same time::
+
+          hg bisect --command "make && make tests" --jobs 8
+
       - see all changesets whose states are already known in the current
         bisection::
 
@@ -1075,6 +1092,11 @@ def bisect(
             _(b'%s and %s are incompatible') % tuple(sorted(enabled)[0:2])
         )
 
+    if jobs < 1:
+        raise error.InputError(_(b'--jobs must be a positive number'))
+    if jobs > 1 and not command:
+        raise error.InputError(_(b'--jobs requires --command'))
+
     if reset:
         hbisect.resetstate(repo)
         return
@@ -1135,36 +1157,60 @@ def bisect(
             if not nodes:
                 raise error.InputError(_(b'empty revision set'))
             node = repo[nodes[-1]].node()
+        batch = [node]
+        if jobs > 1:
+            jobrepos = hbisect.jobrepos(repo, jobs)
+            if state[b'good'] and state[b'bad']:
+                # check other changesets along with the current one
+                nodes, changesets, bgood = hbisect.bisect(repo, state, jobs)
+                if changesets:
+                    batch += [n for n in nodes if n != node][: jobs - 1]
+                changesets = 1
         with hbisect.restore_state(repo, state, node):
             while changesets:
                 # update state
-                state[b'current'] = [node]
+                state[b'current'] = batch
                 hbisect.save_state(repo, state)
-                status = ui.system(
-                    command,
-                    environ={b'HG_NODE': hex(node)},
-                    blockedtag=b'bisect_check',
-                )
-                if status == 125:
-                    transition = b"skip"
-                elif status == 0:
-                    transition = b"good"
-                # status < 0 means process was killed
-                elif status == 127:
-                    raise error.Abort(_(b"failed to execute %s") % command)
-                elif status < 0:
-                    raise error.Abort(_(b"%s killed") % command)
+                if jobs > 1:
+                    statuses = hbisect.runjobs(
+                        ui, repo, jobrepos, command, batch
+                    )
                 else:
-                    transition = b"bad"
-                state[transition].append(node)
-                ctx = repo[node]
-                summary = cmdutil.format_changeset_summary(ui, ctx, b'bisect')
-                ui.status(_(b'changeset %s: %s\n') % (summary, transition))
+                    statuses = [
+                        ui.system(
+                            command,
+                            environ={b'HG_NODE': hex(node)},
+                            blockedtag=b'bisect_check',
+                        )
+                    ]
+                for node, status in zip(batch, statuses):
+                    if status == 125:
+                        transition = b"skip"
+                    elif status == 0:
+                        transition = b"good"
+                    # status < 0 means process was killed
+                    elif status == 127:
+                        raise error.Abort(_(b"failed to execute %s") % command)
+                    elif status < 0:
+                        raise error.Abort(_(b"%s killed") % command)
+                    else:
+                        transition = b"bad"
+                    state[transition].append(node)
+                    ctx = repo[node]
+                    summary = cmdutil.format_changeset_summary(
+                        ui, ctx, b'bisect'
+                    )
+                    ui.status(_(b'changeset %s: %s\n') % (summary, transition))
                 hbisect.checkstate(state)
                 # bisect
-                nodes, changesets, bgood = hbisect.bisect(repo, state)
+                nodes, changesets, bgood = hbisect.bisect(repo, state, jobs)
                 # update to next check
+                batch = nodes
                 node = nodes[0]
+                if jobs == 1:
+                    mayupdate(repo, node, show_stats=False)
+            if jobs > 1:
+                # the commands ran in the working copies of the shares
                 mayupdate(repo, node, show_stats=False)
         hbisect.printresult(ui, repo, state, displayer, nodes, bgood)
         return
@@ -7925,7 +7971,16 @@ def update(ui, repo, node=None, **opts):
 
 @command(
     b'verify',
-    [(b'', b'full', False, b'perform more checks (EXPERIMENTAL)')],
+    [
+        (b'', b'full', False, b'perform more checks (EXPERIMENTAL)'),
+        (
+            b'',
+            b'incremental',
+            False,
+            b'only check the revisions added since the last verification '
+            b'(EXPERIMENTAL)',
+        ),
+    ],
     helpcategory=command.CATEGORY_MAINTENANCE,
 )
 def verify(ui, repo, **opts):
@@ -7950,7 +8005,7 @@ def verify(ui, repo, **opts):
     level = None
     if opts['full']:
         level = verifymod.VERIFY_FULL
-    return hg.verify(repo, level)
+    return hg.verify(repo, level, incremental=opts['incremental'])
 
 
 @command(
@@ -106,19 +106,31 @@ class basectx:
         # 1000 and cache it so that when you read 1001, we just need to apply a
         # delta to what's in the cache. So that's one full reconstruction + one
         # delta application.
-        mf2 = None
-        if self.rev() is not None and self.rev() < other.rev():
-            mf2 = self._buildstatusmanifest(s)
-        mf1 = other._buildstatusmanifest(s)
-        if mf2 is None:
-            mf2 = self._buildstatusmanifest(s)
+        if (
+            not listclean
+            and isinstance(self, changectx)
+            and isinstance(other, changectx)
+            and not scmutil.istreemanifest(self._repo)
+        ):
+            # Committed manifests can be compared from their stored deltas,
+            # without building both of them in full. Tree manifests already
+            # only load the directories that changed.
+            mf1 = None
+            d = other.manifestctx().diff(self.manifestctx(), match=match)
+        else:
+            mf2 = None
+            if self.rev() is not None and self.rev() < other.rev():
+                mf2 = self._buildstatusmanifest(s)
+            mf1 = other._buildstatusmanifest(s)
+            if mf2 is None:
+                mf2 = self._buildstatusmanifest(s)
+            d = mf1.diff(mf2, match=match, clean=listclean)
 
         modified, added = [], []
         removed = []
         clean = []
         deleted, unknown, ignored = s.deleted, s.unknown, s.ignored
         deletedset = set(deleted)
-        d = mf1.diff(mf2, match=match, clean=listclean)
         for fn, value in d.items():
             if fn in deletedset:
                 continue
@@ -144,6 +156,8 @@ class basectx:
                 clean.append(fn)
 
         if removed:
+            if mf1 is None and (unknown or ignored):
+                mf1 = other._buildstatusmanifest(s)
             # need to filter files if they are already reported as removed
             unknown = [
                 fn
@@ -537,7 +551,7 @@ class changectx(basectx):
 
     @property
     def _manifestctx(self):
-        return self._repo.manifestlog[self._changeset.manifest]
+        return self._repo.manifestlog[self.manifestnode()]
 
     @propertycache
     def _manifestdelta(self):
@@ -574,13 +588,19 @@ class changectx(basectx):
         )
 
     def manifestnode(self):
-        return self._changeset.manifest
+        mrc = self._repo.manifestrevcache()
+        if mrc is None or '_changeset' in self.__dict__:
+            return self._changeset.manifest
+        return mrc.manifestnode(self._rev)
 
     def user(self):
         return self._changeset.user
 
     def date(self):
-        return self._changeset.date
+        mrc = self._repo.manifestrevcache()
+        if mrc is None or '_changeset' in self.__dict__:
+            return self._changeset.date
+        return mrc.date(self._rev)
 
     def files(self):
         return self._changeset.files
@@ -708,6 +728,9 @@ class changectx(basectx):
         This returns only the immediate child changesets. Use descendants() to
         recursively walk children.
         """
+        childrenfn = dagop.childrenfunc(self._repo)
+        if childrenfn is not None:
+            return [self._repo[r] for r in childrenfn(self._rev)]
         c = self._repo.changelog.children(self._node)
         return [self._repo[x] for x in c]
 
@@ -102,6 +102,11 @@ def _computeforwardmissing(a, b, match=None):
     This is its own function so extensions can easily wrap this call to see what
     files _forwardcopies is about to process.
     """
+    if a.rev() is not None and b.rev() is not None:
+        # both manifests are committed, the storage might be able to find
+        # the differences without reading them in full.
+        d = a.manifestctx().diff(b.manifestctx(), match=match)
+        return {f for f, ((n1, fl1), (n2, fl2)) in d.items() if n1 is None}
     ma = a.manifest()
     mb = b.manifest()
     return mb.filesnotin(ma, match=match)
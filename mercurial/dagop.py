@@ -183,6 +183,45 @@ def revancestors(
     return generatorset(gen, iterasc=False)
 
 
+def childrenfunc(repo, followfirst=False):
+    """return a function listing the children of a revision in repo, in
+    increasing order
+
+    The persistent children cache is used, None is returned if it is
+    disabled."""
+    cc = repo.childrencache()
+    if cc is None:
+        return None
+    cl = repo.changelog
+    filtered = cl.filteredrevs
+    parentrevs = cl.parentrevs
+
+    def children(rev):
+        revs = cc.children(rev)
+        if filtered:
+            revs = [r for r in revs if r not in filtered]
+        if followfirst:
+            revs = [r for r in revs if parentrevs(r)[0] == rev]
+        return revs
+
+    return children
+
+
+def _genrevdescendantsfromchildren(repo, revs, childrenfn):
+    """walk the children of revs, yielding them in increasing order"""
+    cl = repo.changelog
+    heap = [r for r in revs if r in cl]
+    heapq.heapify(heap)
+    seen = set(heap)
+    while heap:
+        rev = heapq.heappop(heap)
+        yield rev
+        for child in childrenfn(rev):
+            if child not in seen:
+                seen.add(child)
+                heapq.heappush(heap, child)
+
+
 def _genrevdescendants(repo, revs, followfirst):
     if followfirst:
         cut = 1
@@ -191,7 +230,13 @@ def _genrevdescendants(repo, revs, followfirst):
 
     cl = repo.changelog
     first = revs.min()
-    if first == nullrev:
+    childrenfn = None
+    if first != nullrev:
+        childrenfn = childrenfunc(repo, followfirst)
+    if childrenfn is not None:
+        for rev in _genrevdescendantsfromchildren(repo, revs, childrenfn):
+            yield rev
+    elif first == nullrev:
         # Are there nodes with a null first parent and a non-null
         # second one? Maybe. Do we care? Probably not.
         yield first
@@ -224,11 +269,13 @@ def _builddescendantsmap(repo, startrev, followfirst):
 
 
 def _genrevdescendantsofdepth(repo, revs, followfirst, startdepth, stopdepth):
-    startrev = revs.min()
-    descmap = _builddescendantsmap(repo, startrev, followfirst)
+    pfunc = childrenfunc(repo, followfirst)
+    if pfunc is None:
+        startrev = revs.min()
+        descmap = _builddescendantsmap(repo, startrev, followfirst)
 
-    def pfunc(rev):
-        return descmap[rev - startrev]
+        def pfunc(rev):
+            return descmap[rev - startrev]
 
     return _walkrevtree(pfunc, revs, startdepth, stopdepth, reverse=False)
 
@@ -105,7 +105,9 @@ from .utils import (
 )
 
 from .revlogutils import (
+    compressiondicts,
     debug as revlog_debug,
+    hotchains,
     nodemap,
     rewrite,
     sidedata,
@@ -1544,6 +1546,107 @@ def debugfileset(ui, repo, expr, **opts):
         ui.write(b"%s\n" % f)
 
 
+@command(
+    b'debug-optimize-revlogs',
+    [
+        (
+            b'',
+            b're-delta',
+            b'parent',
+            _(b'recompute deltas: "none", "parent" or "all"'),
+            _(b'MODE'),
+        ),
+        (
+            b'',
+            b'pause',
+            0,
+            _(b'seconds to wait between two revlogs'),
+            _(b'SECONDS'),
+        ),
+        (
+            b'',
+            b'time-limit',
+            0,
+            _(b'do not start new revlogs after this many seconds'),
+            _(b'SECONDS'),
+        ),
+        (
+            b'',
+            b'max-revlogs',
+            0,
+            _(b'process at most this many revlogs'),
+            _(b'NUM'),
+        ),
+        (b'', b'restart', False, _(b'forget about the revlogs already done')),
+        (
+            b'',
+            b'hot-chains',
+            False,
+            _(b'only rewrite the pinned revlogs with long delta chains'),
+        ),
+    ],
+)
+def debug_optimize_revlogs(ui, repo, **opts):
+    """rewrite the revlogs of a repository one at a time
+
+    Each manifest and file revlog is rewritten with the current storage
+    configuration (compression engine and level, delta settings) under a
+    short lock. The new files are swapped in through the revlog docket, so
+    readers are never blocked. This requires a repository using revlog-v2.
+
+    ``--re-delta`` controls how deltas are recomputed:
+
+    :``none``:   keep the existing deltas, only recompress them
+    :``parent``: recompute the deltas that are not against a parent
+    :``all``:    recompute all the deltas, this is the slowest
+
+    The revlogs already rewritten are recorded in the cache, so an
+    interrupted or limited run (``--time-limit``, ``--max-revlogs``) is
+    resumed by the next one. ``--pause`` throttles the rewrite for servers.
+
+    ``--hot-chains`` only rewrites the revlogs pinned for being read through
+    delta chains longer than ``storage.revlog.pin-snapshots.chain-length``,
+    recomputing all their deltas so their chains are bounded by that length.
+
+    Returns 0 if all the revlogs were optimized, 1 if some are left.
+    """
+    modes = {
+        b'none': revlog.revlog.DELTAREUSEALWAYS,
+        b'parent': revlog.revlog.DELTAREUSESAMEREVS,
+        b'all': revlog.revlog.DELTAREUSENEVER,
+    }
+    mode = opts['re_delta']
+    if mode not in modes:
+        msg = _(b'invalid --re-delta value: %s') % mode
+        raise error.InputError(msg, hint=_(b'use "none", "parent" or "all"'))
+    if requirements.REVLOGV2_REQUIREMENT not in repo.requirements:
+        msg = _(b'can only optimize revlog-v2 repositories in place')
+        raise error.Abort(msg, hint=_(b'see "hg help debugupgraderepo"'))
+
+    if opts['hot_chains']:
+        # experimental config: storage.revlog.pin-snapshots.chain-length
+        chainlength = ui.configint(
+            b'storage', b'revlog.pin-snapshots.chain-length'
+        )
+        if not chainlength:
+            msg = _(b'storage.revlog.pin-snapshots.chain-length is not set')
+            raise error.Abort(msg)
+        count = hotchains.resnapshot(ui, repo.unfiltered(), chainlength)
+        ui.status(_(b'rewrote %d pinned revlogs\n') % count)
+        return 0
+
+    remaining = rewrite.optimize_revlogs(
+        ui,
+        repo.unfiltered(),
+        modes[mode],
+        pause=opts['pause'],
+        time_limit=opts['time_limit'] or None,
+        max_revlogs=opts['max_revlogs'] or None,
+        restart=opts['restart'],
+    )
+    return 1 if remaining else 0
+
+
 @command(
     b"debug-repair-issue6528",
     [
@@ -2339,6 +2442,10 @@ def debugmanifestfulltextcache(ui, repo, add=(), **opts):
         with repo.wlock():
             cache = getcache()
             cache.clear(clear_persisted_data=True)
+            store = repo.manifestlog.getstorage(b'')
+            sharedcache = getattr(store, 'sharedcache', None)
+            if sharedcache is not None:
+                sharedcache.clear(clear_persisted_data=True)
             return
 
     if add:
@@ -2381,6 +2488,13 @@ def debugmanifestfulltextcache(ui, repo, add=(), **opts):
             % (util.bytecount(totalsize), util.bytecount(ondisk))
         )
 
+    store = repo.manifestlog.getstorage(b'')
+    sharedcache = getattr(store, 'sharedcache', None)
+    if sharedcache is not None:
+        ui.write(
+            _(b'shared cache contains %d manifest entries\n') % len(sharedcache)
+        )
+
 
 @command(b'debugmergestate', [] + cmdutil.templateopts, b'')
 def debugmergestate(ui, repo, *args, **opts):
@@ -3847,6 +3961,99 @@ def debug_revlog_stats(ui, repo, **opts):
     fm.end()
 
 
+@command(
+    b'debug-train-zstd-dictionaries',
+    [
+        (
+            b'',
+            b'size',
+            32768,
+            _(b'maximum size of each dictionary in bytes'),
+            _(b'SIZE'),
+        ),
+        (
+            b'',
+            b'samples',
+            1000,
+            _(b'number of revisions sampled for each class'),
+            _(b'NUM'),
+        ),
+    ]
+    + cmdutil.dryrunopts,
+)
+def debug_train_zstd_dictionaries(ui, repo, **opts):
+    """train the zstd dictionaries used to compress revlog chunks
+
+    A dictionary is trained for each class of revlog: the changelog, the
+    manifests and the filelogs grouped by file extension. The most recent
+    revisions of each revlog are used as samples. For each class, the size
+    of the samples compressed with and without the new dictionary is
+    displayed, ``--verbose`` also displays the decompression times.
+
+    Dictionaries that improve the compression of their class are stored in
+    the repository and used for the chunks written from then on, the
+    chunks already stored are not rewritten. The first training adds the
+    ``exp-zstd-dictionaries`` requirement to the repository, older clients
+    cannot read it anymore.
+
+    Training again adds new dictionaries, the previous ones are kept to
+    decompress the existing chunks.
+    """
+    engine = util.compengines[b'zstd']
+    if not engine.available():
+        raise error.Abort(_(b'zstd is not available'))
+    if requirements.REVLOG_COMPRESSION_ZSTD not in repo.requirements:
+        msg = _(b'the repository does not use zstd compression')
+        hint = _(b'see "hg help config.format.revlog-compression"')
+        raise error.Abort(msg, hint=hint)
+
+    repo = repo.unfiltered()
+    feature_config = repo.svfs.options[b'feature-config']
+    level = feature_config.compression_engine_options.get(b'zstd.level')
+    if level is None:
+        level = 3
+    results = compressiondicts.train(
+        ui, repo, opts['size'], opts['samples'], level=level
+    )
+    new = []
+    for cls, dictid, data, stats in results:
+        msg = _(
+            b'%s: %d samples, %d bytes, %d compressed, %d with dictionary\n'
+        )
+        ui.write(
+            msg
+            % (
+                cls,
+                stats[b'samples'],
+                stats[b'raw-size'],
+                stats[b'plain-size'],
+                stats[b'dict-size'],
+            )
+        )
+        msg = _(b'  decompression: %.6fs, %.6fs with dictionary\n')
+        ui.note(
+            msg % (stats[b'plain-decompression'], stats[b'dict-decompression'])
+        )
+        if stats[b'dict-size'] < stats[b'plain-size']:
+            new.append((dictid, cls, data))
+        else:
+            ui.write(_(b'  dictionary not used\n'))
+
+    if opts['dry_run'] or not new:
+        return
+    with repo.lock():
+        dicts = compressiondicts.dictionaries(
+            compressiondicts.parse(repo.svfs.tryread(compressiondicts.FILENAME))
+        )
+        for entry in new:
+            dicts.add(*entry)
+        compressiondicts.write(repo.svfs, dicts)
+        if requirements.ZSTD_DICTIONARIES_REQUIREMENT not in repo.requirements:
+            repo.requirements.add(requirements.ZSTD_DICTIONARIES_REQUIREMENT)
+            scmutil.writereporequirements(repo)
+    ui.status(_(b'%d dictionaries added\n') % len(new))
+
+
 @command(
     b'debugsuccessorssets',
     [(b'', b'closest', False, _(b'return closest successors sets only'))],
@@ -99,6 +99,7 @@ def difffeatureopts(
         b'context': get(b'unified', getter=ui.config),
     }
     buildopts[b'xdiff'] = ui.configbool(b'experimental', b'xdiff')
+    buildopts[b'histogram'] = ui.configbool(b'experimental', b'histogram-diff')
 
     if git:
         buildopts[b'git'] = get(b'git')
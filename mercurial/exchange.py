@@ -2605,10 +2605,16 @@ def _getbundleobsmarkerpart(
     if kwargs.get('obsmarkers', False):
         if heads is None:
             heads = repo.heads()
-        subset = [c.node() for c in repo.set(b'::%ln', heads)]
-        markers = repo.obsstore.relevantmarkers(subset)
-        markers = obsutil.sortedmarkers(markers)
-        bundle2.buildobsmarkerspart(bundler, markers)
+        revs = repo.revs(b'::%ln', heads)
+        node = repo.changelog.node
+        obsstore = repo.obsstore
+        if not obsstore.hasrelevantmarkers(node(r) for r in revs):
+            return
+
+        def getmarkers():
+            return obsstore.sortedrelevantmarkers(node(r) for r in revs)
+
+        bundle2.buildlazyobsmarkerspart(bundler, getmarkers)
 
 
 @getbundle2partsgenerator(b'phases')
@@ -22,6 +22,7 @@ from . import (
     error,
     formatter,
     match,
+    mdiff,
     pycompat,
     registrar,
     scmutil,
@@ -406,6 +407,13 @@ def _verifytext(input, ui):
         raise error.Abort(msg)
 
 
+def _mergediffopts(ui):
+    """diff options for the internal merge algorithm to match lines with"""
+    return mdiff.diffopts(
+        histogram=ui.configbool(b'experimental', b'histogram-diff')
+    )
+
+
 def _premerge(repo, local, other, base, toolconf):
     tool, toolpath, binary, symlink, scriptfn = toolconf
     if symlink or local.fctx.isabsent() or other.fctx.isabsent():
@@ -438,7 +446,12 @@ def _premerge(repo, local, other, base, toolconf):
         ):
             return 1  # continue merging
         merged_text, conflicts = simplemerge.simplemerge(
-            local, base, other, mode=mode
+            local,
+            base,
+            other,
+            mode=mode,
+            diffopts=_mergediffopts(ui),
+            chunked=ui.configbool(b'experimental', b'merge.chunked'),
         )
         if not conflicts or premerge in validkeep:
             # fcd.flags() already has the merged flags (done in
@@ -488,7 +501,12 @@ def _merge(repo, local, other, base, mode):
         return True, True, False
     else:
         merged_text, conflicts = simplemerge.simplemerge(
-            local, base, other, mode=mode
+            local,
+            base,
+            other,
+            mode=mode,
+            diffopts=_mergediffopts(ui),
+            chunked=ui.configbool(b'experimental', b'merge.chunked'),
         )
         # fcd.flags() already has the merged flags (done in
         # mergestate.resolve())
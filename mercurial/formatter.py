@@ -186,6 +186,11 @@ class baseformatter:
     # arbitrary output in the stream.
     strict_format = False
 
+    # set to True if the formatter shows the batches of datacolumns() without
+    # going through the items one at a time, and does not need the context
+    # objects to do so.
+    columnar = False
+
     def __init__(self, ui, topic, opts, converter):
         self._ui = ui
         self._topic = topic
@@ -246,6 +251,17 @@ class baseformatter:
         data = pycompat.byteskwargs(data)
         self._item.update(data)
 
+    def datacolumns(self, columns):
+        '''insert a batch of items given as a dict of columns
+
+        Each column is the list of the values of one field, in item order.
+        Values must be converted by formatdate(), formatdict() or
+        formatlist() as for data().'''
+        keys = [pycompat.sysstr(k) for k in columns]
+        for values in zip(*columns.values()):
+            self.startitem()
+            self.data(**dict(zip(keys, values)))
+
     def write(self, fields, deftext, *fielddata, **opts):
         '''do default text output while assigning data to item'''
         fieldkeys = fields.split()
@@ -412,6 +428,8 @@ class pickleformatter(baseformatter):
 class cborformatter(baseformatter):
     '''serialize items as an indefinite-length CBOR array'''
 
+    columnar = True
+
     def __init__(self, ui, out, topic, opts):
         baseformatter.__init__(self, ui, topic, opts, _nullconverter)
         self._out = out
@@ -420,6 +438,23 @@ class cborformatter(baseformatter):
     def _showitem(self):
         self._out.write(b''.join(cborutil.streamencode(self._item)))
 
+    def datacolumns(self, columns):
+        if self._item is not None:
+            self._showitem()
+            self._item = None
+        # same encoding as streamencode() of every item: all the items share
+        # the map header and the encoded keys, sorted as bytes
+        encode = cborutil.streamencode
+        keys = sorted(columns)
+        header = cborutil.encodelength(cborutil.MAJOR_TYPE_MAP, len(keys))
+        fields = []
+        for k in keys:
+            key = b''.join(encode(k))
+            fields.append([key + b''.join(encode(v)) for v in columns[k]])
+        self._out.write(
+            b''.join(header + b''.join(item) for item in zip(*fields))
+        )
+
     def end(self):
         baseformatter.end(self)
         self._out.write(cborutil.BREAK)
@@ -427,6 +462,7 @@ class cborformatter(baseformatter):
 
 class jsonformatter(baseformatter):
     strict_format = True
+    columnar = True
 
     def __init__(self, ui, out, topic, opts):
         baseformatter.__init__(self, ui, topic, opts, _nullconverter)
@@ -437,19 +473,38 @@ class jsonformatter(baseformatter):
     def _showitem(self):
         if self._first:
             self._first = False
+            sep = b"\n {\n"
+        else:
+            sep = b",\n {\n"
+        # build the whole item first, writes are way more costly than
+        # the string operations
+        json = templatefilters.json
+        fields = b",\n".join(
+            b'  "%s": %s' % (k, json(v, paranoid=False))
+            for k, v in sorted(self._item.items())
+        )
+        self._out.write(b"%s%s\n }" % (sep, fields))
+
+    def datacolumns(self, columns):
+        if self._item is not None:
+            self._showitem()
+            self._item = None
+        # encode the values a column at a time, then join the fields of
+        # each item
+        json = templatefilters.json
+        fields = [
+            [b'  "%s": %s' % (k, json(v, paranoid=False)) for v in columns[k]]
+            for k in sorted(columns)
+        ]
+        items = [b",\n".join(item) for item in zip(*fields)]
+        if not items:
+            return
+        if self._first:
+            self._first = False
+            sep = b"\n {\n"
         else:
-            self._out.write(b",")
-
-        self._out.write(b"\n {\n")
-        first = True
-        for k, v in sorted(self._item.items()):
-            if first:
-                first = False
-            else:
-                self._out.write(b",\n")
-            u = templatefilters.json(v, paranoid=False)
-            self._out.write(b'  "%s": %s' % (k, u))
-        self._out.write(b"\n }")
+            sep = b",\n {\n"
+        self._out.write(b"%s%s\n }" % (sep, b"\n },\n {\n".join(items)))
 
     def end(self):
         baseformatter.end(self)
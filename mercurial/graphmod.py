@@ -18,6 +18,8 @@ Data depends on type.
 """
 
 
+import array
+import struct
 import typing
 
 from .node import nullrev
@@ -30,9 +32,12 @@ if typing.TYPE_CHECKING:
 
 from . import (
     dagop,
+    error,
+    scmutil,
     smartset,
     util,
 )
+from .utils import stringutil
 
 CHANGESET = b'C'
 PARENT = b'P'
@@ -107,22 +112,9 @@ def nodes(repo, nodes):
         yield (ctx.rev(), CHANGESET, ctx, sorted(parents))
 
 
-def colored(dag, repo):
-    """annotates a DAG with colored edge information
-
-    For each DAG node this function emits tuples::
-
-      (id, type, data, (col, color), [(col, nextcol, color)])
-
-    with the following new elements:
-
-      - Tuple (col, color) with column and color index for the current node
-      - A list of tuples indicating the edges between the current node and its
-        parents.
-    """
-    seen = []
-    colors = {}
-    newcolor = 1
+def _edgeconfig(repo):
+    """return a function giving the [graph] settings of the branch of a
+    revision, for the edges leading to it"""
     config = {}
 
     for key, val in repo.ui.configitems(b'graph'):
@@ -135,25 +127,59 @@ def colored(dag, repo):
                 config.setdefault(branch, {})[setting] = val
 
     if config:
-        getconf = util.lrucachefunc(
-            lambda rev: config.get(repo[rev].branch(), {})
-        )
+        return util.lrucachefunc(lambda rev: config.get(repo[rev].branch(), {}))
     else:
-        getconf = lambda rev: {}
+        return lambda rev: {}
+
+
+def _configuredges(edges, getconf):
+    """add the width and color settings of their branch to edges"""
+    configured = []
+    for ecol, nextcol, color, eid in edges:
+        bconf = getconf(eid)
+        configured.append(
+            (
+                ecol,
+                nextcol,
+                color,
+                bconf.get(b'width', -1),
+                bconf.get(b'color', b''),
+            )
+        )
+    return configured
+
+
+class _layout:
+    """columns and colors of the lines of a graph, between two nodes"""
+
+    def __init__(self, seen=None, colors=None, newcolor=1):
+        # ids of the nodes the lines of each column lead to
+        self.seen = [] if seen is None else seen
+        # color of the line leading to each id of seen
+        self.colors = {} if colors is None else colors
+        self.newcolor = newcolor
+
+    def add(self, cur, parents):
+        """lay out node cur, with lines leading to the ids of parents
+
+        Returns (col, color, edges) where edges is a list of
+        (col, nextcol, color, id) tuples, id being the node a line leads to.
+        """
+        seen = self.seen
+        colors = self.colors
 
-    for cur, type, data, parents in dag:
         # Compute seen and next
         if cur not in seen:
             seen.append(cur)  # new head
-            colors[cur] = newcolor
-            newcolor += 1
+            colors[cur] = self.newcolor
+            self.newcolor += 1
 
         col = seen.index(cur)
         color = colors.pop(cur)
         next = seen[:]
 
         # Add parents to next
-        addparents = [p for pt, p in parents if p not in next]
+        addparents = [p for p in parents if p not in next]
         next[col : col + 1] = addparents
 
         # Set colors for the parents
@@ -161,39 +187,258 @@ def colored(dag, repo):
             if not i:
                 colors[p] = color
             else:
-                colors[p] = newcolor
-                newcolor += 1
+                colors[p] = self.newcolor
+                self.newcolor += 1
 
         # Add edges to the graph
         edges = []
         for ecol, eid in enumerate(seen):
             if eid in next:
-                bconf = getconf(eid)
-                edges.append(
-                    (
-                        ecol,
-                        next.index(eid),
-                        colors[eid],
-                        bconf.get(b'width', -1),
-                        bconf.get(b'color', b''),
-                    )
-                )
+                edges.append((ecol, next.index(eid), colors[eid], eid))
             elif eid == cur:
-                for ptype, p in parents:
-                    bconf = getconf(p)
-                    edges.append(
-                        (
-                            ecol,
-                            next.index(p),
-                            color,
-                            bconf.get(b'width', -1),
-                            bconf.get(b'color', b''),
-                        )
-                    )
+                for p in parents:
+                    edges.append((ecol, next.index(p), color, p))
+
+        self.seen = next
+        return col, color, edges
+
+
+def colored(dag, repo):
+    """annotates a DAG with colored edge information
 
+    For each DAG node this function emits tuples::
+
+      (id, type, data, (col, color), [(col, nextcol, color)])
+
+    with the following new elements:
+
+      - Tuple (col, color) with column and color index for the current node
+      - A list of tuples indicating the edges between the current node and its
+        parents.
+    """
+    layout = _layout()
+    getconf = _edgeconfig(repo)
+
+    for cur, type, data, parents in dag:
+        col, color, edges = layout.add(cur, [p for pt, p in parents])
         # Yield and move on
-        yield (cur, type, data, (col, color), edges)
-        seen = next
+        yield (cur, type, data, (col, color), _configuredges(edges, getconf))
+
+
+class layoutcache:
+    """persistent layout of the graph of all the revisions of a repoview
+
+    The layout is the one colored() gives when walking the revisions of the
+    view from its tip down. Only the rows that were asked for are laid out:
+    the state of the layout after the last row is kept, so that deeper rows
+    can be added without walking from the tip again.
+
+    The layout of each repoview is stored in '.hg/cache/graphlayout-v1' with
+    the name of the filter as suffix, in big endian 32 bits integers:
+
+    - the tip revision, tip node and hash of the filtered revisions of the
+      view the layout is valid for,
+    - the number of rows, edges and columns, and the next new color,
+    - (rev, col, color, end of its edges) for each row,
+    - (col, nextcol, color, rev) for each edge,
+    - (rev, color) for each column after the last row.
+
+    A new tip or a different set of filtered revisions gives an entirely
+    different layout, the cache is started over in that case.
+    """
+
+    _base_filename = b'graphlayout-v1'
+    _header = struct.Struct(b'>l')
+    _counts = struct.Struct(b'>llll')
+
+    def __init__(self, repo):
+        self._repo = repo
+        cl = repo.changelog
+        self._tiprev = cl.tiprev()
+        self._tipnode = cl.node(self._tiprev)
+        self._filteredhash = self._hashfiltered(repo, self._tiprev)
+        self._rows = array.array('i')
+        self._edges = array.array('i')
+        self._layout = _layout()
+        self._dirty = False
+        if self._tiprev != nullrev:
+            self._load()
+
+    @classmethod
+    def _filename(cls, repo):
+        filename = cls._base_filename
+        if repo.filtername:
+            filename = b'%s-%s' % (filename, repo.filtername)
+        return filename
+
+    @staticmethod
+    def _hashfiltered(repo, tiprev):
+        filteredhash = scmutil.combined_filtered_and_obsolete_hash(repo, tiprev)
+        if filteredhash is None:
+            filteredhash = repo.nodeconstants.nullid
+        return filteredhash
+
+    @staticmethod
+    def _fromdisk(data):
+        if len(data) % 4:
+            raise ValueError('truncated file')
+        return array.array('i', struct.unpack(b'>%di' % (len(data) // 4), data))
+
+    @staticmethod
+    def _todisk(values):
+        return struct.pack(b'>%di' % len(values), *values)
+
+    def _load(self):
+        repo = self._repo
+        filename = self._filename(repo)
+        try:
+            data = repo.cachevfs.read(filename)
+        except (IOError, OSError):
+            return
+        try:
+            nodelen = len(self._tipnode)
+            (tiprev,) = self._header.unpack_from(data)
+            offset = self._header.size
+            tipnode = data[offset : offset + nodelen]
+            offset += nodelen
+            filteredhash = data[offset : offset + nodelen]
+            offset += nodelen
+            if (tiprev, tipnode, filteredhash) != (
+                self._tiprev,
+                self._tipnode,
+                self._filteredhash,
+            ):
+                # a different graph, start over
+                return
+            nrows, nedges, ncols, newcolor = self._counts.unpack_from(
+                data, offset
+            )
+            offset += self._counts.size
+            values = self._fromdisk(data[offset:])
+            if len(values) != 4 * nrows + 4 * nedges + 2 * ncols:
+                raise ValueError('truncated file')
+            rows = values[: 4 * nrows]
+            edges = values[4 * nrows : 4 * nrows + 4 * nedges]
+            cols = values[4 * nrows + 4 * nedges :]
+        except (ValueError, struct.error) as inst:
+            repo.ui.debug(
+                b'invalid %s: %s\n' % (filename, stringutil.forcebytestr(inst))
+            )
+            return
+        seen = list(cols[0::2])
+        self._rows = rows
+        self._edges = edges
+        self._layout = _layout(seen, dict(zip(seen, cols[1::2])), newcolor)
+
+    def write(self):
+        if not self._dirty:
+            return
+        repo = self._repo
+        layout = self._layout
+        cols = []
+        for rev in layout.seen:
+            cols.append(rev)
+            cols.append(layout.colors[rev])
+        try:
+            with repo.cachevfs(
+                self._filename(repo), b'w', atomictemp=True
+            ) as f:
+                f.write(self._header.pack(self._tiprev))
+                f.write(self._tipnode)
+                f.write(self._filteredhash)
+                f.write(
+                    self._counts.pack(
+                        len(self._rows) // 4,
+                        len(self._edges) // 4,
+                        len(layout.seen),
+                        layout.newcolor,
+                    )
+                )
+                f.write(self._todisk(self._rows))
+                f.write(self._todisk(self._edges))
+                f.write(self._todisk(cols))
+            self._dirty = False
+        except (IOError, OSError, error.Abort) as inst:
+            repo.ui.debug(
+                b"couldn't write graph layout cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+
+    def _lastrev(self):
+        if not self._rows:
+            return None
+        return self._rows[-4]
+
+    def _extend(self, stop):
+        """lay out the revisions of the view down to stop"""
+        lastrev = self._lastrev()
+        if lastrev is None:
+            start = self._tiprev
+        elif lastrev <= stop:
+            return
+        else:
+            start = lastrev - 1
+        cl = self._repo.changelog
+        parentrevs = cl.parentrevs
+        rows = self._rows
+        edges = self._edges
+        layout = self._layout
+        for rev in cl.revs(start, stop):
+            # all the parents of the revisions of the view are in the view
+            parents = sorted({p for p in parentrevs(rev) if p != nullrev})
+            col, color, revedges = layout.add(rev, parents)
+            for edge in revedges:
+                edges.extend(edge)
+            rows.extend((rev, col, color, len(edges)))
+            self._dirty = True
+
+    def rows(self, stop):
+        """return (rev, (col, color), edges) for each revision of the view
+        from its tip down to stop
+
+        edges is a list of (col, nextcol, color, rev) tuples, rev being the
+        revision a line leads to."""
+        if self._tiprev == nullrev:
+            return []
+        self._extend(stop)
+        rows = self._rows
+        edges = self._edges
+        result = []
+        start = 0
+        for i in range(0, len(rows), 4):
+            rev, col, color, end = rows[i : i + 4]
+            if rev < stop:
+                break
+            result.append(
+                (
+                    rev,
+                    (col, color),
+                    [tuple(edges[j : j + 4]) for j in range(start, end, 4)],
+                )
+            )
+            start = end
+        return result
+
+
+def coloredfromtip(repo, stop):
+    """annotated DAG of the revisions of repo from its tip down to stop
+
+    Gives the same tuples as colored() does for the dagwalker() of these
+    revisions, when the parents of all of them are in the DAG, using and
+    updating the layoutcache of repo.
+    """
+    cache = layoutcache(repo)
+    rows = cache.rows(stop)
+    cache.write()
+    getconf = _edgeconfig(repo)
+    for rev, vertex, edges in rows:
+        yield (
+            rev,
+            CHANGESET,
+            repo[rev],
+            vertex,
+            _configuredges(edges, getconf),
+        )
 
 
 def asciiedges(type, char, state, rev, parents):
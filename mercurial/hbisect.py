@@ -17,10 +17,13 @@ from .node import (
     hex,
     short,
 )
-from . import error
+from . import (
+    error,
+    pycompat,
+)
 
 
-def bisect(repo, state):
+def bisect(repo, state, count=1):
     """find the next node (if any) for testing during a bisect search.
     returns a (nodes, number, good) tuple.
 
@@ -29,6 +32,10 @@ def bisect(repo, state):
     the search and 'nodes' contains the next bisect target.
     'good' is True if bisect is searching for a first good changeset, False
     if searching for a first bad one.
+
+    With a 'count' greater than 1, 'nodes' contains up to 'count' targets
+    to be tested together, spread so that each splits the remaining
+    candidates in 'count + 1' parts of about the same size.
     """
 
     repo = repo.unfiltered()
@@ -87,10 +94,13 @@ def bisect(repo, state):
     if tot == 1 or not unskipped:
         return ([changelog.node(c) for c in candidates], 0, good)
     perfect = tot // 2
+    # numbers of ancestors of the best nodes to test
+    targets = [tot * (i + 1) // (count + 1) for i in range(count)]
 
     # find the best node to test
     best_rev = None
     best_len = -1
+    tested = []
     poison = set()
     for rev in candidates:
         if rev in poison:
@@ -104,13 +114,16 @@ def bisect(repo, state):
         x = len(a)  # number of ancestors
         y = tot - x  # number of non-ancestors
         value = min(x, y)  # how good is this test?
-        if value > best_len and rev not in skip:
+        if count > 1:
+            if rev not in skip and rev != badrev:
+                tested.append((x, rev))
+        elif value > best_len and rev not in skip:
             best_len = value
             best_rev = rev
             if value == perfect:  # found a perfect candidate? quit early
                 break
 
-        if y < perfect and rev not in skip:  # all downhill from here?
+        if y < targets[0] and rev not in skip:  # all downhill from here?
             # poison children
             poison.update(children.get(rev, []))
             continue
@@ -131,6 +144,15 @@ def bisect(repo, state):
             a.append(first)
             ancestors[first] = a
 
+    if count > 1:
+        best_revs = []
+        for target in targets:
+            best = min(tested, key=lambda t: abs(t[0] - target), default=None)
+            if best is not None:
+                tested.remove(best)
+                best_revs.append(best[1])
+        return ([changelog.node(r) for r in sorted(best_revs)], tot, good)
+
     assert best_rev is not None
     best_node = changelog.node(best_rev)
 
@@ -176,6 +198,69 @@ def resetstate(repo):
     """remove any bisect state from the repository"""
     if repo.vfs.exists(b"bisect.state"):
         repo.vfs.unlink(b"bisect.state")
+    if repo.vfs.exists(b"bisect-jobs"):
+        repo.vfs.rmtree(b"bisect-jobs", forcibly=True)
+
+
+def jobrepos(repo, count):
+    """return 'count' repositories sharing the store of 'repo'
+
+    Their working copies are used to test several changesets at the same
+    time. They are kept in '.hg/bisect-jobs' until the bisect state is
+    reset, so that the tests can reuse what they built in a previous run.
+    """
+    from . import hg  # avoid cycle
+
+    repos = []
+    for i in range(count):
+        path = repo.vfs.join(b'bisect-jobs', b'%d' % i)
+        if repo.vfs.exists(b'bisect-jobs/%d/.hg' % i):
+            repos.append(hg.repository(repo.ui, path))
+        else:
+            repo.vfs.makedirs(b'bisect-jobs')
+            repos.append(
+                hg.share(repo.ui, repo, path, update=False, bookmarks=False)
+            )
+    return repos
+
+
+def runjobs(ui, repo, repos, command, nodes):
+    """run 'command' concurrently for each node of 'nodes'
+
+    Each node is checked out in the working copy of the matching repository
+    of 'repos', where the command runs. The output of the commands is written
+    in the order of 'nodes' once they are done.
+
+    Returns the list of the exit statuses of the command."""
+    from . import hg  # avoid cycle
+
+    subdir = repo.getcwd()
+    for r, node in zip(repos, nodes):
+        hg.clean(r, node, show_stats=False)
+
+    def run(jobui, r, node):
+        cwd = r.root
+        if subdir and r.wvfs.isdir(subdir):
+            cwd = r.wvfs.join(subdir)
+        jobui.pushbuffer(error=True, subproc=True)
+        status = jobui.system(
+            command,
+            environ={b'HG_NODE': hex(node)},
+            cwd=cwd,
+            blockedtag=b'bisect_check',
+        )
+        return status, jobui.popbuffer()
+
+    statuses = []
+    with pycompat.futures.ThreadPoolExecutor(len(nodes)) as executor:
+        futures = [
+            executor.submit(run, ui.copy(), r, n) for r, n in zip(repos, nodes)
+        ]
+        for future in futures:
+            status, output = future.result()
+            ui.write(output)
+            statuses.append(status)
+    return statuses
 
 
 def checkstate(state):
@@ -1536,9 +1536,9 @@ def outgoing(ui, repo, dests, opts, subpath=None):
             oth.close()
 
 
-def verify(repo, level=None):
+def verify(repo, level=None, incremental=False):
     """verify the consistency of a repository"""
-    ret = verifymod.verify(repo, level=level)
+    ret = verifymod.verify(repo, level=level, incremental=incremental)
 
     # Broken subrepo references in hidden csets don't seem worth worrying about,
     # since they can't be pushed/pulled, and --hidden can be used if they are a
@@ -362,6 +362,8 @@ class hgweb:
             with profiling.profile(repo.ui, enabled=profile):
                 for r in self._runwsgi(req, res, repo):
                     yield r
+            # the repository is kept open between the requests
+            repo._writehotchains()
 
     def _runwsgi(self, req, res, repo):
         rctx = requestcontext(self, repo, req, res)
@@ -1415,7 +1415,11 @@ def graph(web):
     def fulltree():
         pos = web.repo[graphtop].rev()
         tree = []
-        if pos != -1:
+        if pos == web.repo.changelog.tiprev():
+            # the graph of every page scrolled down from the tip starts with
+            # the same rows, lay them out once
+            tree = list(graphmod.coloredfromtip(web.repo, lastrev))
+        elif pos != -1:
             revs = web.repo.changelog.revs(pos, lastrev)
             dag = graphmod.dagwalker(web.repo, smartset.baseset(revs))
             tree = list(
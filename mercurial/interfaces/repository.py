@@ -54,6 +54,10 @@ CACHE_BRANCHMAP_ALL = b"branchmap-all"
 CACHE_BRANCHMAP_SERVED = b"branchmap-served"
 # Warm internal changelog cache (eg: persistent nodemap)
 CACHE_CHANGELOG_CACHE = b"changelog-cache"
+# Warm changeset users and descriptions cache
+CACHE_CHANGELOG_TEXT = b"changelog-text-cache"
+# Warm changeset children cache
+CACHE_CHILDREN = b"children-cache"
 # check of a branchmap can use the "pure topo" mode
 CACHE_BRANCHMAP_DETECT_PURE_TOPO = b"branchmap-detect-pure-topo"
 # Warm full manifest cache
@@ -62,6 +66,8 @@ CACHE_FULL_MANIFEST = b"full-manifest"
 CACHE_FILE_NODE_TAGS = b"file-node-tags"
 # Warm internal manifestlog cache (eg: persistent nodemap)
 CACHE_MANIFESTLOG_CACHE = b"manifestlog-cache"
+# Warm changelog to manifest revision cache
+CACHE_MANIFEST_REV = b"manifest-rev-cache"
 # Warn rev branch cache
 CACHE_REV_BRANCH = b"rev-branch-cache"
 # Warm tags' cache for default repoview'
@@ -73,6 +79,9 @@ CACHE_TAGS_SERVED = b"tags-served"
 # (this is a mutable set to let extension update it)
 CACHES_DEFAULT = {
     CACHE_BRANCHMAP_SERVED,
+    CACHE_CHANGELOG_TEXT,
+    CACHE_CHILDREN,
+    CACHE_MANIFEST_REV,
 }
 
 # the caches to warm when warming all of them
@@ -82,9 +91,12 @@ CACHES_ALL = {
     CACHE_BRANCHMAP_ALL,
     CACHE_BRANCHMAP_DETECT_PURE_TOPO,
     CACHE_CHANGELOG_CACHE,
+    CACHE_CHANGELOG_TEXT,
+    CACHE_CHILDREN,
     CACHE_FILE_NODE_TAGS,
     CACHE_FULL_MANIFEST,
     CACHE_MANIFESTLOG_CACHE,
+    CACHE_MANIFEST_REV,
     CACHE_TAGS_DEFAULT,
     CACHE_TAGS_SERVED,
 }
@@ -958,6 +970,9 @@ class ifilestorage(ifileindex, ifiledata, ifilemutation):
         to ``safe_renamed`` in order to indicate nodes that may perform the
         rename checks with currently accessible data.
 
+        If set, ``startrev`` is the first revision to verify, the previous
+        ones having been verified before.
+
         The method yields objects conforming to the ``iverifyproblem``
         interface.
         """
@@ -1239,6 +1254,14 @@ class imanifestrevisionstored(imanifestrevisionbase):
 
         The returned object conforms to the ``imanifestdict`` interface."""
 
+    def diff(other, match=None, clean=False):
+        """Find the changes between this manifest revision and ``other``.
+
+        The result has the same format as ``imanifestdict.diff()``. The
+        storage might be able to compute it without reading both manifests in
+        full (e.g. from the deltas between the two revisions).
+        """
+
     def readfast(shallow=False):
         """Calls either ``read()`` or ``readdelta()``.
 
@@ -1786,6 +1809,15 @@ class ilocalrepositorymain(interfaceutil.Interface):
     def revbranchcache():
         pass
 
+    def manifestrevcache():
+        """Return the changelog to manifest revision cache or None."""
+
+    def changelogtextcache():
+        """Return the changeset users and descriptions cache or None."""
+
+    def childrencache():
+        """Return the changeset children cache or None."""
+
     def register_changeset(rev, changelogrevision):
         """Extension point for caches for new nodes.
 
@@ -60,6 +60,7 @@ from . import (
     rcutil,
     repoview,
     requirements as requirementsmod,
+    revcaches,
     revlog,
     revset,
     revsetlang,
@@ -90,6 +91,7 @@ from .utils import (
 from .revlogutils import (
     concurrency_checker as revlogchecker,
     constants as revlogconst,
+    hotchains,
     sidedata as sidedatamod,
 )
 
@@ -776,6 +778,9 @@ def makelocalrepository(baseui, path: bytes, intents=None):
     # The cache vfs is used to manage cache files.
     cachevfs = vfsmod.vfs(cachepath, cacheaudited=True)
     cachevfs.createmode = store.createmode
+    delta_config = storevfs.options.get(b'delta-config')
+    if delta_config is not None and delta_config.pinned_chain_len:
+        delta_config.pinned_revlogs = hotchains.pinned(cachevfs)
     # The cache vfs is used to manage cache files related to the working copy
     wcachevfs = vfsmod.vfs(wcachepath, cacheaudited=True)
     wcachevfs.createmode = store.createmode
@@ -936,6 +941,7 @@ def gathersupportedrequirements(ui):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(requirementsmod.REVLOG_COMPRESSION_ZSTD)
+                supported.add(requirementsmod.ZSTD_DICTIONARIES_REQUIREMENT)
 
     return supported
 
@@ -1024,6 +1030,12 @@ def resolvestorevfsoptions(ui, requirements, features):
     if manifestcachesize is not None:
         options[b'manifestcachesize'] = manifestcachesize
 
+    # experimental config: storage.manifest-shared-cache
+    if ui.configbool(b'storage', b'manifest-shared-cache'):
+        options[b'manifest-shared-cache-size'] = ui.configbytes(
+            b'storage', b'manifest-shared-cache.max-size'
+        )
+
     # In the absence of another requirement superseding a revlog-related
     # requirement, we have to assume the repo is using revlog version 0.
     # This revlog format is super old and we don't bother trying to parse
@@ -1074,6 +1086,15 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
     chunkcachesize = ui.configint(b'format', b'chunkcachesize')
     if chunkcachesize is not None:
         data_config.chunk_cache_size = chunkcachesize
+    data_config.block_cache_size = ui.configbytes(
+        b'storage', b'revlog.block-cache.size'
+    )
+    data_config.block_cache_shared = ui.configbool(
+        b'storage', b'revlog.block-cache.shared'
+    )
+    data_config.revision_cache_size = ui.configbytes(
+        b'storage', b'revlog.revision-cache.size'
+    )
 
     memory_profile = scmutil.get_resource_profile(ui, b'memory')
     if memory_profile >= scmutil.RESOURCE_MEDIUM:
@@ -1115,6 +1136,7 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
             b'storage',
             b'revlog.mmap.index:size-threshold',
         )
+    data_config.mmap_data = ui.configbool(b'storage', b'revlog.mmap.data')
 
     withsparseread = ui.configbool(b'experimental', b'sparse-read')
     srdensitythres = float(
@@ -1138,6 +1160,12 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
     maxchainlen = ui.configint(b'format', b'maxchainlen', maxchainlen)
     if maxchainlen is not None:
         delta_config.max_chain_len = maxchainlen
+    # experimental config: storage.revlog.pin-snapshots.chain-length
+    pinnedchainlen = ui.configint(
+        b'storage', b'revlog.pin-snapshots.chain-length'
+    )
+    if pinnedchainlen:
+        delta_config.pinned_chain_len = pinnedchainlen
 
     for r in requirements:
         # we allow multiple compression engine requirement to co-exist because
@@ -1161,6 +1189,9 @@ def resolverevlogstorevfsoptions(ui, requirements, features):
             raise error.Abort(msg % zstd_level)
     feature_config.compression_engine_options[b'zstd.level'] = zstd_level
 
+    if requirementsmod.ZSTD_DICTIONARIES_REQUIREMENT in requirements:
+        feature_config.compression_dictionaries = True
+
     if requirementsmod.NARROW_REQUIREMENT in requirements:
         feature_config.enable_ellipsis = True
 
@@ -1467,6 +1498,9 @@ class localrepository:
 
         self._branchcaches = branchmap.BranchMapCache()
         self._revbranchcache = None
+        self._manifestrevcache = None
+        self._changelogtextcache = None
+        self._childrencache = None
         self._filterpats = {}
         self._datafilters = {}
         self._transref = self._lockref = self._wlockref = None
@@ -1598,6 +1632,43 @@ class localrepository:
     def _writecaches(self):
         if self._revbranchcache:
             self._revbranchcache.write()
+        if self._manifestrevcache:
+            self._manifestrevcache.write()
+        if self._changelogtextcache not in (None, False):
+            self._changelogtextcache.write()
+        if self._childrencache:
+            self._childrencache.write()
+        self._writehotchains()
+
+    def _writehotchains(self):
+        """merge the reads through long delta chains into the cache file
+
+        Called when the repository is closed, and after each request by
+        hgweb which keeps its repositories open."""
+        delta_config = self.svfs.options.get(b'delta-config')
+        if delta_config is None or not delta_config.pinned_chain_len:
+            return
+        if not hotchains.haspending(self.svfs):
+            return
+        wlock = None
+        try:
+            wlock = self.wlock(wait=False)
+            hotchains.flush(
+                self.cachevfs,
+                self.svfs,
+                self.ui.configint(
+                    b'storage', b'revlog.pin-snapshots.min-reads'
+                ),
+                self.ui.configbytes(b'storage', b'revlog.pin-snapshots.budget'),
+            )
+        except (IOError, OSError, error.Abort, error.LockError) as inst:
+            self.ui.debug(
+                b"couldn't write hot chains cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+        finally:
+            if wlock is not None:
+                wlock.release()
 
     def _restrictcapabilities(self, caps):
         if self.ui.configbool(b'experimental', b'bundle2-advertise'):
@@ -2079,6 +2150,14 @@ class localrepository:
         for r in self.revs(expr, *args):
             yield self[r]
 
+    @unfilteredpropertycache
+    def _revsetcache(self):
+        """results of the revsets which only depend on the changelog
+
+        See `experimental.revset.cache-size` and `revset.makematcher()`."""
+        size = self.ui.configint(b'experimental', b'revset.cache-size')
+        return util.lrucachedict(size)
+
     def anyrevs(self, specs: bytes, user=False, localalias=None):
         """Find revisions matching one of the given revsets.
 
@@ -2238,8 +2317,53 @@ class localrepository:
             self._revbranchcache = branchmap.revbranchcache(self.unfiltered())
         return self._revbranchcache
 
+    @unfilteredmethod
+    def manifestrevcache(self):
+        """return the persistent changelog to manifest revision cache
+
+        None is returned if the cache is disabled (see
+        `storage.manifest-rev-cache`)."""
+        if self._manifestrevcache is None:
+            mrc = False
+            if self.ui.configbool(b'storage', b'manifest-rev-cache'):
+                mrc = revcaches.manifestrevcache(self)
+            self._manifestrevcache = mrc
+        return self._manifestrevcache or None
+
+    @unfilteredmethod
+    def changelogtextcache(self):
+        """return the persistent cache of the users and descriptions of the
+        changesets
+
+        None is returned if the cache is disabled (see
+        `storage.changelog-text-cache`)."""
+        if self._changelogtextcache is None:
+            ctc = False
+            if self.ui.configbool(b'storage', b'changelog-text-cache'):
+                ctc = revcaches.changelogtextcache(self)
+            self._changelogtextcache = ctc
+        if self._changelogtextcache is False:
+            return None
+        return self._changelogtextcache
+
+    @unfilteredmethod
+    def childrencache(self):
+        """return the persistent index of the children of each changeset
+
+        None is returned if the cache is disabled (see
+        `storage.children-cache`)."""
+        if self._childrencache is None:
+            cc = False
+            if self.ui.configbool(b'storage', b'children-cache'):
+                cc = revcaches.childrencache(self)
+            self._childrencache = cc
+        return self._childrencache or None
+
     def register_changeset(self, rev, changelogrevision):
         self.revbranchcache().setdata(rev, changelogrevision)
+        mrc = self.manifestrevcache()
+        if mrc is not None:
+            mrc.setdata(rev, changelogrevision)
 
     def branchtip(self, branch, ignoremissing=False):
         """return the tip node for a given branch
@@ -2941,6 +3065,26 @@ class localrepository:
                 rbc.branchinfo(r)
             rbc.write()
 
+        if repository.CACHE_MANIFEST_REV in caches:
+            mrc = unfi.manifestrevcache()
+            if mrc is not None:
+                start = 0
+                if tr is not None:
+                    start = tr.changes[b'origrepolen']
+                mrc.warm(start)
+                mrc.write()
+
+        if repository.CACHE_CHANGELOG_TEXT in caches:
+            ctc = unfi.changelogtextcache()
+            if ctc is not None:
+                ctc.warm()
+                ctc.write()
+
+        if repository.CACHE_CHILDREN in caches:
+            cc = unfi.childrencache()
+            if cc is not None:
+                cc.write()
+
         if repository.CACHE_FULL_MANIFEST in caches:
             # ensure the working copy parents are in the manifestfulltextcache
             for ctx in self[b'.'].parents():
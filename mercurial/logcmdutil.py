@@ -21,7 +21,10 @@ from typing import (
 )
 
 from .i18n import _
-from .node import wdirrev
+from .node import (
+    nullrev,
+    wdirrev,
+)
 
 from .thirdparty import attr
 
@@ -31,8 +34,10 @@ if typing.TYPE_CHECKING:
     import attr
 
 from . import (
+    context,
     dagop,
     diffutil,
+    encoding,
     error,
     formatter,
     graphmod,
@@ -40,6 +45,7 @@ from . import (
     mdiff,
     patch,
     pathutil,
+    phases,
     pycompat,
     revset,
     revsetlang,
@@ -325,6 +331,17 @@ class changesetprinter:
         if self.footer:
             self.ui.write(self.footer)
 
+    def batchable(self):
+        '''tell if showbatch() can be used instead of show()'''
+        return False
+
+    def showbatch(self, revs):
+        '''show a batch of visible changesets, without copies
+
+        The output is written right away, even if the displayer is buffered.
+        '''
+        raise error.ProgrammingError(b'%s cannot show batches' % type(self))
+
     def show(self, ctx, copies=None, **props):
         props = pycompat.byteskwargs(props)
         if self.buffered:
@@ -502,6 +519,62 @@ class changesetformatter(changesetprinter):
     def close(self):
         self._fm.end()
 
+    def batchable(self):
+        # buffering does not matter here: showbatch() is only used by
+        # displayrevs(), which flushes every changeset once shown
+        fm = self._fm
+        return (
+            fm.columnar
+            and not self.ui.debugflag
+            and not self._includestat
+            and not self._includediff
+            and not fm.datahint()
+        )
+
+    def showbatch(self, revs):
+        # same fields as _show(), resolved a column at a time from the
+        # changelog data instead of through a changectx per revision
+        fm = self._fm
+        repo = self.repo
+        hexfunc = fm.hexfunc
+        # the lookup in the filtered changelog checks the revisions are
+        # visible, the unfiltered one can be used from there
+        nodes = [repo.changelog.node(r) for r in revs]
+        columns = {b'rev': revs, b'node': [hexfunc(n) for n in nodes]}
+        if not self.ui.quiet:
+            cl = repo.unfiltered().changelog
+            changesets = [cl.changelogrevision(r) for r in revs]
+            phase = repo._phasecache.phase
+            parents = []
+            for r in revs:
+                p1, p2 = cl.parentrevs(r)
+                ps = [p1] if p2 == nullrev else [p1, p2]
+                parents.append([hexfunc(cl.node(p)) for p in ps])
+            columns[b'branch'] = [
+                encoding.tolocal(c.extra.get(b'branch')) for c in changesets
+            ]
+            columns[b'phase'] = [
+                phases.phasenames[phase(repo, r)] for r in revs
+            ]
+            columns[b'user'] = [c.user for c in changesets]
+            columns[b'date'] = [fm.formatdate(c.date) for c in changesets]
+            columns[b'desc'] = [c.description for c in changesets]
+            columns[b'bookmarks'] = [
+                fm.formatlist(repo.nodebookmarks(n), name=b'bookmark')
+                for n in nodes
+            ]
+            columns[b'tags'] = [
+                fm.formatlist(repo.nodetags(n), name=b'tag') for n in nodes
+            ]
+            columns[b'parents'] = [
+                fm.formatlist(ps, name=b'node') for ps in parents
+            ]
+            if self.ui.verbose:
+                columns[b'files'] = [
+                    fm.formatlist(c.files, name=b'file') for c in changesets
+                ]
+        fm.datacolumns(columns)
+
     def _show(self, ctx, copies, props):
         '''show a single changeset or file revision'''
         fm = self._fm
@@ -1312,12 +1385,38 @@ def displaygraphrevs(ui, repo, revs, displayer, getrenamed):
     displaygraph(ui, repo, revdag, displayer, graphmod.asciiedges, getrenamed)
 
 
+# number of revisions given at once to the displayers showing batches
+_DISPLAYBATCHSIZE = 256
+
+
 def displayrevs(ui, repo, revs, displayer, getcopies):
+    # the revisions to display are known to be visible: look them up once
+    # against the filtered changelog, so that the contexts can then use the
+    # unfiltered one without checking the filtering again for each field
+    cl = repo.changelog
+    batchable = getcopies is None and displayer.batchable()
+    batch = []
     for rev in revs:
-        ctx = repo[rev]
+        if batchable and rev is not None and rev != wdirrev:
+            batch.append(rev)
+            if len(batch) >= _DISPLAYBATCHSIZE:
+                displayer.showbatch(batch)
+                batch = []
+            continue
+        if batch:
+            displayer.showbatch(batch)
+            batch = []
+        if rev is None or rev == wdirrev:
+            ctx = repo[rev]
+        else:
+            ctx = context.changectx(
+                repo, rev, cl.node(rev), maybe_filtered=False
+            )
         copies = getcopies(ctx) if getcopies else None
         displayer.show(ctx, copies=copies)
         displayer.flush(ctx)
+    if batch:
+        displayer.showbatch(batch)
     displayer.close()
 
 
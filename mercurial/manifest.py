@@ -6,11 +6,14 @@
 # GNU General Public License version 2 or any later version.
 
 
+import collections
 import heapq
 import itertools
+import operator
 import struct
 import typing
 import weakref
+import zlib
 
 from typing import (
     ByteString,
@@ -36,6 +39,7 @@ from .node import (
 from . import (
     encoding,
     error,
+    lock as lockmod,
     match as matchmod,
     mdiff,
     pathutil,
@@ -58,6 +62,11 @@ propertycache = util.propertycache
 # Allow tests to more easily test the alternate path in manifestdict.fastdelta()
 FASTDELTA_TEXTDIFF_THRESHOLD = 1000
 
+# amount of manifest text split at once when iterating over a pure manifest
+_ITERCHUNKSIZE = 65536
+
+_deltaheader = struct.Struct(b">lll")
+
 
 def _parse(nodelen, data: bytes):
     # This method does a little bit of excessive-looking
@@ -99,240 +108,160 @@ def _text(it):
     return b''.join(lines)
 
 
-class lazymanifestiter:
-    def __init__(self, lm: '_LazyManifest') -> None:
-        self.pos = 0
-        self.lm = lm
-
-    def __iter__(self) -> 'lazymanifestiter':
-        return self
-
-    def next(self) -> bytes:
-        try:
-            data, pos = self.lm._get(self.pos)
-        except IndexError:
-            raise StopIteration
-        if pos == -1:
-            assert isinstance(data, tuple)
-            self.pos += 1
-            return data[0]
-        assert isinstance(data, bytes)
-        self.pos += 1
-        zeropos = data.find(b'\x00', pos)
-        return data[pos:zeropos]
-
-    __next__ = next
-
-
-class lazymanifestiterentries:
-    def __init__(self, lm: '_LazyManifest') -> None:
-        self.lm = lm
-        self.pos = 0
-
-    def __iter__(self) -> 'lazymanifestiterentries':
-        return self
-
-    def next(self) -> Tuple[bytes, bytes, bytes]:
-        try:
-            data, pos = self.lm._get(self.pos)
-        except IndexError:
-            raise StopIteration
-        if pos == -1:
-            assert isinstance(data, tuple)
-            self.pos += 1
-            return data
-        assert isinstance(data, bytes)
-        zeropos = data.find(b'\x00', pos)
-        nlpos = data.find(b'\n', pos)
-        if zeropos == -1 or nlpos == -1 or nlpos < zeropos:
-            raise error.StorageError(b'Invalid manifest line')
-        flags = data[nlpos - 1 : nlpos]
-        if flags in _manifestflags:
-            hlen = nlpos - zeropos - 2
-        else:
-            hlen = nlpos - zeropos - 1
-            flags = b''
-        if hlen != 2 * self.lm._nodelen:
-            raise error.StorageError(b'Invalid manifest line')
-        hashval = unhexlify(
-            data, self.lm.extrainfo[self.pos], zeropos + 1, hlen
-        )
-        self.pos += 1
-        return (data[pos:zeropos], hashval, flags)
-
-    __next__ = next
-
+_manifestflags = {b'', b'l', b't', b'x'}
 
-def unhexlify(data: bytes, extra: int, pos, length: int):
-    s = bin(data[pos : pos + length])
-    if extra:
-        s += bytes([extra & 0xFF])
-    return s
 
+def _splitlines(data: ByteString) -> Iterator[List[bytes]]:
+    """yield the lines of a manifest text, a chunk of text at a time
 
-def _cmp(a, b):
-    return (a > b) - (a < b)
+    Splitting a chunk is much cheaper than looking for the separators of
+    each line from Python, and only copies a chunk of the text at once.
+    """
+    end = len(data)
+    pos = 0
+    while pos < end:
+        cut = data.rfind(b'\n', pos, pos + _ITERCHUNKSIZE) + 1
+        if cut <= pos:
+            cut = data.find(b'\n', pos + _ITERCHUNKSIZE) + 1
+        lines = data[pos:cut].split(b'\n')
+        lines.pop()
+        pos = cut
+        yield lines
 
 
-_manifestflags = {b'', b'l', b't', b'x'}
+class _LazyManifest:
+    """A pure python manifest backed by a byte buffer.
 
+    ``data`` is the manifest text. It is never copied nor modified: lookups
+    bisect it on line boundaries and iteration walks it in place, so any
+    buffer providing ``find``, ``rfind`` and slicing to bytes (bytes, mmap)
+    can back the manifest without parsing it first.
 
-class _LazyManifest:
-    """A pure python manifest backed by a byte string.  It is supplimented with
-    internal lists as it is modified, until it is compacted back to a pure byte
-    string.
+    Modifications are kept in a small overlay on top of ``data``:
 
-    ``data`` is the initial manifest data.
+    ``added`` maps the names of added or modified entries to their
+    (node, flags) tuple.
 
-    ``positions`` is a list of offsets, one per manifest entry.  Positive
-    values are offsets into ``data``, negative values are offsets into the
-    ``extradata`` list.  When an entry is removed, its entry is dropped from
-    ``positions``.  The values are encoded such that when walking the list and
-    indexing into ``data`` or ``extradata`` as appropriate, the entries are
-    sorted by filename.
+    ``removed`` is the set of all names touched since ``data`` was parsed:
+    the entries of ``data`` it contains are hidden, the ones that are still
+    alive are in ``added``.
 
-    ``extradata`` is a list of (key, hash, flags) for entries that were added or
-    modified since the manifest was created or compacted.
+    The overlay is merged back into a new buffer when the text is requested.
     """
 
     def __init__(
         self,
         nodelen: int,
-        data: bytes,
-        positions=None,
-        extrainfo=None,
-        extradata=None,
-        hasremovals: bool = False,
+        data: ByteString,
+        added: Optional[Dict[bytes, Tuple[bytes, bytes]]] = None,
+        removed: Optional[Set[bytes]] = None,
+        length: Optional[int] = None,
     ):
         self._nodelen = nodelen
-        if positions is None:
-            self.positions = self.findlines(data)
-            self.extrainfo = [0] * len(self.positions)
-            self.data = data
-            self.extradata = []
-            self.hasremovals = False
-        else:
-            self.positions = positions[:]
-            self.extrainfo = extrainfo[:]
-            self.extradata = extradata[:]
-            self.data = data
-            self.hasremovals = hasremovals
-
-    def findlines(self, data: bytes) -> List[int]:
+        if length is None:
+            length = self._checklines(data)
+        self.data = data
+        self.added = {} if added is None else added.copy()
+        self.removed = set() if removed is None else removed.copy()
+        self._len = length
+
+    @staticmethod
+    def _checklines(data: ByteString) -> int:
+        """validate the manifest text and return its number of entries
+
+        The text is split a chunk at a time, the whole text is never copied.
+        """
         if not data:
-            return []
-        pos = data.find(b"\n")
-        if pos == -1 or data[-1:] != b'\n':
+            return 0
+        if data[-1:] != b'\n':
             raise ValueError(b"Manifest did not end in a newline.")
-        positions = [0]
-        prev = data[: data.find(b'\x00')]
-        while pos < len(data) - 1 and pos != -1:
-            positions.append(pos + 1)
-            nexts = data[pos + 1 : data.find(b'\x00', pos + 1)]
-            if nexts < prev:
+        count = 0
+        last = b''
+        for lines in _splitlines(data):
+            # the NUL separator sorts before any byte a path can contain, so
+            # comparing whole lines matches the ordering of the paths
+            if lines[0] < last or any(
+                map(operator.gt, lines, itertools.islice(lines, 1, None))
+            ):
                 raise ValueError(b"Manifest lines not in sorted order.")
-            prev = nexts
-            pos = data.find(b"\n", pos + 1)
-        return positions
-
-    def _get(
-        self, index: int
-    ) -> Tuple[Union[bytes, Tuple[bytes, bytes, bytes]], int]:
-        # get the position encoded in pos:
-        #   positive number is an index in 'data'
-        #   negative number is in extrapieces
-        pos = self.positions[index]
-        if pos >= 0:
-            return self.data, pos
-        return self.extradata[-pos - 1], -1
-
-    def _getkey(self, pos) -> bytes:
-        if pos >= 0:
-            return self.data[pos : self.data.find(b'\x00', pos + 1)]
-        return self.extradata[-pos - 1][0]
-
-    def bsearch(self, key: bytes) -> int:
-        first = 0
-        last = len(self.positions) - 1
-
-        while first <= last:
-            midpoint = (first + last) // 2
-            nextpos = self.positions[midpoint]
-            candidate = self._getkey(nextpos)
-            r = _cmp(key, candidate)
-            if r == 0:
-                return midpoint
-            else:
-                if r < 0:
-                    last = midpoint - 1
-                else:
-                    first = midpoint + 1
-        return -1
-
-    def bsearch2(self, key: bytes) -> Tuple[int, bool]:
-        # same as the above, but will always return the position
-        # done for performance reasons
-        first = 0
-        last = len(self.positions) - 1
-
-        while first <= last:
-            midpoint = (first + last) // 2
-            nextpos = self.positions[midpoint]
-            candidate = self._getkey(nextpos)
-            r = _cmp(key, candidate)
-            if r == 0:
-                return (midpoint, True)
-            else:
-                if r < 0:
-                    last = midpoint - 1
-                else:
-                    first = midpoint + 1
-        return (first, False)
+            last = lines[-1]
+            count += len(lines)
+        return count
 
-    def __contains__(self, key: bytes) -> bool:
-        return self.bsearch(key) != -1
+    def _bsearch(self, key: bytes, lo: int = 0) -> Tuple[int, int]:
+        """return the (start, end) offsets of the line for ``key``
 
-    def __getitem__(self, key: bytes) -> Tuple[bytes, bytes]:
-        if not isinstance(key, bytes):
-            raise TypeError(b"getitem: manifest keys must be a bytes.")
-        needle = self.bsearch(key)
-        if needle == -1:
-            raise KeyError
-        data, pos = self._get(needle)
-        if pos == -1:
-            assert isinstance(data, tuple)
-            return (data[1], data[2])
-
-        assert isinstance(data, bytes)
-        zeropos = data.find(b'\x00', pos)
-        nlpos = data.find(b'\n', zeropos)
-        assert 0 <= needle <= len(self.positions)
-        assert len(self.extrainfo) == len(self.positions)
-        if zeropos == -1 or nlpos == -1 or nlpos < zeropos:
-            raise error.StorageError(b'Invalid manifest line')
-        hlen = nlpos - zeropos - 1
-        flags = data[nlpos - 1 : nlpos]
+        If ``key`` is not in ``data``, start == end and is the offset where
+        it would be inserted. ``lo`` must be the start of a line.
+        """
+        data = self.data
+        hi = len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # lo is always the start of a line, so this never goes below it
+            start = data.rfind(b'\n', 0, mid) + 1
+            zeropos = data.find(b'\x00', start)
+            nlpos = data.find(b'\n', start)
+            if zeropos == -1 or nlpos == -1 or nlpos < zeropos:
+                raise error.StorageError(b'Invalid manifest line')
+            candidate = data[start:zeropos]
+            if candidate < key:
+                lo = nlpos + 1
+            elif key < candidate:
+                hi = start
+            else:
+                return start, nlpos + 1
+        return lo, lo
+
+    def _basefind(self, key: bytes) -> int:
+        start, end = self._bsearch(key)
+        if start == end:
+            return -1
+        return start
+
+    def _parsevalue(self, value: bytes) -> Tuple[bytes, bytes]:
+        """parse the part of a line between the NUL and the newline"""
+        hlen = len(value)
+        flags = value[-1:]
         if flags in _manifestflags:
             hlen -= 1
         else:
             flags = b''
         if hlen != 2 * self._nodelen:
             raise error.StorageError(b'Invalid manifest line')
-        hashval = unhexlify(data, self.extrainfo[needle], zeropos + 1, hlen)
-        return (hashval, flags)
+        return bin(value[:hlen]), flags
+
+    def __contains__(self, key: bytes) -> bool:
+        if key in self.added:
+            return True
+        if key in self.removed:
+            return False
+        return self._basefind(key) != -1
+
+    def __getitem__(self, key: bytes) -> Tuple[bytes, bytes]:
+        if not isinstance(key, bytes):
+            raise TypeError(b"getitem: manifest keys must be a bytes.")
+        value = self.added.get(key)
+        if value is not None:
+            return value
+        if key in self.removed:
+            raise KeyError
+        start = self._basefind(key)
+        if start == -1:
+            raise KeyError
+        zeropos = start + len(key)
+        nlpos = self.data.find(b'\n', zeropos)
+        return self._parsevalue(self.data[zeropos + 1 : nlpos])
 
     def __delitem__(self, key: bytes) -> None:
-        needle, found = self.bsearch2(key)
-        if not found:
+        if key in self.added:
+            # the name is already in removed
+            del self.added[key]
+        elif key not in self.removed and self._basefind(key) != -1:
+            self.removed.add(key)
+        else:
             raise KeyError
-        cur = self.positions[needle]
-        self.positions = self.positions[:needle] + self.positions[needle + 1 :]
-        self.extrainfo = self.extrainfo[:needle] + self.extrainfo[needle + 1 :]
-        if cur >= 0:
-            # This does NOT unsort the list as far as the search functions are
-            # concerned, as they only examine lines mapped by self.positions.
-            self.data = self.data[:cur] + b'\x00' + self.data[cur + 1 :]
-            self.hasremovals = True
+        self._len -= 1
 
     def __setitem__(self, key: bytes, value: Tuple[bytes, bytes]):
         if not isinstance(key, bytes):
@@ -347,97 +276,45 @@ class _LazyManifest:
         flags = value[1]
         if not isinstance(flags, bytes) or len(flags) > 1:
             raise TypeError(b"flags must a 0 or 1 byte string, got %r", flags)
-        needle, found = self.bsearch2(key)
-        if found:
-            # put the item
-            pos = self.positions[needle]
-            if pos < 0:
-                self.extradata[-pos - 1] = (key, hashval, value[1])
+        if key not in self.added:
+            if key in self.removed:
+                # the entry from data is shadowed by the new value
+                self._len += 1
+            elif self._basefind(key) != -1:
+                self.removed.add(key)
             else:
-                # just don't bother
-                self.extradata.append((key, hashval, value[1]))
-                self.positions[needle] = -len(self.extradata)
-        else:
-            # not found, put it in with extra positions
-            self.extradata.append((key, hashval, value[1]))
-            self.positions = (
-                self.positions[:needle]
-                + [-len(self.extradata)]
-                + self.positions[needle:]
-            )
-            self.extrainfo = (
-                self.extrainfo[:needle] + [0] + self.extrainfo[needle:]
-            )
+                self._len += 1
+        self.removed.add(key)
+        self.added[key] = value
 
     def copy(self) -> '_LazyManifest':
-        # XXX call _compact like in C?
-        return _lazymanifest(
+        # data is never modified in place, the copy can share it
+        return _LazyManifest(
             self._nodelen,
             self.data,
-            self.positions,
-            self.extrainfo,
-            self.extradata,
-            self.hasremovals,
+            self.added,
+            self.removed,
+            self._len,
         )
 
     def _compact(self) -> None:
-        # hopefully not called TOO often
-        if len(self.extradata) == 0 and not self.hasremovals:
+        if not self.removed:
             return
+        data = self.data
+        added = self.added
         l = []
-        i = 0
-        offset = 0
-        self.extrainfo = [0] * len(self.positions)
-        while i < len(self.positions):
-            if self.positions[i] >= 0:
-                cur = self.positions[i]
-                last_cut = cur
-
-                # Collect all contiguous entries in the buffer at the current
-                # offset, breaking out only for added/modified items held in
-                # extradata, or a deleted line prior to the next position.
-                while True:
-                    self.positions[i] = offset
-                    i += 1
-                    if i == len(self.positions) or self.positions[i] < 0:
-                        break
-
-                    # A removed file has no positions[] entry, but does have an
-                    # overwritten first byte.  Break out and find the end of the
-                    # current good entry/entries if there is a removed file
-                    # before the next position.
-                    if (
-                        self.hasremovals
-                        and self.data.find(b'\n\x00', cur, self.positions[i])
-                        != -1
-                    ):
-                        break
-
-                    offset += self.positions[i] - cur
-                    cur = self.positions[i]
-                end_cut = self.data.find(b'\n', cur)
-                if end_cut != -1:
-                    end_cut += 1
-                offset += end_cut - cur
-                l.append(self.data[last_cut:end_cut])
-            else:
-                while i < len(self.positions) and self.positions[i] < 0:
-                    cur = self.positions[i]
-                    t = self.extradata[-cur - 1]
-                    l.append(self._pack(t))
-                    self.positions[i] = offset
-                    # Hashes are either 20 bytes (old sha1s) or 32
-                    # bytes (new non-sha1).
-                    hlen = 20
-                    if len(t[1]) > 25:
-                        hlen = 32
-                    if len(t[1]) > hlen:
-                        self.extrainfo[i] = ord(t[1][hlen + 1])
-                    offset += len(l[-1])
-                    i += 1
+        last = 0
+        for key in sorted(self.removed):
+            start, end = self._bsearch(key, last)
+            l.append(data[last:start])
+            value = added.get(key)
+            if value is not None:
+                l.append(self._pack((key,) + value))
+            last = end
+        l.append(data[last:])
         self.data = b''.join(l)
-        self.hasremovals = False
-        self.extradata = []
+        self.added = {}
+        self.removed = set()
 
     def _pack(self, d: Tuple[bytes, bytes, bytes]) -> bytes:
         n = d[1]
@@ -448,6 +325,38 @@ class _LazyManifest:
         self._compact()
         return self.data
 
+    def _iterate(self, entries: bool):
+        """walk data and the overlay in sorted order
+
+        Yields the names only, unless ``entries`` is set.
+        """
+        data = self.data
+        added = self.added
+        removed = self.removed
+        pending = sorted(added) if added else []
+        pendingidx = 0
+        pendingcount = len(pending)
+        for lines in _splitlines(data):
+            for line in lines:
+                key, sep, value = line.partition(b'\x00')
+                while pendingidx < pendingcount and pending[pendingidx] < key:
+                    k = pending[pendingidx]
+                    pendingidx += 1
+                    if entries:
+                        yield (k,) + added[k]
+                    else:
+                        yield k
+                if key not in removed:
+                    if entries:
+                        yield (key,) + self._parsevalue(value)
+                    else:
+                        yield key
+        for k in pending[pendingidx:]:
+            if entries:
+                yield (k,) + added[k]
+            else:
+                yield k
+
     def diff(
         self, m2: '_LazyManifest', clean: bool = False
     ) -> Dict[
@@ -457,44 +366,71 @@ class _LazyManifest:
         ],
     ]:
         '''Finds changes between the current manifest and m2.'''
-        # XXX think whether efficiency matters here
         diff = {}
 
-        for fn, e1, flags in self.iterentries():
-            if fn not in m2:
-                diff[fn] = (e1, flags), (None, b'')
+        if self.data is m2.data and not clean:
+            # both manifests derive from the same text, only the entries
+            # touched by either overlay can differ
+            missing = (None, b'')
+            for fn in self.removed | m2.removed:
+                e1 = self._get(fn, missing)
+                e2 = m2._get(fn, missing)
+                if e1 != e2:
+                    diff[fn] = e1, e2
+            return diff
+
+        # merge the two sorted streams of entries
+        it1 = self.iterentries()
+        it2 = m2.iterentries()
+        e1 = next(it1, None)
+        e2 = next(it2, None)
+        while e1 is not None or e2 is not None:
+            if e2 is None or (e1 is not None and e1[0] < e2[0]):
+                diff[e1[0]] = (e1[1], e1[2]), (None, b'')
+                e1 = next(it1, None)
+            elif e1 is None or e2[0] < e1[0]:
+                diff[e2[0]] = (None, b''), (e2[1], e2[2])
+                e2 = next(it2, None)
             else:
-                e2 = m2[fn]
-                if (e1, flags) != e2:
-                    diff[fn] = (e1, flags), e2
+                if e1[1:] != e2[1:]:
+                    diff[e1[0]] = (e1[1], e1[2]), (e2[1], e2[2])
                 elif clean:
-                    diff[fn] = None
-
-        for fn, e2, flags in m2.iterentries():
-            if fn not in self:
-                diff[fn] = (None, b''), (e2, flags)
+                    diff[e1[0]] = None
+                e1 = next(it1, None)
+                e2 = next(it2, None)
 
         return diff
 
-    def iterentries(self) -> lazymanifestiterentries:
-        return lazymanifestiterentries(self)
+    def _get(self, key: bytes, default):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
-    def iterkeys(self) -> lazymanifestiter:
-        return lazymanifestiter(self)
+    def iterentries(self) -> Iterator[Tuple[bytes, bytes, bytes]]:
+        return self._iterate(True)
+
+    def iterkeys(self) -> Iterator[bytes]:
+        return self._iterate(False)
 
-    def __iter__(self) -> lazymanifestiter:
-        return lazymanifestiter(self)
+    def __iter__(self) -> Iterator[bytes]:
+        return self._iterate(False)
 
     def __len__(self) -> int:
-        return len(self.positions)
+        return self._len
 
     def filtercopy(self, filterfn: Callable[[bytes], bool]) -> '_LazyManifest':
-        # XXX should be optimized
-        c = _lazymanifest(self._nodelen, b'')
-        for f, n, fl in self.iterentries():
-            if filterfn(f):
-                c[f] = n, fl
-        return c
+        self._compact()
+        data = self.data
+        l = []
+        end = len(data)
+        pos = 0
+        while pos < end:
+            nlpos = data.find(b'\n', pos)
+            if filterfn(data[pos : data.find(b'\x00', pos)]):
+                l.append(data[pos : nlpos + 1])
+            pos = nlpos + 1
+        return _LazyManifest(self._nodelen, b''.join(l), length=len(l))
 
 
 try:
@@ -838,6 +774,134 @@ def _addlistdelta(
     return deltatext, newaddlist
 
 
+def _deltahunks(delta: bytes) -> List[Tuple[int, int, bytes]]:
+    """return the list of (start, end, data) hunks of a binary delta"""
+    hunks = []
+    pos = 0
+    while pos < len(delta):
+        start, end, length = _deltaheader.unpack_from(delta, pos)
+        pos += _deltaheader.size
+        hunks.append((start, end, delta[pos : pos + length]))
+        pos += length
+    return hunks
+
+
+def _composedeltas(
+    basesize: int, deltas: Iterable[bytes]
+) -> List[Tuple[int, int, bytes]]:
+    """compose a sequence of binary deltas into a single list of hunks
+
+    The returned (start, end, data) hunks apply to the text the first delta
+    applies to, so the intermediate texts never need to be built.
+
+    The text is tracked as a list of (source, start, end) segments, where
+    source is None for ranges of the base text and the literal data of a hunk
+    otherwise.
+    """
+    segments = [(None, 0, basesize)]
+    for delta in deltas:
+        patched = []
+        remaining = collections.deque(segments)
+        pos = 0
+        for start, end, data in _deltahunks(delta):
+            # keep the segments before the hunk
+            while pos < start:
+                src, s, e = remaining.popleft()
+                if pos + e - s <= start:
+                    patched.append((src, s, e))
+                    pos += e - s
+                else:
+                    cut = s + start - pos
+                    patched.append((src, s, cut))
+                    remaining.appendleft((src, cut, e))
+                    pos = start
+            # drop the segments replaced by the hunk
+            while pos < end:
+                src, s, e = remaining.popleft()
+                if pos + e - s <= end:
+                    pos += e - s
+                else:
+                    cut = s + end - pos
+                    remaining.appendleft((src, cut, e))
+                    pos = end
+            if data:
+                patched.append((data, 0, len(data)))
+        patched.extend(remaining)
+        segments = patched
+
+    hunks = []
+    basepos = 0
+    pending = []
+    for src, s, e in segments:
+        if s == e:
+            continue
+        if src is None:
+            if s != basepos or pending:
+                hunks.append((basepos, s, b''.join(pending)))
+                pending = []
+            basepos = e
+        else:
+            pending.append(src[s:e])
+    if basepos != basesize or pending:
+        hunks.append((basepos, basesize, b''.join(pending)))
+    return hunks
+
+
+def _deltachain(
+    store: 'ManifestRevlog', base: int, rev: int
+) -> Optional[List[int]]:
+    """return the revisions whose deltas lead from `base` to `rev`
+
+    The revisions are returned in the order the deltas must be applied. None
+    is returned if `base` is not part of the delta chain of `rev`.
+    """
+    chain = []
+    while rev != base:
+        if rev < base or rev == nullrev:
+            return None
+        chain.append(rev)
+        rev = store.deltaparent(rev)
+    chain.reverse()
+    return chain
+
+
+def _diffhunks(
+    nodelen: int, base: ByteString, hunks: Iterable[Tuple[int, int, bytes]]
+) -> Optional[
+    Dict[
+        bytes,
+        Tuple[Tuple[Optional[bytes], bytes], Tuple[Optional[bytes], bytes]],
+    ]
+]:
+    """compute a manifest diff from hunks applying to the `base` text
+
+    The result has the same format as `manifestdict.diff`. None is returned if
+    the hunks do not align on manifest lines.
+    """
+    old = {}
+    new = {}
+    for start, end, data in hunks:
+        if start > 0 and base[start - 1 : start] != b'\n':
+            return None
+        if end > 0 and base[end - 1 : end] != b'\n':
+            return None
+        if data and data[-1:] != b'\n':
+            return None
+        for f, n, fl in _parse(nodelen, bytes(base[start:end])):
+            old[f] = (n, fl)
+        for f, n, fl in _parse(nodelen, data):
+            new[f] = (n, fl)
+    diff = {}
+    for f, e1 in old.items():
+        e2 = new.get(f, (None, b''))
+        if e1 != e2:
+            diff[f] = (e1, e2)
+    for f, e2 in new.items():
+        if f not in old:
+            diff[f] = ((None, b''), e2)
+    return diff
+
+
 def _splittopdir(f: bytes) -> Tuple[bytes, bytes]:
     if b'/' in f:
         dir, subpath = f.split(b'/', 1)
@@ -1674,6 +1738,194 @@ class manifestfulltextcache(util.lrucachedict):
         self._read = False
 
 
+# size of the manifest data and checksum of the node and data, followed by
+# the node and the data
+_sharedcacheheader = struct.Struct(b'>LL')
+
+
+class manifestsharedcache:
+    """Manifest full texts cache shared by all the processes using a repository
+
+    The cache is a single file in `.hg/cache` made of records, up to EOF:
+
+    - 4 bytes size of the manifest data,
+    - 4 bytes crc32 checksum of the node and manifest data,
+    - <nodelen> bytes node,
+    - <size> bytes manifest data.
+
+    Readers never take a lock: the file is mmapped and only the record headers
+    are walked to build an index of the available nodes. The checksum of a
+    record is verified before its data is returned. The file is only ever
+    appended to, or replaced as a whole, so the content of a mapping never
+    changes under a reader; a reader that misses looks for records appended
+    since it built its index.
+
+    Writers hold a lock while they append new records at the end of the file,
+    and skip the update when another process holds it. When the file would
+    grow over `maxsize`, it is compacted: the most recent records that fit in
+    half of `maxsize` are written to a new file that atomically replaces the
+    old one.
+
+    A node always maps to the same manifest text, so records never need to be
+    invalidated when history is rewritten.
+    """
+
+    _file = b'manifestsharedcache-v1'
+    _lockfile = b'manifestsharedcache-v1.lock'
+
+    def __init__(self, opener, nodelen, maxsize):
+        self._opener = opener
+        self._nodelen = nodelen
+        self._maxsize = maxsize
+        self._clear()
+
+    def _clear(self):
+        self._data = b''
+        self._index = {}
+        # identity of the file backing _data, and offset of the end of the
+        # last valid record in it
+        self._identity = None
+        self._end = 0
+        self._valid = True
+
+    def _refresh(self):
+        """update the index with the records added to the file since the
+        last refresh
+
+        Return True if new records were found."""
+        try:
+            with self._opener(self._file) as fp:
+                st = util.fstat(fp)
+                identity = (st.st_dev, st.st_ino)
+                if identity == self._identity and st.st_size == len(self._data):
+                    return False
+                if self._opener.is_mmap_safe(self._file):
+                    data = util.mmapread(fp, st.st_size)
+                else:
+                    data = fp.read()
+        except (IOError, OSError):
+            # the file is allowed to be missing
+            self._clear()
+            return False
+
+        if identity != self._identity or len(data) < self._end:
+            # the file was compacted, its records have moved
+            self._index = {}
+            self._end = 0
+        self._identity = identity
+        self._data = data
+        self._scan()
+        return True
+
+    def _scan(self):
+        data = self._data
+        index = self._index
+        nodelen = self._nodelen
+        headersize = _sharedcacheheader.size + nodelen
+        offset = self._end
+        while offset + headersize <= len(data):
+            size, checksum = _sharedcacheheader.unpack_from(data, offset)
+            start = offset + headersize
+            if start + size > len(data):
+                break
+            node = bytes(data[start - nodelen : start])
+            index[node] = (start, size, checksum)
+            offset = start + size
+        self._end = offset
+        # a crash can leave a partial record at the end of the file, any
+        # later record would not be found until the file is compacted
+        self._valid = offset == len(data)
+
+    def __contains__(self, node):
+        if node not in self._index:
+            self._refresh()
+        return node in self._index
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index)
+
+    def get(self, node):
+        """return the manifest text for node, or None if it is not cached"""
+        entry = self._index.get(node)
+        if entry is None and self._refresh():
+            entry = self._index.get(node)
+        if entry is None:
+            return None
+        start, size, checksum = entry
+        text = self._data[start : start + size]
+        if zlib.crc32(text, zlib.crc32(node)) != checksum:
+            del self._index[node]
+            self._valid = False
+            return None
+        return bytes(text)
+
+    def _record(self, node, text):
+        checksum = zlib.crc32(text, zlib.crc32(node))
+        return _sharedcacheheader.pack(len(text), checksum) + node + text
+
+    def add(self, node, text):
+        """append the manifest text for node to the cache file
+
+        The index is not refreshed first, callers that did not just miss in
+        `get` should check `node in self` to not add duplicate records.
+        """
+        if node in self._index:
+            return
+        record = self._record(node, text)
+        if len(record) > self._maxsize // 2:
+            return
+        try:
+            # signalsafe=False, this can run in hgweb threads
+            l = lockmod.lock(
+                self._opener, self._lockfile, timeout=0, signalsafe=False
+            )
+        except error.LockError:
+            # another process is updating the cache, skip this one
+            return
+        with l:
+            try:
+                with self._opener(self._file, b'ab') as fp:
+                    fp.seek(0, 2)
+                    if self._valid and fp.tell() + len(record) <= self._maxsize:
+                        fp.write(record)
+                        return
+            except (IOError, OSError):
+                return
+            self._compact(record)
+
+    def _compact(self, record):
+        """rewrite the cache with the most recent records and `record`
+
+        The lock must be held."""
+        self._identity = None
+        self._refresh()
+        budget = self._maxsize // 2 - len(record)
+        records = [record]
+        entries = sorted(self._index.items(), key=lambda e: e[1][0])
+        for node, (start, size, checksum) in reversed(entries):
+            text = self._data[start : start + size]
+            if zlib.crc32(text, zlib.crc32(node)) != checksum:
+                continue
+            oldrecord = self._record(node, text)
+            if len(oldrecord) > budget:
+                continue
+            budget -= len(oldrecord)
+            records.append(oldrecord)
+        try:
+            with self._opener(self._file, b'wb', atomictemp=True) as fp:
+                for r in reversed(records):
+                    fp.write(r)
+        except (IOError, OSError):
+            pass
+        self._clear()
+
+    def clear(self, clear_persisted_data=False):
+        self._clear()
+        if clear_persisted_data:
+            self._opener.tryunlink(self._file)
+
+
 # and upper bound of what we expect from compression
 # (real live value seems to be "3")
 MAXCOMPRESSION = 3
@@ -1713,15 +1965,18 @@ class ManifestRevlog:
         cachesize = 4
         optiontreemanifest = False
         persistentnodemap = False
+        self._sharedcachesize = None
         opts = getattr(opener, 'options', None)
         if opts is not None:
             cachesize = opts.get(b'manifestcachesize', cachesize)
+            self._sharedcachesize = opts.get(b'manifest-shared-cache-size')
             optiontreemanifest = opts.get(b'treemanifest', False)
             persistentnodemap = opts.get(b'persistent-nodemap', False)
 
         self._treeondisk = optiontreemanifest or treemanifest
 
         self._fulltextcache = manifestfulltextcache(cachesize)
+        self._sharedcache = None
 
         if tree:
             assert self._treeondisk, (tree, b'opts is %r' % opts)
@@ -1766,6 +2021,10 @@ class ManifestRevlog:
             return
 
         self._fulltextcache._opener = repo.wcachevfs
+        if self._sharedcachesize and self._sharedcache is None:
+            self._sharedcache = manifestsharedcache(
+                repo.cachevfs, self.nodeconstants.nodelen, self._sharedcachesize
+            )
         if repo._currentlock(repo._wlockref) is None:
             return
 
@@ -1785,6 +2044,13 @@ class ManifestRevlog:
                 # there's a different manifest in play now, abort
                 return
             self._fulltextcache.write()
+            if self._sharedcache is not None:
+                # share the manifests created while the lock was held
+                for node in self._fulltextcache:
+                    if node in self._sharedcache:
+                        continue
+                    text = self._fulltextcache.peek(node)
+                    self._sharedcache.add(node, bytes(text))
 
         repo._afterlock(persistmanifestcache)
 
@@ -1792,9 +2058,16 @@ class ManifestRevlog:
     def fulltextcache(self):
         return self._fulltextcache
 
+    @property
+    def sharedcache(self):
+        """the cache shared with the other processes, None if disabled"""
+        return self._sharedcache
+
     def clearcaches(self, clear_persisted_data=False):
         self._revlog.clearcaches()
         self._fulltextcache.clear(clear_persisted_data=clear_persisted_data)
+        if self._sharedcache is not None:
+            self._sharedcache.clear(clear_persisted_data=clear_persisted_data)
         self._dirlogcache = {self.tree: self}
 
     def dirlog(self, d):
@@ -2251,20 +2524,29 @@ class ManifestCtx:
     def parents(self) -> Tuple[bytes, bytes]:
         return self._storage().parents(self._node)
 
+    def _fulltext(self) -> bytes:
+        store = self._storage()
+        if self._node in store.fulltextcache:
+            return pycompat.bytestr(store.fulltextcache[self._node])
+        sharedcache = getattr(store, 'sharedcache', None)
+        text = None
+        if sharedcache is not None:
+            text = sharedcache.get(self._node)
+        if text is None:
+            text = store.revision(self._node)
+            if sharedcache is not None:
+                sharedcache.add(self._node, text)
+        arraytext = bytearray(text)
+        store.fulltextcache[self._node] = arraytext
+        return text
+
     def read(self) -> 'ManifestDict':
         if self._data is None:
             nc = self._manifestlog.nodeconstants
             if self._node == nc.nullid:
                 self._data = manifestdict(nc.nodelen)
             else:
-                store = self._storage()
-                if self._node in store.fulltextcache:
-                    text = pycompat.bytestr(store.fulltextcache[self._node])
-                else:
-                    text = store.revision(self._node)
-                    arraytext = bytearray(text)
-                    store.fulltextcache[self._node] = arraytext
-                self._data = manifestdict(nc.nodelen, text)
+                self._data = manifestdict(nc.nodelen, self._fulltext())
         return self._data
 
     def readfast(self, shallow: bool = False) -> 'ManifestDict':
@@ -2372,6 +2654,70 @@ class ManifestCtx:
         d = mdiff.patchtext(store.revdiff(store.deltaparent(r), r))
         return manifestdict(store.nodeconstants.nodelen, d)
 
+    def diff(
+        self,
+        other: 'ManifestCtx',
+        match: Optional[matchmod.basematcher] = None,
+        clean: bool = False,
+    ) -> Dict[
+        bytes,
+        Optional[
+            Tuple[Tuple[Optional[bytes], bytes], Tuple[Optional[bytes], bytes]]
+        ],
+    ]:
+        """see `imanifestrevisionstored` documentation"""
+        if not clean and (self._data is None or other._data is None):
+            d = self._read_storage_chain_diff(other)
+            if d is not None:
+                if match is not None and not match.always():
+                    d = {f: v for f, v in d.items() if match(f)}
+                return d
+        return self.read().diff(other.read(), match=match, clean=clean)
+
+    def _read_storage_chain_diff(self, other: 'ManifestCtx'):
+        """compute the diff with `other` from the deltas between them
+
+        This only works if one of the revision is part of the delta chain of
+        the other one. In that case, the deltas between them are composed and
+        only the touched lines are parsed, reading a single fulltext.
+
+        Return None if the diff cannot be computed that way.
+        """
+        store = self._storage()
+        if other._storage() is not store:
+            return None
+        nullid = self._manifestlog.nodeconstants.nullid
+        if self._node == nullid or other._node == nullid:
+            return None
+        nodelen = store.nodeconstants.nodelen
+        r1 = store.rev(self._node)
+        r2 = store.rev(other._node)
+        if r1 == r2:
+            return {}
+        if r1 > r2:
+            chain = _deltachain(store, r2, r1)
+            if chain is None:
+                return None
+            base, revs = other, chain
+        else:
+            chain = _deltachain(store, r1, r2)
+            if chain is None:
+                return None
+            base, revs = self, chain
+        text = base._fulltext()
+        deltas = []
+        for r in revs:
+            deltas.append(store.revdiff(store.deltaparent(r), r))
+        try:
+            hunks = _composedeltas(len(text), deltas)
+            d = _diffhunks(nodelen, text, hunks)
+        except (IndexError, ValueError, struct.error):
+            # malformed or non-line based delta, use the slow path
+            return None
+        if d is not None and base is other:
+            d = {f: (e2, e1) for f, (e1, e2) in d.items()}
+        return d
+
     def find(self, key: bytes) -> Tuple[bytes, bytes]:
         return self.read().find(key)
 
@@ -2689,6 +3035,21 @@ class TreeManifestCtx:
         else:
             return self.read()
 
+    def diff(
+        self,
+        other: 'TreeManifestCtx',
+        match: Optional[matchmod.basematcher] = None,
+        clean: bool = False,
+    ) -> Dict[
+        bytes,
+        Optional[
+            Tuple[Tuple[Optional[bytes], bytes], Tuple[Optional[bytes], bytes]]
+        ],
+    ]:
+        """see `imanifestrevisionstored` documentation"""
+        # tree manifests already skip the unchanged directories
+        return self.read().diff(other.read(), match=match, clean=clean)
+
     def find(self, key: bytes) -> Tuple[bytes, bytes]:
         return self.read().find(key)
 
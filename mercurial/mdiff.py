@@ -45,6 +45,7 @@ class diffopts:
     ignorewsamount ignores changes in the amount of whitespace
     ignoreblanklines ignores changes whose lines are all blank
     upgrade generates git diffs to avoid data loss
+    histogram matches lines with the histogram diff algorithm
     """
 
     _HAS_DYNAMIC_ATTRIBUTES = True
@@ -66,6 +67,7 @@ class diffopts:
         b'showsimilarity': False,
         b'worddiff': False,
         b'xdiff': False,
+        b'histogram': False,
     }
 
     def __init__(self, **opts):
@@ -207,6 +209,8 @@ def blocksinrange(blocks, rangeb):
 
 
 def chooseblocksfunc(opts=None):
+    if opts is not None and opts.histogram:
+        return bdiff.histogramblocks
     if opts is None or not opts.xdiff or not hasattr(bdiff, 'xdiffblocks'):
         return bdiff.blocks
     else:
@@ -543,8 +547,9 @@ def patch(a, bin):
 
 
 # similar to difflib.SequenceMatcher.get_matching_blocks
-def get_matching_blocks(a, b):
-    return [(d[0], d[2], d[1] - d[0]) for d in bdiff.blocks(a, b)]
+def get_matching_blocks(a, b, opts=None):
+    blocks = chooseblocksfunc(opts)(a, b)
+    return [(d[0], d[2], d[1] - d[0]) for d in blocks]
 
 
 def trivialdiffheader(length):
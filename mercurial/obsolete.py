@@ -804,6 +804,58 @@ class obsstore:
             seennodes |= pendingnodes
         return seenmarkers
 
+    def sortedrelevantmarkers(self, nodes):
+        """yield the markers of `relevantmarkers(nodes)`, sorted as
+        `obsutil.sortedmarkers` does
+
+        Only the relevant nodes are gathered, a marker is relevant if one of
+        them is among its successors, or if it prunes one of them or one of
+        their children. The markers are then sorted one predecessor at a
+        time, without holding the sort keys of all of them."""
+        precursorsmarkers = self.predecessors
+        succsmarkers = self.successors
+        children = self.children
+        seennodes = set(nodes)
+        pendingnodes = list(seennodes)
+        while pendingnodes:
+            current = pendingnodes.pop()
+            for m in precursorsmarkers.get(current, ()):
+                if m[0] not in seennodes:
+                    seennodes.add(m[0])
+                    pendingnodes.append(m[0])
+            for m in children.get(current, ()):
+                if not m[1] and m[0] not in seennodes:
+                    seennodes.add(m[0])
+                    pendingnodes.append(m[0])
+
+        def relevant(m):
+            if m[1]:
+                return any(s in seennodes for s in m[1])
+            if m[0] in seennodes:
+                return True
+            return any(p in seennodes for p in m[5] or ())
+
+        predecessors = sorted(n for n in seennodes if n in succsmarkers)
+        for predecessor in predecessors:
+            markers = [m for m in succsmarkers[predecessor] if relevant(m)]
+            yield from obsutil.sortedmarkers(markers)
+
+    def hasrelevantmarkers(self, nodes):
+        """whether `relevantmarkers(nodes)` would return any marker
+
+        Stops at the first marker found, without gathering all of them."""
+        precursorsmarkers = self.predecessors
+        succsmarkers = self.successors
+        children = self.children
+        for current in nodes:
+            if precursorsmarkers.get(current):
+                return True
+            if any(not m[1] for m in children.get(current, ())):
+                return True
+            if any(not m[1] for m in succsmarkers.get(current, ())):
+                return True
+        return False
+
 
 def makestore(ui, repo):
     """Create an obsstore instance from a repo."""
@@ -36,6 +36,7 @@ from . import (
     similar,
     util,
     vfs as vfsmod,
+    worker,
 )
 from .utils import (
     dateutil,
@@ -2970,110 +2971,165 @@ def trydiff(
     if not pathfn:
         pathfn = lambda f: f
 
-    for f1, f2, copyop in _filepairs(modified, added, removed, copy, opts):
-        content1 = None
-        content2 = None
-        fctx1 = None
-        fctx2 = None
-        flag1 = None
-        flag2 = None
-        if f1:
-            fctx1 = getfilectx(f1, ctx1)
-            if opts.git or losedatafn:
-                flag1 = ctx1.flags(f1)
-        if f2:
-            fctx2 = getfilectx(f2, ctx2)
-            if opts.git or losedatafn:
-                flag2 = ctx2.flags(f2)
-        # if binary is True, output "summary" or "base85", but not "text diff"
-        if opts.text:
-            binary = False
-        else:
-            binary = any(f.isbinary() for f in [fctx1, fctx2] if f is not None)
-
-        if losedatafn and not opts.git:
-            if (
-                binary
-                or
-                # copy/rename
-                f2 in copy
-                or
-                # empty file creation
-                (not f1 and isempty(fctx2))
-                or
-                # empty file deletion
-                (isempty(fctx1) and not f2)
-                or
-                # create with flags
-                (not f1 and flag2)
-                or
-                # change flags
-                (f1 and f2 and flag1 != flag2)
-            ):
-                losedatafn(f2 or f1)
+    # The hunks of the files are computed in worker threads if enabled. The
+    # file contents are still read here, ahead of the diffs being output, and
+    # the results are yielded in order.
+    numworkers = _diffworkers(repo.ui)
+    executor = None
+    if numworkers > 1:
+        executor = pycompat.futures.ThreadPoolExecutor(numworkers)
+    pending = collections.deque()
 
-        path1 = pathfn(f1 or f2)
-        path2 = pathfn(f2 or f1)
-        header = []
-        if opts.git:
-            header.append(
-                b'diff --git %s%s %s%s' % (aprefix, path1, bprefix, path2)
+    try:
+        for f1, f2, copyop in _filepairs(modified, added, removed, copy, opts):
+            content1 = None
+            content2 = None
+            fctx1 = None
+            fctx2 = None
+            flag1 = None
+            flag2 = None
+            if f1:
+                fctx1 = getfilectx(f1, ctx1)
+                if opts.git or losedatafn:
+                    flag1 = ctx1.flags(f1)
+            if f2:
+                fctx2 = getfilectx(f2, ctx2)
+                if opts.git or losedatafn:
+                    flag2 = ctx2.flags(f2)
+            # if binary is True, output "summary" or "base85", but not "text diff"
+            if opts.text:
+                binary = False
+            else:
+                binary = any(
+                    f.isbinary() for f in [fctx1, fctx2] if f is not None
+                )
+
+            if losedatafn and not opts.git:
+                if (
+                    binary
+                    or
+                    # copy/rename
+                    f2 in copy
+                    or
+                    # empty file creation
+                    (not f1 and isempty(fctx2))
+                    or
+                    # empty file deletion
+                    (isempty(fctx1) and not f2)
+                    or
+                    # create with flags
+                    (not f1 and flag2)
+                    or
+                    # change flags
+                    (f1 and f2 and flag1 != flag2)
+                ):
+                    losedatafn(f2 or f1)
+
+            path1 = pathfn(f1 or f2)
+            path2 = pathfn(f2 or f1)
+            header = []
+            if opts.git:
+                header.append(
+                    b'diff --git %s%s %s%s' % (aprefix, path1, bprefix, path2)
+                )
+                if not f1:  # added
+                    header.append(b'new file mode %s' % _gitmode[flag2])
+                elif not f2:  # removed
+                    header.append(b'deleted file mode %s' % _gitmode[flag1])
+                else:  # modified/copied/renamed
+                    mode1, mode2 = _gitmode[flag1], _gitmode[flag2]
+                    if mode1 != mode2:
+                        header.append(b'old mode %s' % mode1)
+                        header.append(b'new mode %s' % mode2)
+                    if copyop is not None:
+                        if opts.showsimilarity:
+                            sim = similar.score(ctx1[path1], ctx2[path2]) * 100
+                            header.append(b'similarity index %d%%' % sim)
+                        header.append(b'%s from %s' % (copyop, path1))
+                        header.append(b'%s to %s' % (copyop, path2))
+            elif revs:
+                header.append(diffline(path1, revs))
+
+            #  fctx.is  | diffopts                | what to   | is fctx.data()
+            #  binary() | text nobinary git index | output?   | outputted?
+            # ------------------------------------|----------------------------
+            #  yes      | no   no       no  *     | summary   | no
+            #  yes      | no   no       yes *     | base85    | yes
+            #  yes      | no   yes      no  *     | summary   | no
+            #  yes      | no   yes      yes 0     | summary   | no
+            #  yes      | no   yes      yes >0    | summary   | semi [1]
+            #  yes      | yes  *        *   *     | text diff | yes
+            #  no       | *    *        *   *     | text diff | yes
+            # [1]: hash(fctx.data()) is outputted. so fctx.data() cannot be faked
+            if binary and (
+                not opts.git or (opts.git and opts.nobinary and not opts.index)
+            ):
+                # fast path: no binary content will be displayed, content1 and
+                # content2 are only used for equivalent test. cmp() could have a
+                # fast path.
+                if fctx1 is not None:
+                    content1 = b'\0'
+                if fctx2 is not None:
+                    if fctx1 is not None and not fctx1.cmp(fctx2):
+                        content2 = b'\0'  # not different
+                    else:
+                        content2 = b'\0\0'
+            else:
+                # normal path: load contents
+                if fctx1 is not None:
+                    content1 = fctx1.data()
+                if fctx2 is not None:
+                    content2 = fctx2.data()
+
+            data1 = (ctx1, fctx1, path1, flag1, content1, date1)
+            data2 = (ctx2, fctx2, path2, flag2, content2, date2)
+            if executor is None:
+                yield diffcontent(data1, data2, header, binary, opts)
+                continue
+            # look the paths up in the contexts here, the workers must not
+            # read from the repository (e.g. the dirstate of a workingctx)
+            pending.append(
+                executor.submit(
+                    _threadeddiffcontent,
+                    data1,
+                    data2,
+                    header,
+                    binary,
+                    opts,
+                    path1 in ctx1,
+                    path2 in ctx2,
+                )
             )
-            if not f1:  # added
-                header.append(b'new file mode %s' % _gitmode[flag2])
-            elif not f2:  # removed
-                header.append(b'deleted file mode %s' % _gitmode[flag1])
-            else:  # modified/copied/renamed
-                mode1, mode2 = _gitmode[flag1], _gitmode[flag2]
-                if mode1 != mode2:
-                    header.append(b'old mode %s' % mode1)
-                    header.append(b'new mode %s' % mode2)
-                if copyop is not None:
-                    if opts.showsimilarity:
-                        sim = similar.score(ctx1[path1], ctx2[path2]) * 100
-                        header.append(b'similarity index %d%%' % sim)
-                    header.append(b'%s from %s' % (copyop, path1))
-                    header.append(b'%s to %s' % (copyop, path2))
-        elif revs:
-            header.append(diffline(path1, revs))
-
-        #  fctx.is  | diffopts                | what to   | is fctx.data()
-        #  binary() | text nobinary git index | output?   | outputted?
-        # ------------------------------------|----------------------------
-        #  yes      | no   no       no  *     | summary   | no
-        #  yes      | no   no       yes *     | base85    | yes
-        #  yes      | no   yes      no  *     | summary   | no
-        #  yes      | no   yes      yes 0     | summary   | no
-        #  yes      | no   yes      yes >0    | summary   | semi [1]
-        #  yes      | yes  *        *   *     | text diff | yes
-        #  no       | *    *        *   *     | text diff | yes
-        # [1]: hash(fctx.data()) is outputted. so fctx.data() cannot be faked
-        if binary and (
-            not opts.git or (opts.git and opts.nobinary and not opts.index)
-        ):
-            # fast path: no binary content will be displayed, content1 and
-            # content2 are only used for equivalent test. cmp() could have a
-            # fast path.
-            if fctx1 is not None:
-                content1 = b'\0'
-            if fctx2 is not None:
-                if fctx1 is not None and not fctx1.cmp(fctx2):
-                    content2 = b'\0'  # not different
-                else:
-                    content2 = b'\0\0'
-        else:
-            # normal path: load contents
-            if fctx1 is not None:
-                content1 = fctx1.data()
-            if fctx2 is not None:
-                content2 = fctx2.data()
+            # bound the memory used by the contents and diffs not output yet
+            if len(pending) > numworkers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        if executor is not None:
+            for f in pending:
+                f.cancel()
+            executor.shutdown()
+
 
-        data1 = (ctx1, fctx1, path1, flag1, content1, date1)
-        data2 = (ctx2, fctx2, path2, flag2, content2, date2)
-        yield diffcontent(data1, data2, header, binary, opts)
+def _diffworkers(ui):
+    """number of threads to compute the diffs of files with, or 0"""
+    if not ui.configbool(b'experimental', b'parallel-diff'):
+        return 0
+    if not ui.configbool(b'worker', b'enabled'):
+        return 0
+    return worker.numworkers(ui)
+
+
+def _threadeddiffcontent(data1, data2, header, binary, opts, exists1, exists2):
+    """diffcontent() variant computing all the hunks, run in worker threads"""
+    fctx1, fctx2, header, hunks = diffcontent(
+        data1, data2, header, binary, opts, exists1=exists1, exists2=exists2
+    )
+    return fctx1, fctx2, header, list(hunks)
 
 
-def diffcontent(data1, data2, header, binary, opts):
+def diffcontent(data1, data2, header, binary, opts, exists1=None, exists2=None):
     """diffs two versions of a file.
 
     data1 and data2 are tuples containg:
@@ -3088,6 +3144,8 @@ def diffcontent(data1, data2, header, binary, opts):
     header: the patch header
     binary: whether the any of the version of file is binary or not
     opts:   user passed options
+    exists1, exists2: whether the files exist in their changeset, looked up
+             in the changesets when not given
 
     It exists as a separate function so that extensions like extdiff can wrap
     it and use the file content directly.
@@ -3095,8 +3153,12 @@ def diffcontent(data1, data2, header, binary, opts):
 
     ctx1, fctx1, path1, flag1, content1, date1 = data1
     ctx2, fctx2, path2, flag2, content2, date2 = data2
-    index1 = _gitindex(content1) if path1 in ctx1 else sha1nodeconstants.nullhex
-    index2 = _gitindex(content2) if path2 in ctx2 else sha1nodeconstants.nullhex
+    if exists1 is None:
+        exists1 = path1 in ctx1
+    if exists2 is None:
+        exists2 = path2 in ctx2
+    index1 = _gitindex(content1) if exists1 else sha1nodeconstants.nullhex
+    index2 = _gitindex(content2) if exists2 else sha1nodeconstants.nullhex
     if binary and opts.git and not opts.nobinary:
         text = mdiff.b85diff(content1, content2)
         if text:
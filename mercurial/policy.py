@@ -79,7 +79,7 @@ def _importfrom(pkgname: str, modname: str):
 # keep in sync with "version" in C modules
 _cextversions: "Dict[Tuple[str, str], int]" = {
     ('cext', 'base85'): 1,
-    ('cext', 'bdiff'): 3,
+    ('cext', 'bdiff'): 4,
     ('cext', 'mpatch'): 1,
     ('cext', 'osutil'): 4,
     ('cext', 'parsers'): 21,
@@ -99,6 +99,85 @@ def blocks(a: bytes, b: bytes) -> List[Tuple[int, int, int, int]]:
     return [(i, i + n, j, j + n) for (i, j, n) in d]
 
 
+# lines occurring more often than this in a region are never anchors
+_HISTOGRAM_MAX_CHAIN = 64
+
+
+def _histogrammatch(
+    a: List[bytes], b: List[bytes], a1: int, a2: int, b1: int, b2: int
+) -> Tuple[int, int, int]:
+    """find the match anchored on the rarest lines of a[a1:a2] in b[b1:b2]
+
+    Return (i, j, k) where a[i:i + k] == b[j:j + k], with k == 0 if no line
+    can anchor a match. Like in the C implementation, the longest run of
+    matching lines is selected among the ones containing the least common
+    line of a.
+    """
+    occurrences = {}
+    for i in range(a1, a2):
+        occurrences.setdefault(a[i], []).append(i)
+
+    mi, mj, mk = a1, b1, 0
+    bestcount = _HISTOGRAM_MAX_CHAIN
+    j = b1
+    while j < b2:
+        nextj = j + 1
+        positions = occurrences.get(b[j])
+        if positions is not None and len(positions) <= bestcount:
+            for i in positions:
+                # extend the match around a[i] == b[j], tracking the
+                # occurrences of its rarest line
+                rc = len(positions)
+                ai, bj = i, j
+                while ai > a1 and bj > b1 and a[ai - 1] == b[bj - 1]:
+                    ai -= 1
+                    bj -= 1
+                    if rc > 1:
+                        rc = min(rc, len(occurrences[a[ai]]))
+                ae, be = i + 1, j + 1
+                while ae < a2 and be < b2 and a[ae] == b[be]:
+                    if rc > 1:
+                        rc = min(rc, len(occurrences[a[ae]]))
+                    ae += 1
+                    be += 1
+                nextj = max(nextj, be)
+                if ae - ai > mk or rc < bestcount:
+                    mi, mj, mk = ai, bj, ae - ai
+                    bestcount = rc
+        j = nextj
+    return mi, mj, mk
+
+
+def histogramblocks(a: bytes, b: bytes) -> List[Tuple[int, int, int, int]]:
+    an = splitnewlines(a)
+    bn = splitnewlines(b)
+    d = []
+    # regions left to diff and matches found, the next one last
+    stack = [(0, len(an), 0, len(bn))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            d.append(item)
+            continue
+        a1, a2, b1, b2 = item
+        if a1 == a2 or b1 == b2:
+            continue
+        i, j, k = _histogrammatch(an, bn, a1, a2, b1, b2)
+        if not k:
+            # only lines too common to be anchors are shared
+            s = difflib.SequenceMatcher(None, an[a1:a2], bn[b1:b2])
+            for x, y, n in s.get_matching_blocks():
+                if n:
+                    d.append((a1 + x, b1 + y, n))
+            continue
+        stack.append((i + k, a2, j + k, b2))
+        stack.append((i, j, k))
+        stack.append((a1, i, b1, j))
+    d.append((len(an), len(bn), 0))
+    d = _normalizeblocks(an, bn, d)
+    return [(i, i + n, j, j + n) for (i, j, n) in d]
+
+
 def fixws(text: bytes, allws: bool) -> bytes:
     if allws:
         text = re.sub(b'[ \t\r]+', b'', text)
@@ -43,6 +43,9 @@ REVLOGV1_REQUIREMENT = b'revlogv1'
 # allow using ZSTD as compression engine for revlog content
 REVLOG_COMPRESSION_ZSTD = b'revlog-compression-zstd'
 
+# revlog chunks may be compressed with the ZSTD dictionaries of the store
+ZSTD_DICTIONARIES_REQUIREMENT = b'exp-zstd-dictionaries'
+
 # Increment the sub-version when the revlog v2 format changes to lock out old
 # clients.
 CHANGELOGV2_REQUIREMENT = b'exp-changelog-v2'
@@ -122,4 +125,5 @@ STREAM_FIXED_REQUIREMENTS = {
     REVLOGV2_REQUIREMENT,
     SPARSEREVLOG_REQUIREMENT,
     TREEMANIFEST_REQUIREMENT,
+    ZSTD_DICTIONARIES_REQUIREMENT,
 }
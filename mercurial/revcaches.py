@@ -0,0 +1,717 @@
+# revcaches.py - persistent caches of data derived from the changelog
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+
+"""side caches giving access to changelog data without parsing entries
+
+Reading the full text of a changelog entry requires decompressing it and
+splitting it into its fields. Many hot paths only need a small piece of that
+information (the manifest of a revision, its date, …). The caches in this
+module store such information in fixed width records in `.hg/cache` so that it
+can be read without touching the changelog data file.
+"""
+
+import array
+import struct
+import sys
+
+from .node import nullrev
+
+from . import (
+    encoding,
+    error,
+    util,
+)
+
+from .utils import stringutil
+
+calcsize = struct.calcsize
+pack_into = struct.pack_into
+unpack_from = struct.unpack_from
+
+_mrcversion = b'-v1'
+_mrcrevs = b'mrc-revs' + _mrcversion
+
+# changelog node prefix, manifest rev, manifest node prefix, file count,
+# date (time and timezone)
+_mrcrecfmt = b'>4si4sIdi'
+_mrcrecsize = calcsize(_mrcrecfmt)
+_mrcnodelen = 4
+_mrcnullprefix = b'\0' * _mrcnodelen
+
+
+class manifestrevcache:
+    """Persistent cache, mapping changelog revisions to manifest revisions.
+
+    This is a low level cache, independent of filtering.
+
+    The data for each revision is stored in mrc-revs as constant size records.
+    Each record contains:
+
+    - the first 4 bytes of the changelog node (to detect history rewrite),
+    - the revision number of the associated manifest,
+    - the first 4 bytes of the manifest node (to detect manifest reordering),
+    - the number of files touched by the changeset,
+    - the date of the changeset (time and timezone).
+
+    A record is only used if both node prefixes still match the repository,
+    otherwise the information is read from the changelog again and the
+    record is fixed. The file is append-only in the common case and is
+    truncated if a history modification is detected.
+
+    The file can be read through mmap (see `storage.manifest-rev-cache.mmap`).
+    """
+
+    def __init__(self, repo):
+        assert repo.filtername is None
+        self._repo = repo
+        self._prefix = b''  # data read from disk
+        self._rest = bytearray()  # data modified in memory
+        self.hitcount = 0
+        self.lookupcount = 0
+        try:
+            usemmap = repo.ui.configbool(b'storage', b'manifest-rev-cache.mmap')
+            with repo.cachevfs(_mrcrevs) as fp:
+                if usemmap and repo.cachevfs.is_mmap_safe(_mrcrevs):
+                    self._prefix = util.buffer(util.mmapread(fp))
+                else:
+                    self._prefix = fp.read()
+        except (IOError, OSError) as inst:
+            repo.ui.debug(
+                b"couldn't read manifest revision cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+        # number of valid records on disk
+        self._mrcrevslen = min(
+            len(self._prefix) // _mrcrecsize, len(repo.changelog)
+        )
+
+    def _recordscount(self):
+        return (len(self._prefix) + len(self._rest)) // _mrcrecsize
+
+    def _make_mutable(self):
+        if len(self._prefix) > 0:
+            entirety = bytearray()
+            entirety[:] = self._prefix
+            entirety.extend(self._rest)
+            self._rest = entirety
+            self._prefix = b''
+
+    def _unpack(self, rev):
+        offset = rev * _mrcrecsize
+        if offset + _mrcrecsize <= len(self._prefix):
+            return unpack_from(_mrcrecfmt, self._prefix, offset)
+        elif offset < len(self._prefix):
+            return None
+        offset -= len(self._prefix)
+        if offset + _mrcrecsize > len(self._rest):
+            return None
+        return unpack_from(_mrcrecfmt, self._rest, offset)
+
+    def _truncate(self, rev):
+        """drop all the record from `rev` onward"""
+        self._repo.ui.debug(
+            b"history modification detected - truncating "
+            b"manifest revision cache to revision %d\n" % rev
+        )
+        self._make_mutable()
+        del self._rest[rev * _mrcrecsize :]
+        self._mrcrevslen = min(self._mrcrevslen, rev)
+
+    def _entry(self, rev):
+        """return (manifestrev, manifestnode, filescount, date) for a rev"""
+        self.lookupcount += 1
+        record = self._unpack(rev)
+        if record is not None:
+            clprefix, mrev, mprefix, filescount, time, tz = record
+            if clprefix == _mrcnullprefix:
+                pass
+            elif clprefix != self._repo.changelog.node(rev)[:_mrcnodelen]:
+                self._truncate(rev)
+            else:
+                mfrevlog = self._repo.manifestlog.getstorage(b'')
+                if mrev == nullrev:
+                    mnode = self._repo.nullid
+                elif mrev < len(mfrevlog):
+                    mnode = mfrevlog.node(mrev)
+                else:
+                    mnode = None
+                if mnode is not None and mnode[:_mrcnodelen] == mprefix:
+                    self.hitcount += 1
+                    return mrev, mnode, filescount, (time, tz)
+        return self._computeentry(rev)
+
+    def _computeentry(self, rev):
+        """read the data from the changelog and update the cache"""
+        repo = self._repo
+        c = repo.changelog.changelogrevision(rev)
+        mnode = c.manifest
+        try:
+            mrev = repo.manifestlog.getstorage(b'').rev(mnode)
+        except error.LookupError:
+            # the manifest is not available yet (e.g. during the application
+            # of a changegroup), do not cache anything.
+            return None, mnode, len(c.files), c.date
+        filescount = len(c.files)
+        date = c.date
+        self._setcachedata(rev, mrev, mnode, filescount, date)
+        return mrev, mnode, filescount, date
+
+    def setdata(self, rev, changelogrevision):
+        """add new data information to the cache"""
+        mnode = changelogrevision.manifest
+        try:
+            mrev = self._repo.manifestlog.getstorage(b'').rev(mnode)
+        except error.LookupError:
+            # the manifest will be added later in the transaction, the record
+            # will be computed when warming the cache at transaction close.
+            return
+        filescount = len(changelogrevision.files)
+        self._setcachedata(rev, mrev, mnode, filescount, changelogrevision.date)
+
+    def _setcachedata(self, rev, mrev, mnode, filescount, date):
+        """Writes the revision data to the in-memory cache data."""
+        offset = rev * _mrcrecsize
+        if offset < len(self._prefix):
+            self._make_mutable()
+        offset -= len(self._prefix)
+        end = offset + _mrcrecsize
+        if len(self._rest) < end:
+            # Overallocate to avoid quadratic complexity when revisions are
+            # added one at a time (see `branchmap.rbcrevs.pack_into`).
+            self._rest.extend(b'\0' * end)
+        pack_into(
+            _mrcrecfmt,
+            self._rest,
+            offset,
+            self._repo.changelog.node(rev)[:_mrcnodelen],
+            mrev,
+            mnode[:_mrcnodelen],
+            filescount,
+            date[0],
+            date[1],
+        )
+        self._mrcrevslen = min(self._mrcrevslen, rev)
+
+        tr = self._repo.currenttransaction()
+        if tr:
+            tr.addfinalize(b'write-manifestrevcache', self.write)
+
+    def manifestnode(self, rev):
+        """return the manifest node associated with a changelog revision"""
+        if rev == nullrev:
+            return self._repo.nullid
+        return self._entry(rev)[1]
+
+    def manifestrev(self, rev):
+        """return the manifest revision associated with a changelog revision
+
+        None is returned if the manifest is not known to the manifestlog yet.
+        """
+        if rev == nullrev:
+            return nullrev
+        return self._entry(rev)[0]
+
+    def filescount(self, rev):
+        """return the number of files touched by a changelog revision"""
+        if rev == nullrev:
+            return 0
+        return self._entry(rev)[2]
+
+    def date(self, rev):
+        """return the date of a changelog revision"""
+        if rev == nullrev:
+            return (0, 0)
+        return self._entry(rev)[3]
+
+    def warm(self, start=0):
+        """make sure every revision from `start` onward has a valid record"""
+        for rev in range(start, len(self._repo.changelog)):
+            self._entry(rev)
+
+    def write(self, tr=None):
+        """Save the cache if it is dirty."""
+        repo = self._repo
+        revs = min(len(repo.changelog), self._recordscount())
+        start = self._mrcrevslen * _mrcrecsize
+        if self._mrcrevslen >= revs:
+            return
+        wlock = None
+        try:
+            wlock = repo.wlock(wait=False)
+            with repo.cachevfs.open(_mrcrevs, b'ab') as f:
+                if f.tell() != start:
+                    repo.ui.debug(
+                        b"truncating cache/%s to %d\n" % (_mrcrevs, start)
+                    )
+                    f.seek(start)
+                    if f.tell() != start:
+                        start = 0
+                        f.seek(start)
+                    f.truncate()
+                end = revs * _mrcrecsize
+                if start < len(self._prefix):
+                    self._make_mutable()
+                plen = len(self._prefix)
+                f.write(self._rest[start - plen : end - plen])
+            self._mrcrevslen = revs
+        except (IOError, OSError, error.Abort, error.LockError) as inst:
+            repo.ui.debug(
+                b"couldn't write manifest revision cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+        finally:
+            if wlock is not None:
+                wlock.release()
+
+
+_ctcversion = b'-v1'
+_ctcrevs = b'ctc-revs' + _ctcversion
+_ctcusers = b'ctc-users' + _ctcversion
+_ctcdescs = b'ctc-descs' + _ctcversion
+
+# changelog node prefix, user index, end offset of the description
+_ctcrecfmt = b'>4sIQ'
+_ctcrecsize = calcsize(_ctcrecfmt)
+_ctcnodelen = 4
+
+
+class changelogtextcache:
+    """Persistent cache of the user and description of changesets.
+
+    This is a low level cache, independent of filtering, used to evaluate
+    revset predicates like `user()` and `desc()` over many revisions without
+    reading the changelog entries.
+
+    The data is stored as columns, in three append-only files:
+
+    - ctc-users lists the distinct user names, each terminated by a NUL
+      byte. A user is referred to by its index in this list.
+    - ctc-descs contains the descriptions of all the revisions, one after
+      the other.
+    - ctc-revs contains a constant size record for each revision: the first
+      4 bytes of the changelog node (to detect history rewrite), the index of
+      its user and the offset of the end of its description in ctc-descs.
+
+    Users and descriptions are stored in UTF-8, as in the changelog.
+
+    Unlike the manifest revision cache, the records always cover all the
+    revisions up to some point: `warm()` reads the changelog entries of the
+    following revisions in order. When the last cached node does not match
+    the changelog anymore, the records are truncated to the last revision
+    that does.
+    """
+
+    def __init__(self, repo):
+        assert repo.filtername is None
+        self._repo = repo
+        self._records = bytearray()
+        self._descs = bytearray()
+        self._users = []
+        self._userids = {}
+        # local versions of the user names, computed on demand
+        self._localusers = None
+        # lowered descriptions, when they only contain ASCII
+        self._lowereddescs = None
+        # number of records, descriptions and users saved on disk
+        self._ondisk = (0, 0, 0)
+        try:
+            with repo.cachevfs(_ctcrevs) as fp:
+                records = fp.read()
+            with repo.cachevfs(_ctcusers) as fp:
+                users = fp.read()
+            with repo.cachevfs(_ctcdescs) as fp:
+                descs = fp.read()
+        except (IOError, OSError) as inst:
+            repo.ui.debug(
+                b"couldn't read changelog text cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+            return
+        # ignore a partial record left by an interrupted write
+        self._records[:] = records[: len(records) - len(records) % _ctcrecsize]
+        self._descs[:] = descs
+        self._users = users.split(b'\0')[:-1]
+        self._userids = {u: i for i, u in enumerate(self._users)}
+        self._ondisk = (len(self._records), len(descs), len(self._users))
+        self.validate()
+
+    def validate(self):
+        """truncate the records that do not match the changelog anymore"""
+        cl = self._repo.changelog
+        count = min(len(self), len(cl))
+        while count:
+            clprefix, userid, end = unpack_from(
+                _ctcrecfmt, self._records, (count - 1) * _ctcrecsize
+            )
+            if (
+                clprefix == cl.node(count - 1)[:_ctcnodelen]
+                and userid < len(self._users)
+                and end <= len(self._descs)
+            ):
+                break
+            count -= 1
+        end = self._end(count - 1) if count else 0
+        if count == len(self) and end == len(self._descs):
+            return
+        if count < len(self):
+            self._repo.ui.debug(
+                b"history modification detected - truncating "
+                b"changelog text cache to revision %d\n" % count
+            )
+        del self._records[count * _ctcrecsize :]
+        del self._descs[end:]
+        self._lowereddescs = None
+        records, descs, users = self._ondisk
+        self._ondisk = (
+            min(records, len(self._records)),
+            min(descs, end),
+            users,
+        )
+
+    def __len__(self):
+        """number of revisions in the cache"""
+        return len(self._records) // _ctcrecsize
+
+    def _end(self, rev):
+        return unpack_from(_ctcrecfmt, self._records, rev * _ctcrecsize)[2]
+
+    def _start(self, rev):
+        if not rev:
+            return 0
+        return self._end(rev - 1)
+
+    def warm(self):
+        """add the revisions missing from the cache"""
+        repo = self._repo
+        self.validate()
+        cl = repo.changelog
+        for rev in range(len(self), len(cl)):
+            c = cl.changelogrevision(rev)
+            user = encoding.fromlocal(c.user)
+            userid = self._userids.get(user)
+            if userid is None:
+                userid = self._userids[user] = len(self._users)
+                self._users.append(user)
+                self._localusers = None
+            self._descs.extend(encoding.fromlocal(c.description))
+            self._records.extend(
+                struct.pack(
+                    _ctcrecfmt,
+                    cl.node(rev)[:_ctcnodelen],
+                    userid,
+                    len(self._descs),
+                )
+            )
+            self._lowereddescs = None
+
+    def userid(self, rev):
+        """return the index of the user of a revision in `users()`"""
+        return unpack_from(_ctcrecfmt, self._records, rev * _ctcrecsize)[1]
+
+    def users(self):
+        """return the list of the users of the cached revisions"""
+        if self._localusers is None:
+            self._localusers = [encoding.tolocal(u) for u in self._users]
+        return self._localusers
+
+    def description(self, rev):
+        """return the description of a revision"""
+        start = self._start(rev)
+        return encoding.tolocal(bytes(self._descs[start : self._end(rev)]))
+
+    def _revat(self, offset):
+        """return the first revision whose description ends after offset"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._end(mid) <= offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def searchdescriptions(self, pattern):
+        """return the set of revisions whose description contains pattern,
+        ignoring case
+
+        None is returned if the descriptions are not all ASCII, the search
+        must then be done on each description."""
+        if self._lowereddescs is None:
+            descs = bytes(self._descs)
+            if not descs.isascii():
+                return None
+            self._lowereddescs = encoding.lower(descs)
+        descs = self._lowereddescs
+        pattern = encoding.lower(pattern)
+        count = len(self)
+        if not pattern:
+            return set(range(count))
+        revs = set()
+        offset = descs.find(pattern)
+        while offset != -1:
+            rev = self._revat(offset)
+            end = self._end(rev)
+            if offset + len(pattern) <= end:
+                revs.add(rev)
+                # look for the next revision containing pattern
+                offset = end
+            else:
+                # this match spans two descriptions
+                offset += 1
+            offset = descs.find(pattern, offset)
+        return revs
+
+    def write(self, tr=None):
+        """Save the cache if it is dirty."""
+        repo = self._repo
+        records, descs, users = self._ondisk
+        if len(self._records) == records:
+            return
+        wlock = None
+        try:
+            wlock = repo.wlock(wait=False)
+            # the users and descriptions are written first, so that no record
+            # refers to data missing on disk
+            for filename, data, start in (
+                (_ctcusers, b''.join(u + b'\0' for u in self._users), None),
+                (_ctcdescs, self._descs, descs),
+                (_ctcrevs, self._records, records),
+            ):
+                if start is None:
+                    start = sum(len(u) + 1 for u in self._users[:users])
+                with repo.cachevfs.open(filename, b'ab') as f:
+                    if f.tell() != start:
+                        f.seek(start)
+                        if f.tell() != start:
+                            start = 0
+                            f.seek(start)
+                        f.truncate()
+                    f.write(data[start:])
+            self._ondisk = (
+                len(self._records),
+                len(self._descs),
+                len(self._users),
+            )
+        except (IOError, OSError, error.Abort, error.LockError) as inst:
+            repo.ui.debug(
+                b"couldn't write changelog text cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+        finally:
+            if wlock is not None:
+                wlock.release()
+
+
+_ccfile = b'children-v1'
+
+# number of revisions covered by the file, followed by the node of the last
+# of them
+_ccheader = b'>I'
+_ccheadersize = calcsize(_ccheader)
+
+# the file is rewritten when at least that many revisions are not covered
+# by it (or a fraction of the covered revisions if it is larger)
+_ccmaxtail = 1000
+_ccmaxtailratio = 20
+
+
+def _childparents(parentrevs, rev):
+    """return the revisions rev is recorded as a child of
+
+    A revision without parents is a child of nullrev."""
+    p1, p2 = parentrevs(rev)
+    if p2 == nullrev or p2 == p1:
+        return (p1,)
+    if p1 == nullrev:
+        return (p2,)
+    return (p1, p2)
+
+
+def _toarray(data):
+    """return an array of unsigned 32 bits integers from big endian data"""
+    a = array.array('I')
+    a.frombytes(data)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a
+
+
+def _tobytes(a):
+    """return the big endian representation of an array from _toarray()"""
+    if sys.byteorder == 'little':
+        a = array.array('I', a)
+        a.byteswap()
+    return a.tobytes()
+
+
+class childrencache:
+    """Persistent index of the children of each changeset.
+
+    Revlog indexes only store the parents of each revision: finding the
+    children of a revision otherwise requires scanning all the following
+    revisions.
+
+    This is a low level cache, independent of filtering. The file stores, as
+    big endian 32 bits integers, in compressed sparse row form:
+
+    - the number N of revisions covered by the file, followed by the node of
+      revision N - 1,
+    - N + 2 offsets: the children of revision `r` (and of nullrev for `r` = -1)
+      are the entries from `offsets[r + 1]` to `offsets[r + 2]` of the
+      following array,
+    - the children of all the revisions, in increasing order for each of them.
+
+    The parents of the revisions added since the file was written are read
+    when the cache is loaded, and kept in memory. The file is written again
+    when there are too many of them.
+    """
+
+    def __init__(self, repo):
+        assert repo.filtername is None
+        self._repo = repo
+        self._reset()
+        try:
+            data = repo.cachevfs.read(_ccfile)
+        except (IOError, OSError) as inst:
+            repo.ui.debug(
+                b"couldn't read children cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+            return
+        cl = repo.changelog
+        nodelen = repo.nodeconstants.nodelen
+        start = _ccheadersize + nodelen
+        if len(data) < start:
+            repo.ui.debug(b"children cache is invalid, ignoring it\n")
+            return
+        count = struct.unpack_from(_ccheader, data)[0]
+        lastnode = data[_ccheadersize:start]
+        end = start + (count + 2) * 4
+        if (
+            count > len(cl)
+            or (count and cl.node(count - 1) != lastnode)
+            or len(data) < end
+            or (len(data) - end) % 4
+        ):
+            repo.ui.debug(b"children cache is invalid, ignoring it\n")
+            return
+        offsets = _toarray(data[start:end])
+        children = _toarray(data[end:])
+        if offsets[-1] != len(children):
+            repo.ui.debug(b"children cache is invalid, ignoring it\n")
+            return
+        self._count = count
+        self._lastnode = lastnode
+        self._offsets = offsets
+        self._children = children
+        self._ondisk = count
+
+    def _reset(self):
+        # revisions covered by _offsets and _children
+        self._count = 0
+        self._lastnode = None
+        self._offsets = array.array('I', [0, 0])
+        self._children = array.array('I')
+        # children of revisions after _count, by parent
+        self._tail = {}
+        # number of revisions, and tip node, for which _tail is up to date
+        self._scanned = 0
+        self._scannedtip = None
+        # number of revisions covered by the file on disk
+        self._ondisk = None
+
+    def _update(self):
+        """scan the revisions added since the last call"""
+        cl = self._repo.changelog
+        if len(cl) == self._scanned and (
+            not self._scanned or cl.node(self._scanned - 1) == self._scannedtip
+        ):
+            return
+        count = self._count
+        if count > len(cl) or (count and cl.node(count - 1) != self._lastnode):
+            # history was rewritten
+            self._reset()
+            count = 0
+        if self._scanned > len(cl) or (
+            self._scanned and cl.node(self._scanned - 1) != self._scannedtip
+        ):
+            self._tail = {}
+            self._scanned = count
+        parentrevs = cl.parentrevs
+        tail = self._tail
+        for rev in range(max(self._scanned, count), len(cl)):
+            for p in _childparents(parentrevs, rev):
+                tail.setdefault(p, []).append(rev)
+        self._scanned = len(cl)
+        self._scannedtip = cl.node(len(cl) - 1) if len(cl) else None
+
+    def children(self, rev):
+        """return the revisions having rev as a parent, in increasing order
+
+        The revisions without parents are the children of nullrev."""
+        self._update()
+        children = []
+        if nullrev <= rev < self._count:
+            start = self._offsets[rev + 1]
+            end = self._offsets[rev + 2]
+            children = self._children[start:end].tolist()
+        tail = self._tail.get(rev)
+        if tail:
+            children.extend(tail)
+        return children
+
+    def _build(self):
+        """compute the arrays for all the revisions in the changelog"""
+        cl = self._repo.changelog
+        parentrevs = cl.parentrevs
+        count = len(cl)
+        children = [[] for _r in range(count + 1)]
+        for rev in range(count):
+            for p in _childparents(parentrevs, rev):
+                children[p + 1].append(rev)
+        offsets = array.array('I', [0])
+        allchildren = array.array('I')
+        for c in children:
+            allchildren.extend(c)
+            offsets.append(len(allchildren))
+        self._reset()
+        self._count = count
+        self._lastnode = cl.node(count - 1) if count else None
+        self._offsets = offsets
+        self._children = allchildren
+
+    def write(self, tr=None):
+        """Save the cache if enough revisions are missing from the file."""
+        self._update()
+        tailsize = self._scanned - self._count
+        if self._ondisk is not None and (
+            tailsize < max(_ccmaxtail, self._count // _ccmaxtailratio)
+        ):
+            return
+        if self._ondisk is None and not tailsize:
+            return
+        repo = self._repo
+        wlock = None
+        try:
+            wlock = repo.wlock(wait=False)
+            self._build()
+            nodelen = repo.nodeconstants.nodelen
+            lastnode = self._lastnode or b'\0' * nodelen
+            with repo.cachevfs(_ccfile, b'wb', atomictemp=True) as f:
+                f.write(struct.pack(_ccheader, self._count))
+                f.write(lastnode)
+                f.write(_tobytes(self._offsets))
+                f.write(_tobytes(self._children))
+            self._ondisk = self._count
+        except (IOError, OSError, error.Abort, error.LockError) as inst:
+            repo.ui.debug(
+                b"couldn't write children cache: %s\n"
+                % stringutil.forcebytestr(inst)
+            )
+        finally:
+            if wlock is not None:
+                wlock.release()
@@ -100,11 +100,14 @@ from .interfaces import (
     util as interfaceutil,
 )
 from .revlogutils import (
+    compressiondicts,
     deltas as deltautil,
     docket as docketutil,
     flagutil,
     nodemap as nodemaputil,
+    hotchains,
     randomaccessfile,
+    revisioncache as revisioncacheutil,
     revlogv0,
     rewrite,
     sidedata as sidedatautil,
@@ -299,6 +302,8 @@ class FeatureConfig(_Config):
     canonical_parent_order = attr.ib(default=False)
     # can ellipsis commit be used
     enable_ellipsis = attr.ib(default=False)
+    # use the zstd dictionaries of the store
+    compression_dictionaries = attr.ib(default=False)
 
     def copy(self):
         new = super().copy()
@@ -322,8 +327,18 @@ class DataConfig(_Config):
     mmap_large_index = attr.ib(default=False)
     # how much data is large
     mmap_index_threshold = attr.ib(default=None)
+    # If true, read the data file through a memory mapping when possible
+    mmap_data = attr.ib(default=False)
     # How much data to read and cache into the raw revlog data cache.
     chunk_cache_size = attr.ib(default=65536)
+    # If not zero, cache the recently read blocks of `chunk_cache_size`
+    # bytes up to that size instead of a single window.
+    block_cache_size = attr.ib(default=0)
+    # Share the block cache between all the revlogs of the process
+    block_cache_shared = attr.ib(default=False)
+    # If not zero, size of the revision cache shared by all the revlogs of
+    # the process
+    revision_cache_size = attr.ib(default=0)
 
     # The size of the uncompressed cache compared to the largest revision seen.
     uncompressed_cache_factor = attr.ib(default=None)
@@ -356,6 +371,11 @@ class DeltaConfig(_Config):
     sparse_revlog = attr.ib(default=False)
     # maximum length of a delta chain
     max_chain_len = attr.ib(default=None)
+    # reads through longer delta chains are recorded, and the delta chains
+    # of the pinned revlogs are bounded by that length
+    pinned_chain_len = attr.ib(default=None)
+    # the radix of the revlogs read the most through long delta chains
+    pinned_revlogs = attr.ib(default=frozenset())
     # Maximum distance between delta chain base start and end
     max_deltachain_span = attr.ib(default=-1)
     # If `upper_bound_comp` is not None, this is the expected maximal gain from
@@ -422,17 +442,28 @@ class _InnerRevlog:
             (self.index_file if self.inline else self.data_file),
             self.data_config.chunk_cache_size,
             chunk_cache,
+            use_mmap=self.data_config.mmap_data and not self.inline,
+            block_cache_size=self.data_config.block_cache_size,
+            block_cache_shared=self.data_config.block_cache_shared,
         )
         self._segmentfile_sidedata = randomaccessfile.randomaccessfile(
             self.opener,
             self.sidedata_file,
             self.data_config.chunk_cache_size,
+            block_cache_size=self.data_config.block_cache_size,
+            block_cache_shared=self.data_config.block_cache_shared,
         )
 
         # revlog header -> revlog compressor
         self._decompressors = {}
         # 3-tuple of (node, rev, text) for a raw revision.
         self._revisioncache = None
+        # validated raw texts, shared with the other revlogs of the process
+        self._revision_cache = None
+        if self.data_config.revision_cache_size > 0:
+            self._revision_cache = revisioncacheutil.get_cache(
+                self.data_config.revision_cache_size
+            )
 
         # cache some uncompressed chunks
         # rev → uncompressed_chunk
@@ -454,11 +485,27 @@ class _InnerRevlog:
     def clear_cache(self):
         assert not self.is_delaying
         self._revisioncache = None
+        if self._revision_cache is not None:
+            self._revision_cache.clear_owner(self.revision_cache_owner)
         if self._uncompressed_chunk_cache is not None:
             self._uncompressed_chunk_cache.clear()
         self._segmentfile.clear_cache()
         self._segmentfile_sidedata.clear_cache()
 
+    @util.propertycache
+    def revision_cache_owner(self):
+        """identify this revlog in the process wide revision cache
+
+        The identity of the index file is part of it, so the texts cached
+        before the revlog was rewritten (e.g. censored) are not reused."""
+        index_file = self.canonical_index_file
+        try:
+            st = self.opener.stat(index_file)
+            identity = (st.st_dev, st.st_ino)
+        except OSError:
+            identity = None
+        return (getattr(self.opener, 'base', None), index_file, identity)
+
     @property
     def canonical_index_file(self):
         if self._orig_index_file is not None:
@@ -848,6 +895,9 @@ class _InnerRevlog:
                 self.opener,
                 self.data_file,
                 self.data_config.chunk_cache_size,
+                use_mmap=self.data_config.mmap_data,
+                block_cache_size=self.data_config.block_cache_size,
+                block_cache_shared=self.data_config.block_cache_shared,
             )
 
             if existing_handles:
@@ -1390,6 +1440,13 @@ class revlog:
             self.feature_config = FeatureConfig()
         self.feature_config.censorable = censorable
         self.feature_config.canonical_parent_order = canonical_parent_order
+        if self.feature_config.compression_dictionaries:
+            opts = self.feature_config.compression_engine_options
+            dicts = compressiondicts.get_dictionaries(self.opener)
+            opts[b'zstd.dictionaries'] = dicts
+            opts[b'zstd.dictionary-class'] = compressiondicts.revlog_class(
+                target
+            )
         if data_config is not None:
             self.data_config = data_config.copy()
         elif b'data-config' in self.opener.options:
@@ -2763,6 +2820,13 @@ class revlog:
         if rev is None:
             rev = self.rev(node)
 
+        cache = self._inner._revision_cache
+        if cache is not None:
+            rawtext = cache.get(self._inner.revision_cache_owner, node)
+            if rawtext is not None:
+                self._inner._revisioncache = (node, rev, rawtext)
+                return (rev, rawtext, True)
+
         return self._inner.raw_text(node, rev)
 
     def _revisiondata(self, nodeorrev, raw=False):
@@ -2806,6 +2870,21 @@ class revlog:
             self.checkhash(text, node, rev=rev)
         if not validated:
             self._inner._revisioncache = (node, rev, rawtext)
+            pinned_chain_len = self.delta_config.pinned_chain_len
+            if pinned_chain_len:
+                chainlength = self._chaininfo(rev)[0]
+                if chainlength > pinned_chain_len:
+                    hotchains.record(self.opener, self.radix, chainlength)
+            cache = self._inner._revision_cache
+            if cache is not None and type(rawtext) == bytes:
+                # a full snapshot still needs to be decompressed
+                chainlength = self._chaininfo(rev)[0] + 1
+                cache.insert(
+                    self._inner.revision_cache_owner,
+                    node,
+                    rawtext,
+                    chainlength,
+                )
 
         return text
 
@@ -3928,7 +4007,9 @@ class revlog:
         state[b'skipread'] = set()
         state[b'safe_renamed'] = set()
 
-        for rev in self:
+        # the revisions below were verified by a previous run
+        startrev = state.get(b'startrev', 0)
+        for rev in range(startrev, len(self)):
             node = self.node(rev)
 
             # Verify contents. 4 cases to care about:
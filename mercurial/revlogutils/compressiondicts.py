@@ -0,0 +1,255 @@
+# compressiondicts.py - zstd dictionaries for small revlog chunks
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+"""Dictionaries used by zstd to compress revlog chunks
+
+Most revlog chunks are small, and compressing each of them from an empty
+window gives poor results. Repositories with the `exp-zstd-dictionaries`
+requirement keep trained dictionaries in `.hg/store/zstd-dictionaries`, one
+per class of revlog: the changelog, the manifests, and the filelogs grouped
+by file extension.
+
+New chunks are compressed with the latest dictionary of the class of their
+revlog. A zstd frame records the id of the dictionary used to produce it, so
+older dictionaries are kept to decompress the chunks written before a
+retraining.
+
+The file is a sequence of entries, each made of a header (dictionary id,
+length of the class name, length of the dictionary) followed by the class
+name and the dictionary.
+"""
+
+import struct
+import threading
+
+from ..i18n import _
+
+from .. import (
+    error,
+    util,
+)
+from ..utils import stringutil
+from .constants import (
+    KIND_CHANGELOG,
+    KIND_FILELOG,
+    KIND_MANIFESTLOG,
+)
+
+FILENAME = b'zstd-dictionaries'
+
+# dictionary id, class length, dictionary length
+_ENTRY = struct.Struct('>IHI')
+
+
+def revlog_class(target):
+    """return the name of the dictionary class of a revlog `target`"""
+    kind, target_id = target
+    if kind == KIND_CHANGELOG:
+        return b'changelog'
+    elif kind == KIND_MANIFESTLOG:
+        return b'manifest'
+    elif kind == KIND_FILELOG and target_id is not None:
+        basename = target_id.rsplit(b'/', 1)[-1]
+        if b'.' in basename.lstrip(b'.'):
+            return b'file:%s' % basename.rsplit(b'.', 1)[1].lower()
+        return b'file'
+    return b'other'
+
+
+def parse(data):
+    """return the list of (dictionary id, class, dictionary) in `data`"""
+    entries = []
+    offset = 0
+    while offset < len(data):
+        if offset + _ENTRY.size > len(data):
+            raise error.CorruptedState(_(b'truncated zstd dictionaries'))
+        dictid, clslen, size = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        if offset + clslen + size > len(data):
+            raise error.CorruptedState(_(b'truncated zstd dictionaries'))
+        cls = bytes(data[offset : offset + clslen])
+        offset += clslen
+        entries.append((dictid, cls, bytes(data[offset : offset + size])))
+        offset += size
+    return entries
+
+
+def serialize(entries):
+    chunks = []
+    for dictid, cls, data in entries:
+        chunks.append(_ENTRY.pack(dictid, len(cls), len(data)))
+        chunks.append(cls)
+        chunks.append(data)
+    return b''.join(chunks)
+
+
+class dictionaries:
+    """A set of dictionaries
+
+    The last entry of a class is the one used for compression.
+    """
+
+    def __init__(self, entries=()):
+        self._entries = []
+        self._byid = {}
+        self._current = {}
+        for dictid, cls, data in entries:
+            self.add(dictid, cls, data)
+
+    def add(self, dictid, cls, data):
+        self._entries.append((dictid, cls, data))
+        self._byid[dictid] = data
+        self._current[cls] = data
+
+    def entries(self):
+        return list(self._entries)
+
+    def current(self, cls):
+        """the dictionary to compress the chunks of `cls`, or None"""
+        return self._current.get(cls)
+
+    def get(self, dictid):
+        """the dictionary with id `dictid`, or None"""
+        return self._byid.get(dictid)
+
+
+class _storedictionaries:
+    """The dictionaries of a store, reloaded when the file changes"""
+
+    def __init__(self, vfs):
+        self._vfs = vfs
+        self._identity = None
+        self._dictionaries = dictionaries()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            try:
+                st = self._vfs.stat(FILENAME)
+                identity = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                identity = None
+            if identity != self._identity:
+                entries = ()
+                if identity is not None:
+                    entries = parse(self._vfs.read(FILENAME))
+                self._dictionaries = dictionaries(entries)
+                self._identity = identity
+            return self._dictionaries
+
+    def current(self, cls):
+        return self._load().current(cls)
+
+    def get(self, dictid):
+        d = self._dictionaries.get(dictid)
+        if d is None:
+            # written by a retraining after our last read
+            d = self._load().get(dictid)
+        return d
+
+
+# store path -> _storedictionaries
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_dictionaries(vfs):
+    """return the dictionaries of the store behind `vfs`
+
+    The file is only read when a dictionary is needed."""
+    key = vfs.join(FILENAME)
+    with _stores_lock:
+        d = _stores.get(key)
+        if d is None:
+            d = _stores[key] = _storedictionaries(vfs)
+        return d
+
+
+def write(vfs, dicts):
+    with vfs(FILENAME, b'w', atomictemp=True) as fp:
+        fp.write(serialize(dicts.entries()))
+
+
+def _samples(rl, count):
+    """return up to `count` texts of the most recent revisions of `rl`"""
+    samples = []
+    for rev in range(len(rl) - 1, -1, -1):
+        if len(samples) >= count:
+            break
+        if rl.iscensored(rev):
+            continue
+        samples.append(bytes(rl.rawdata(rev)))
+    return samples
+
+
+def train(ui, repo, size, count, level=3):
+    """train a new dictionary for each class of revlog of `repo`
+
+    Up to `count` revisions are sampled in each class, the most recent of
+    each revlog first. Return a list of `(class, dictionary id, dictionary,
+    stats)`, classes without enough samples are skipped. `stats` compares
+    the compression of the samples with and without the dictionary.
+    """
+    engine = util.compengines[b'zstd']
+    perclass = {}
+    entries = [e for e in repo.store.walk() if e.is_revlog]
+    progress = ui.makeprogress(
+        _(b'sampling revlogs'), unit=_(b'revlogs'), total=len(entries)
+    )
+    for entry in entries:
+        progress.increment()
+        rl = entry.get_revlog_instance(repo).get_revlog()
+        samples = perclass.setdefault(revlog_class(rl.target), [])
+        if len(samples) < count:
+            samples.extend(_samples(rl, count - len(samples)))
+    progress.complete()
+
+    results = []
+    for cls, samples in sorted(perclass.items()):
+        try:
+            dictid, data = engine.traindictionary(samples, size)
+        except Exception as e:
+            # too few or too small samples
+            msg = _(b'skipping class %s: %s\n')
+            ui.note(msg % (cls, stringutil.forcebytestr(e)))
+            continue
+        plain = engine.revlogcompressor({b'zstd.level': level})
+        trained = dictionaries([(dictid, cls, data)])
+        withdict = engine.revlogcompressor(
+            {
+                b'zstd.level': level,
+                b'zstd.dictionaries': trained,
+                b'zstd.dictionary-class': cls,
+            }
+        )
+        stats = {
+            b'samples': len(samples),
+            b'raw-size': 0,
+            b'plain-size': 0,
+            b'dict-size': 0,
+        }
+        plainchunks = []
+        dictchunks = []
+        for s in samples:
+            stats[b'raw-size'] += len(s)
+            c = plain.compress(s)
+            if c is not None:
+                plainchunks.append(c)
+            stats[b'plain-size'] += len(c or s)
+            c = withdict.compress(s)
+            if c is not None:
+                dictchunks.append(c)
+            stats[b'dict-size'] += len(c or s)
+        for key, compressor, chunks in (
+            (b'plain-decompression', plain, plainchunks),
+            (b'dict-decompression', withdict, dictchunks),
+        ):
+            start = util.timer()
+            for c in chunks:
+                compressor.decompress(c)
+            stats[key] = util.timer() - start
+        results.append((cls, dictid, data, stats))
+    return results
@@ -610,6 +610,23 @@ _STAGE_PREV = "prev"
 _STAGE_FULL = "full"
 
 
+def _max_chain_len(revlog):
+    """the maximum length of the delta chains of new revisions in revlog
+
+    The chains of the revlogs pinned for being read through long chains are
+    bounded by `pinned_chain_len` (see `revlogutils.hotchains`)."""
+    config = revlog.delta_config
+    max_chain_len = config.max_chain_len
+    pinned_chain_len = config.pinned_chain_len
+    if (
+        pinned_chain_len
+        and getattr(revlog, 'radix', None) in config.pinned_revlogs
+    ):
+        if not max_chain_len or pinned_chain_len < max_chain_len:
+            max_chain_len = pinned_chain_len
+    return max_chain_len
+
+
 class _BaseDeltaSearch(abc.ABC):
     """perform the search of a good delta for a single revlog revision
 
@@ -742,10 +759,8 @@ class _BaseDeltaSearch(abc.ABC):
         # Bad delta from chain length:
         #
         #   If the number of delta in the chain gets too high.
-        if (
-            self.revlog.delta_config.max_chain_len
-            and self.revlog.delta_config.max_chain_len < deltainfo.chainlen
-        ):
+        max_chain_len = _max_chain_len(self.revlog)
+        if max_chain_len and max_chain_len < deltainfo.chainlen:
             return False
         return True
 
@@ -965,10 +980,8 @@ class _GeneralDeltaSearch(_BaseDeltaSearch):
         # it here too.
         chainlen, chainsize = self.revlog._chaininfo(rev)
         # if chain will be too long, skip base
-        if (
-            self.revlog.delta_config.max_chain_len
-            and chainlen >= self.revlog.delta_config.max_chain_len
-        ):
+        max_chain_len = _max_chain_len(self.revlog)
+        if max_chain_len and chainlen >= max_chain_len:
             return False
         # if chain already have too much data, skip base
         if deltas_limit < chainsize:
@@ -222,6 +222,26 @@ class RevlogDocket:
             if include_empty or size > 0:
                 yield b"%s-%s.sda" % (self._radix, uuid)
 
+    def drop_older_files(self):
+        """forget about all the older files
+
+        Return the paths of the files that might exist, empty ones
+        included."""
+        paths = []
+        for uuids, ext in (
+            (self._older_index_uuids, b'idx'),
+            (self._older_data_uuids, b'dat'),
+            (self._older_sidedata_uuids, b'sda'),
+        ):
+            for uuid, size in uuids:
+                if uuid is not None:
+                    paths.append(b"%s-%s.%s" % (self._radix, uuid, ext))
+        self._older_index_uuids = []
+        self._older_data_uuids = []
+        self._older_sidedata_uuids = []
+        self._dirty = True
+        return paths
+
     @property
     def index_end(self):
         return self._index_end
@@ -0,0 +1,193 @@
+# hotchains.py - track the revlogs read through long delta chains
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+"""Track the revlogs read through long delta chains to pin snapshots in them
+
+Reading a revision at the end of a long delta chain is slow, and the files
+read the most (e.g. through hgweb) are often the ones with the longest
+chains. When `storage.revlog.pin-snapshots.chain-length` is set, the revlogs
+record the revisions they decode through a longer chain in process wide
+statistics. These statistics are merged into `.hg/cache/hot-chains-v1` when
+the repository caches are written, and after each request served by hgweb.
+
+The revlogs read the most often through long chains are "pinned", within a
+budget on the size of their data. New revisions of a pinned revlog are stored
+with delta chains bounded by the same length, the delta computation then
+picks a snapshot as delta base for them. `resnapshot` rewrites the existing
+revisions of the pinned revlogs the same way.
+
+The file is made of lines `<pinned> <reads> <max chain length> <radix>`.
+"""
+
+import threading
+
+from ..i18n import _
+
+from .. import error
+
+FILENAME = b'hot-chains-v1'
+
+# the number of revlogs tracked in the file
+_MAX_ENTRIES = 1000
+
+# store vfs base -> {radix: [reads, max chain length]}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(opener, radix, chainlength):
+    """record that a revision of `radix` was read through a long chain"""
+    base = getattr(opener, 'base', None)
+    with _stats_lock:
+        stats = _stats.setdefault(base, {}).setdefault(radix, [0, 0])
+        stats[0] += 1
+        stats[1] = max(stats[1], chainlength)
+
+
+def haspending(opener):
+    """tell if reads through long chains of `opener` were not flushed yet"""
+    with _stats_lock:
+        return bool(_stats.get(getattr(opener, 'base', None)))
+
+
+def _pop(opener):
+    with _stats_lock:
+        return _stats.pop(getattr(opener, 'base', None), None)
+
+
+def _forget(opener, radix):
+    with _stats_lock:
+        _stats.get(getattr(opener, 'base', None), {}).pop(radix, None)
+
+
+def read(cachevfs):
+    """return a {radix: (pinned, reads, max chain length)} dict"""
+    entries = {}
+    try:
+        data = cachevfs.read(FILENAME)
+    except FileNotFoundError:
+        return entries
+    for line in data.splitlines():
+        try:
+            pinned, reads, chainlength, radix = line.split(b' ', 3)
+            entries[radix] = (pinned == b'1', int(reads), int(chainlength))
+        except ValueError:
+            raise error.CorruptedState(_(b'invalid hot chains cache'))
+    return entries
+
+
+def pinned(cachevfs):
+    """return the set of the radix of the pinned revlogs"""
+    try:
+        entries = read(cachevfs)
+    except error.CorruptedState:
+        return frozenset()
+    return frozenset(r for r, e in entries.items() if e[0])
+
+
+def _datasize(storevfs, radix):
+    size = 0
+    for ext in (b'.i', b'.d'):
+        try:
+            size += storevfs.stat(radix + ext).st_size
+        except OSError:
+            pass
+    return size
+
+
+def flush(cachevfs, storevfs, minreads, budget):
+    """merge the statistics of the process into the cache file
+
+    The revlogs read at least `minreads` times through a long chain are
+    pinned, the most read first, as long as the total size of their data
+    fits in `budget`.
+
+    Return False if there was nothing to write."""
+    stats = _pop(storevfs)
+    if not stats:
+        return False
+    try:
+        entries = read(cachevfs)
+    except error.CorruptedState:
+        entries = {}
+    merged = {}
+    for radix, (_pinned, reads, chainlength) in entries.items():
+        merged[radix] = [reads, chainlength]
+    for radix, (reads, chainlength) in stats.items():
+        entry = merged.setdefault(radix, [0, 0])
+        entry[0] += reads
+        entry[1] = max(entry[1], chainlength)
+
+    ordered = sorted(merged.items(), key=lambda e: (-e[1][0], e[0]))
+    ordered = ordered[:_MAX_ENTRIES]
+    entries = {}
+    used = 0
+    for radix, (reads, chainlength) in ordered:
+        pin = False
+        if reads >= minreads:
+            size = _datasize(storevfs, radix)
+            if used + size <= budget:
+                used += size
+                pin = True
+        entries[radix] = (pin, reads, chainlength)
+    _write(cachevfs, entries)
+    return True
+
+
+def _write(cachevfs, entries):
+    lines = []
+    for radix, (pin, reads, chainlength) in entries.items():
+        lines.append(b'%d %d %d %s\n' % (pin, reads, chainlength, radix))
+    with cachevfs(FILENAME, b'w', atomictemp=True) as fp:
+        fp.write(b''.join(lines))
+
+
+def resnapshot(ui, repo, chainlength):
+    """rewrite the pinned revlogs read through chains over `chainlength`
+
+    All the deltas of these revlogs are recomputed, with delta chains bounded
+    by `chainlength`, and their longest chain is reset in the cache file so
+    they are not rewritten again until long chains are read from them. Each
+    revlog is rewritten in its own lock and transaction, this requires a
+    "version 2" revlog (see `rewrite.v2_rewrite`).
+
+    Return the number of revlogs rewritten."""
+    # avoid cycle
+    from .. import revlog
+    from . import rewrite
+
+    try:
+        entries = read(repo.cachevfs)
+    except error.CorruptedState:
+        return 0
+    todo = {
+        radix + b'.i'
+        for radix, (pin, reads, longest) in entries.items()
+        if pin and longest > chainlength
+    }
+    storeentries = [
+        e
+        for e in repo.store.walk()
+        if e.is_revlog and not e.is_changelog and e.main_file_path() in todo
+    ]
+    for entry in storeentries:
+        with repo.wlock(), repo.lock():
+            with repo.transaction(b'resnapshot') as tr:
+                rl = entry.get_revlog_instance(repo).get_revlog()
+                rewrite.v2_rewrite(rl, tr, revlog.revlog.DELTAREUSENEVER)
+            # the rewrite itself read through the long chains
+            _forget(repo.svfs, rl.radix)
+            # the statistics might have been flushed in the meantime
+            try:
+                entries = read(repo.cachevfs)
+            except error.CorruptedState:
+                entries = {}
+            if rl.radix in entries:
+                pin, reads, longest = entries[rl.radix]
+                entries[rl.radix] = (pin, reads, 0)
+                _write(repo.cachevfs, entries)
+        ui.note(_(b'%s: rewritten\n') % rl.display_id)
+    return len(storeentries)
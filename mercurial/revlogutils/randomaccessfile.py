@@ -4,6 +4,7 @@
 # GNU General Public License version 2 or any later version.
 
 import contextlib
+import threading
 
 from ..i18n import _
 from .. import (
@@ -23,6 +24,58 @@ def _is_power_of_two(n):
     return (n & (n - 1) == 0) and n != 0
 
 
+class blockcache:
+    """A size bounded LRU cache of aligned blocks of revlog data
+
+    Keys are `(owner, offset)` pairs where `owner` is a token unique to a
+    `randomaccessfile`, so the same cache can be shared by many files. The
+    cost of an entry is the size of the block.
+    """
+
+    def __init__(self, max_size, shared=False):
+        # the number of entries is bounded by the cost, the capacity only
+        # needs to be large enough to never be the limit
+        self._cache = util.lrucachedict(max_size, maxcost=max_size)
+        self.max_size = max_size
+        # a shared cache can be used by the threads of hgweb
+        self._lock = threading.Lock() if shared else None
+
+    def get(self, key):
+        if self._lock is None:
+            return self._cache.get(key)
+        with self._lock:
+            return self._cache.get(key)
+
+    def insert(self, key, block):
+        if self._lock is None:
+            self._cache.insert(key, block, cost=len(block))
+        else:
+            with self._lock:
+                self._cache.insert(key, block, cost=len(block))
+
+    def clear(self):
+        if self._lock is None:
+            self._cache.clear()
+        else:
+            with self._lock:
+                self._cache.clear()
+
+
+# process wide block caches, by size
+_shared_block_caches = {}
+_shared_block_caches_lock = threading.Lock()
+
+
+def shared_block_cache(max_size):
+    """return the block cache of `max_size` bytes shared by the process"""
+    with _shared_block_caches_lock:
+        cache = _shared_block_caches.get(max_size)
+        if cache is None:
+            cache = blockcache(max_size, shared=True)
+            _shared_block_caches[max_size] = cache
+        return cache
+
+
 class appender:
     """the changelog index must be updated last on disk, so we use this class
     to delay writes to it"""
@@ -102,6 +155,9 @@ class randomaccessfile:
         filename,
         default_cached_chunk_size,
         initial_cache=None,
+        use_mmap=False,
+        block_cache_size=0,
+        block_cache_shared=False,
     ):
         # Required by bitwise manipulation below
         assert _is_power_of_two(default_cached_chunk_size)
@@ -115,10 +171,62 @@ class randomaccessfile:
         self._cached_chunk_position = 0  # Offset from the start of the file
         if initial_cache:
             self._cached_chunk_position, self._cached_chunk = initial_cache
+        # Serve the reads from a memory mapping of the whole file.
+        #
+        # None means "not decided yet", the file system is only checked on
+        # the first read.
+        self._use_mmap = None if use_mmap else False
+        self._mapped = b''
+        self._mapped_identity = None
+        # Instead of a single window, keep the recently read blocks of
+        # `default_cached_chunk_size` bytes in a LRU cache of
+        # `block_cache_size` bytes, possibly shared with the other files.
+        # `_cached_chunk` then only holds the `initial_cache`.
+        self._blocks = None
+        self._blocks_owner = object()
+        if block_cache_size > 0:
+            if block_cache_shared:
+                self._blocks = shared_block_cache(block_cache_size)
+            else:
+                self._blocks = blockcache(block_cache_size)
+        # read amplification counters, see `read_stats`
+        self._read_count = 0
+        self._requested_bytes = 0
+        self._read_bytes = 0
+        self._mapped_bytes = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
 
     def clear_cache(self):
         self._cached_chunk = b''
         self._cached_chunk_position = 0
+        if self._blocks is not None:
+            # the blocks of the previous owner age out of a shared cache
+            self._blocks_owner = object()
+        # The file might have been truncated or replaced, drop the mapping.
+        # The memoryviews already handed out keep it alive until they die.
+        self._mapped = b''
+        self._mapped_identity = None
+
+    def read_stats(self):
+        """return a dict of counters about the reads served so far
+
+        - `requests`: number of chunks requested,
+        - `requested-bytes`: size of the chunks requested,
+        - `read-bytes`: bytes copied out of the file to serve them,
+        - `mapped-bytes`: bytes served from the memory mapping without copy,
+        - `cache-hits`: requests fully served from the cached data,
+        - `cache-misses`: requests that needed to read the file.
+
+        The read amplification is `read-bytes / requested-bytes`."""
+        return {
+            b'requests': self._read_count,
+            b'requested-bytes': self._requested_bytes,
+            b'read-bytes': self._read_bytes,
+            b'mapped-bytes': self._mapped_bytes,
+            b'cache-hits': self._cache_hits,
+            b'cache-misses': self._cache_misses,
+        }
 
     @property
     def is_open(self):
@@ -181,18 +289,88 @@ class randomaccessfile:
 
         Raises if the requested number of bytes could not be read.
         """
+        self._read_count += 1
+        self._requested_bytes += length
         end = offset + length
+        # Data being written might still sit in the buffer of the writing
+        # handle, so it cannot be served from a mapping.
+        if self._use_mmap is not False and self.writing_handle is None:
+            data = self._read_mapped(offset, length)
+            if data is not None:
+                self._mapped_bytes += length
+                return data
         cache_start = self._cached_chunk_position
         cache_end = cache_start + len(self._cached_chunk)
         # Is the requested chunk within the cache?
         if cache_start <= offset and end <= cache_end:
+            self._cache_hits += 1
             if cache_start == offset and end == cache_end:
                 return self._cached_chunk  # avoid a copy
             relative_start = offset - cache_start
             return util.buffer(self._cached_chunk, relative_start, length)
 
+        if self._blocks is not None:
+            return self._read_blocks(offset, length)
+        self._cache_misses += 1
         return self._read_and_update_cache(offset, length)
 
+    def _read_blocks(self, offset, length):
+        """read a chunk through the block cache"""
+        block_size = self.default_cached_chunk_size
+        end = offset + length
+        first = offset & ~(block_size - 1)
+        blocks = []
+        position = first
+        while position < end:
+            block = self._blocks.get((self._blocks_owner, position))
+            # the last block of the file is short, and the file might have
+            # grown since it was cached
+            if block is None or position + len(block) < min(
+                end, position + block_size
+            ):
+                break
+            blocks.append(block)
+            position += block_size
+
+        if position >= end:
+            self._cache_hits += 1
+            data = blocks[0] if len(blocks) == 1 else b''.join(blocks)
+        else:
+            self._cache_misses += 1
+            real_length = (
+                (end + block_size - 1) & ~(block_size - 1)
+            ) - position
+            with self._read_handle() as file_obj:
+                file_obj.seek(position)
+                read = file_obj.read(real_length)
+            self._read_bytes += len(read)
+            got = position + len(read) - offset
+            if got < length:
+                message = PARTIAL_READ_MSG % (
+                    self.filename,
+                    length,
+                    offset,
+                    got,
+                )
+                raise error.RevlogError(message)
+            # do not flush the cache for a single large read
+            if len(read) <= self._blocks.max_size // 4:
+                for start in range(0, len(read), block_size):
+                    self._blocks.insert(
+                        (self._blocks_owner, position + start),
+                        read[start : start + block_size],
+                    )
+            if blocks:
+                blocks.append(read)
+                data = b''.join(blocks)
+            else:
+                data = read
+
+        relative_start = offset - first
+        if relative_start == 0 and len(data) == length:
+            return data
+        return util.buffer(data, relative_start, length)
+
     def _read_and_update_cache(self, offset, length):
         # Cache data both forward and backward around the requested
         # data, in a fixed size window. This helps speed up operations
@@ -205,6 +383,7 @@ class randomaccessfile:
         with self._read_handle() as file_obj:
             file_obj.seek(real_offset)
             data = file_obj.read(real_length)
+        self._read_bytes += len(data)
 
         self._add_cached_chunk(real_offset, data)
 
@@ -218,6 +397,46 @@ class randomaccessfile:
             return util.buffer(data, relative_offset, length)
         return data
 
+    def _read_mapped(self, offset, length):
+        """return a zero-copy view of a chunk of the mapped file
+
+        The mapping is refreshed when the chunk lays past its end, as data
+        are only ever appended to the file in normal operation. Return None
+        when the chunk cannot be served from a mapping, the caller should
+        fall back to a regular read."""
+        end = offset + length
+        if end > len(self._mapped) and not self._remap(end):
+            return None
+        return util.buffer(self._mapped, offset, length)
+
+    def _remap(self, end):
+        """map the current content of the file
+
+        Return True if the new mapping covers data up to `end`."""
+        try:
+            if self._use_mmap is None:
+                self._use_mmap = self.opener.is_mmap_safe(self.filename)
+                if not self._use_mmap:
+                    return False
+            with self._read_handle() as fp:
+                st = self.opener.fstat(fp)
+                if st.st_size < end:
+                    return False
+                identity = (st.st_dev, st.st_ino)
+                if identity != self._mapped_identity or st.st_size > len(
+                    self._mapped
+                ):
+                    self._mapped = util.mmapread(
+                        fp, st.st_size, pre_populate=False
+                    )
+                    self._mapped_identity = identity
+        except (OSError, ValueError):
+            # mmap is not available for this file, stick to regular reads
+            self._use_mmap = False
+            self.clear_cache()
+            return False
+        return end <= len(self._mapped)
+
     def _add_cached_chunk(self, offset, data):
         """Add to or replace the cached data chunk.
 
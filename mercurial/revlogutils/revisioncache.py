@@ -0,0 +1,210 @@
+# revisioncache.py - process wide cache of revlog revision texts
+#
+# Copyright Mercurial Contributors
+#
+# This software may be used and distributed according to the terms of the
+# GNU General Public License version 2 or any later version.
+"""A cache of decoded revisions shared by all the revlogs of a process
+
+Each revlog only remembers the last revision it decoded. Long lived processes
+(hgweb, command server) serving many files keep decoding the same revisions
+again. This cache keeps validated raw texts under a single memory budget,
+every revlog getting at most a slice of it.
+
+Eviction follows the GreedyDual-Size policy: the benefit of keeping a text is
+the work needed to rebuild it, its delta chain length times its size, and its
+cost is its size. An entry gets the priority `L + benefit / cost` when it is
+inserted or used, the entry with the lowest priority is evicted first and `L`
+is raised to its priority, so entries that are not used age out.
+"""
+
+import heapq
+import threading
+
+# a revlog can use at most `1 / _SLICE_FACTOR` of the budget
+_SLICE_FACTOR = 4
+
+# the statistics of the revlogs without entries are forgotten once there are
+# more than this many revlogs
+_MIN_OWNERS = 1024
+
+
+class _owner:
+    """The entries and statistics of a revlog"""
+
+    __slots__ = ('cost', 'count', 'heap', 'hits', 'misses')
+
+    def __init__(self):
+        self.cost = 0
+        self.count = 0
+        # (priority, sequence, node)
+        self.heap = []
+        self.hits = 0
+        self.misses = 0
+
+
+class revisioncache:
+    """Size bounded cache of revision texts keyed by (owner, node)
+
+    `owner` identifies a revlog, see `_InnerRevlog.revision_cache_owner`.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.slice = budget // _SLICE_FACTOR
+        self.totalcost = 0
+        # (owner, node) -> [priority, sequence, text, chain length]
+        self._entries = {}
+        self._owners = {}
+        self._maxowners = _MIN_OWNERS
+        # (priority, sequence, owner, node), contains stale items
+        self._heap = []
+        self._inflation = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _owner(self, owner):
+        o = self._owners.get(owner)
+        if o is None:
+            if len(self._owners) >= self._maxowners:
+                self._prune_owners()
+            o = self._owners[owner] = _owner()
+        return o
+
+    def _prune_owners(self):
+        """forget the revlogs without entries
+
+        Every miss of a new revlog creates a record, and the identity of a
+        revlog changes when it is rewritten, so they would accumulate in
+        long lived processes."""
+        self._owners = {k: o for k, o in self._owners.items() if o.count}
+        self._maxowners = max(_MIN_OWNERS, 2 * len(self._owners))
+
+    def _push(self, owner, o, node, entry):
+        """(re)compute the priority of an entry"""
+        self._sequence += 1
+        entry[0] = self._inflation + entry[3]
+        entry[1] = self._sequence
+        heapq.heappush(self._heap, (entry[0], entry[1], owner, node))
+        heapq.heappush(o.heap, (entry[0], entry[1], node))
+        # the heaps keep the outdated priorities until they are popped
+        if len(self._heap) > 4 * len(self._entries) + 1024:
+            self._heap = [
+                i
+                for i in self._heap
+                if self._is_current(i[2], i[3], i[0], i[1])
+            ]
+            heapq.heapify(self._heap)
+        if len(o.heap) > 4 * o.count + 1024:
+            o.heap = [
+                i for i in o.heap if self._is_current(owner, i[2], i[0], i[1])
+            ]
+            heapq.heapify(o.heap)
+
+    def get(self, owner, node):
+        """return the cached text for node, or None"""
+        with self._lock:
+            entry = self._entries.get((owner, node))
+            o = self._owner(owner)
+            if entry is None:
+                o.misses += 1
+                return None
+            o.hits += 1
+            self._push(owner, o, node, entry)
+            return entry[2]
+
+    def insert(self, owner, node, text, chainlength):
+        """cache the text of node, whose delta chain has `chainlength` items"""
+        cost = len(text)
+        if cost > self.slice:
+            return
+        with self._lock:
+            key = (owner, node)
+            o = self._owner(owner)
+            if key in self._entries:
+                return
+            while o.cost + cost > self.slice:
+                self._evict_from(owner, o)
+            while self.totalcost + cost > self.budget:
+                self._evict()
+            entry = [0, 0, text, chainlength]
+            self._entries[key] = entry
+            o.cost += cost
+            o.count += 1
+            self.totalcost += cost
+            self._push(owner, o, node, entry)
+
+    def _is_current(self, owner, node, priority, sequence):
+        entry = self._entries.get((owner, node))
+        return (
+            entry is not None and entry[0] == priority and entry[1] == sequence
+        )
+
+    def _drop(self, owner, node, priority):
+        entry = self._entries.pop((owner, node))
+        o = self._owners[owner]
+        o.cost -= len(entry[2])
+        o.count -= 1
+        self.totalcost -= len(entry[2])
+        self._inflation = max(self._inflation, priority)
+
+    def _evict(self):
+        """evict the entry with the lowest priority"""
+        while True:
+            priority, sequence, owner, node = heapq.heappop(self._heap)
+            if self._is_current(owner, node, priority, sequence):
+                self._drop(owner, node, priority)
+                return
+
+    def _evict_from(self, owner, o):
+        """evict the entry of `owner` with the lowest priority"""
+        while True:
+            priority, sequence, node = heapq.heappop(o.heap)
+            if self._is_current(owner, node, priority, sequence):
+                self._drop(owner, node, priority)
+                return
+
+    def clear_owner(self, owner):
+        """drop all the entries of a revlog"""
+        with self._lock:
+            o = self._owners.get(owner)
+            if o is None:
+                return
+            for priority, sequence, node in o.heap:
+                if self._is_current(owner, node, priority, sequence):
+                    entry = self._entries.pop((owner, node))
+                    self.totalcost -= len(entry[2])
+            o.cost = 0
+            o.count = 0
+            o.heap = []
+            if not self._entries:
+                self._heap = []
+
+    def stats(self, owner):
+        """return a dict of statistics about the entries of `owner`"""
+        with self._lock:
+            o = self._owners.get(owner)
+            if o is None:
+                o = _owner()
+            return {
+                b'revision-cache-hits': o.hits,
+                b'revision-cache-misses': o.misses,
+                b'revision-cache-size': o.cost,
+            }
+
+
+# process wide caches, by budget
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(budget):
+    """return the process wide revision cache of `budget` bytes"""
+    with _caches_lock:
+        cache = _caches.get(budget)
+        if cache is None:
+            cache = _caches[budget] = revisioncache(budget)
+        return cache
@@ -11,6 +11,7 @@ import binascii
 import contextlib
 import os
 import struct
+import time
 
 from ..node import (
     nullrev,
@@ -229,6 +230,177 @@ def _rewrite_v2(revlog, tr, censor_revs, tombstone=b''):
     docket.write(transaction=None, stripping=True)
 
 
+def v2_rewrite(rl, tr, deltareuse):
+    """rewrite all the content of a "version 2" revlog
+
+    The revisions are copied to new index, data and sidedata files using the
+    current configuration of the revlog, `deltareuse` is one of the
+    `revlog.DELTAREUSE*` policy of `revlog.clone`.
+
+    The docket only points to the new files when the copy is complete, so
+    readers are never blocked and keep reading the old files until they
+    reload the docket. The old files are kept for them until the next
+    rewrite, the files replaced by the previous rewrite are then removed
+    once the transaction is committed.
+    """
+    assert rl._format_version != REVLOGV0, rl._format_version
+    assert rl._format_version != REVLOGV1, rl._format_version
+
+    # avoid cycle
+    from .. import revlog
+
+    newrl = revlog.revlog(
+        rl.opener,
+        target=rl.target,
+        radix=rl.radix,
+        censorable=rl.feature_config.censorable,
+        data_config=rl.data_config,
+        delta_config=rl.delta_config,
+        feature_config=rl.feature_config,
+    )
+    docket = newrl._docket
+    older = docket.drop_older_files()
+    docket.new_index_file()
+    docket.new_data_file()
+    docket.new_sidedata_file()
+    docket.index_end = 0
+    docket.data_end = 0
+    docket.sidedata_end = 0
+    engine = util.compengines[rl.feature_config.compression_engine]
+    docket.default_compression_header = engine.revlogheader()
+
+    newrl.clearcaches()
+    chunk_cache = newrl._loadindex(docket=docket)
+    newrl._load_inner(chunk_cache)
+    assert not len(newrl)
+
+    # the docket of the new revlog is written when the copy is done
+    rl.clone(tr, newrl, deltareuse=deltareuse)
+
+    def remove_older(tr):
+        for path in older:
+            rl.opener.tryunlink(path)
+
+    # the current files of the docket are unique to this rewrite
+    category = b'revlog-rewrite-%s' % docket.index_filepath()
+    tr.addpostclose(category, remove_older)
+
+    rl.clearcaches()
+    chunk_cache = rl._loadindex()
+    rl._load_inner(chunk_cache)
+
+
+# name of the file tracking the progress of `optimize_revlogs` in .hg/cache
+OPTIMIZE_STATE_FILE = b'optimize-revlogs'
+
+
+def _read_optimize_state(repo, deltareuse):
+    """return the set of the revlogs already rewritten with `deltareuse`"""
+    try:
+        lines = repo.cachevfs.read(OPTIMIZE_STATE_FILE).splitlines()
+    except FileNotFoundError:
+        return set()
+    if not lines or lines[0] != deltareuse:
+        return set()
+    return set(lines[1:])
+
+
+def _write_optimize_state(repo, deltareuse, done):
+    with repo.cachevfs(OPTIMIZE_STATE_FILE, b'w', atomictemp=True) as fp:
+        fp.write(deltareuse + b'\n')
+        for radix in sorted(done):
+            fp.write(radix + b'\n')
+
+
+def _optimize_key(entry):
+    if entry.is_manifestlog:
+        return b'm %s' % entry.target_id
+    return b'f %s' % entry.target_id
+
+
+def _docket_size(rl):
+    docket = rl._docket
+    return docket.index_end + docket.data_end + docket.sidedata_end
+
+
+def optimize_revlogs(
+    ui,
+    repo,
+    deltareuse,
+    pause=0,
+    time_limit=None,
+    max_revlogs=None,
+    restart=False,
+):
+    """rewrite the manifest and file revlogs of the store one at a time
+
+    The changelog is left alone, its revisions are small and rarely stored
+    as deltas.
+
+    Each revlog is rewritten with `v2_rewrite` in its own lock and
+    transaction, so the repository stays usable while this runs. The revlogs
+    already rewritten are recorded in `.hg/cache/optimize-revlogs` and
+    skipped by the next call, unless `restart` is set or `deltareuse`
+    changed.
+
+    `pause` is a number of seconds to wait between two revlogs, no new
+    revlog is processed after `time_limit` seconds or once `max_revlogs`
+    revlogs have been rewritten.
+
+    Return the number of revlogs left to process.
+    """
+    if restart:
+        done = set()
+    else:
+        done = _read_optimize_state(repo, deltareuse)
+
+    entries = [
+        e for e in repo.store.walk() if e.is_revlog and not e.is_changelog
+    ]
+    todo = [e for e in entries if _optimize_key(e) not in done]
+    skipped = len(entries) - len(todo)
+    if skipped:
+        msg = _(b'skipping %d revlogs already optimized\n')
+        ui.status(msg % skipped)
+
+    start = time.time()
+    processed = 0
+    old_size = new_size = 0
+    progress = ui.makeprogress(
+        _(b'optimizing revlogs'), unit=_(b'revlogs'), total=len(todo)
+    )
+    for entry in todo:
+        if max_revlogs is not None and processed >= max_revlogs:
+            break
+        if time_limit is not None and time.time() - start >= time_limit:
+            break
+        if processed and pause:
+            time.sleep(pause)
+        progress.increment()
+        with repo.lock(), repo.transaction(b'optimize-revlogs') as tr:
+            rl = entry.get_revlog_instance(repo).get_revlog()
+            if len(rl):
+                before = _docket_size(rl)
+                v2_rewrite(rl, tr, deltareuse)
+                after = _docket_size(rl)
+                old_size += before
+                new_size += after
+                msg = _(b'%s: %d bytes -> %d bytes\n')
+                ui.note(msg % (rl.display_id, before, after))
+        done.add(_optimize_key(entry))
+        _write_optimize_state(repo, deltareuse, done)
+        processed += 1
+    progress.complete()
+
+    remaining = len(todo) - processed
+    msg = _(b'optimized %d revlogs (%d bytes -> %d bytes)\n')
+    ui.status(msg % (processed, old_size, new_size))
+    if remaining:
+        msg = _(b'%d revlogs left to optimize\n')
+        ui.status(msg % remaining)
+    return remaining
+
+
 def _precompute_rewritten_delta(
     revlog,
     old_index,
@@ -549,15 +549,41 @@ def ancestorspec(repo, subset, x, n, order):
     return subset & ps
 
 
+def _changelogtextcache(repo):
+    """return the changelog text cache of the repository, or None if it is
+    disabled
+
+    The cache is not warmed here, that is done by `updatecaches`: the
+    revisions it does not cover yet must be read from the changelog."""
+    ctc = repo.changelogtextcache()
+    if ctc is not None:
+        # only checks the last cached revision, unless history was rewritten
+        ctc.validate()
+    return ctc
+
+
 @predicate(b'author(string)', safe=True, weight=10)
 def author(repo, subset, x):
     """Alias for ``user(string)``."""
     # i18n: "author" is a keyword
     n = getstring(x, _(b"author requires a string"))
     kind, pattern, matcher = _substringmatcher(n, casesensitive=False)
-    return subset.filter(
-        lambda x: matcher(repo[x].user()), condrepr=(b'<user %r>', n)
-    )
+    ctc = _changelogtextcache(repo)
+    if ctc is None:
+        return subset.filter(
+            lambda x: matcher(repo[x].user()), condrepr=(b'<user %r>', n)
+        )
+
+    # match each distinct user name once
+    userids = {i for i, u in enumerate(ctc.users()) if matcher(u)}
+    cached = len(ctc)
+
+    def matches(r):
+        if 0 <= r < cached:
+            return ctc.userid(r) in userids
+        return matcher(repo[r].user())
+
+    return subset.filter(matches, condrepr=(b'<user %r>', n))
 
 
 @predicate(b'bisect(string)', safe=True)
@@ -741,6 +767,11 @@ def checkstatus(repo, subset, pat, field):
 def _children(repo, subset, parentset):
     if not parentset:
         return baseset()
+    childrenfn = dagop.childrenfunc(repo)
+    if childrenfn is not None:
+        return baseset(
+            {r for p in parentset for r in childrenfn(p) if r in subset}
+        )
     cs = set()
     pr = repo.changelog.parentrevs
     minrev = parentset.min()
@@ -889,9 +920,18 @@ def date(repo, subset, x):
     # i18n: "date" is a keyword
     ds = getstring(x, _(b"date requires a string"))
     dm = dateutil.matchdate(ds)
-    return subset.filter(
-        lambda x: dm(repo[x].date()[0]), condrepr=(b'<date %r>', ds)
-    )
+    mrc = repo.manifestrevcache()
+    if mrc is None:
+        return subset.filter(
+            lambda x: dm(repo[x].date()[0]), condrepr=(b'<date %r>', ds)
+        )
+
+    def matches(r):
+        if r == wdirrev:
+            return dm(repo[r].date()[0])
+        return dm(mrc.date(r)[0])
+
+    return subset.filter(matches, condrepr=(b'<date %r>', ds))
 
 
 @predicate(b'desc(string)', safe=True, weight=10)
@@ -906,9 +946,27 @@ def desc(repo, subset, x):
 
     kind, pattern, matcher = _substringmatcher(ds, casesensitive=False)
 
-    return subset.filter(
-        lambda r: matcher(repo[r].description()), condrepr=(b'<desc %r>', ds)
-    )
+    ctc = _changelogtextcache(repo)
+    if ctc is None:
+        return subset.filter(
+            lambda r: matcher(repo[r].description()),
+            condrepr=(b'<desc %r>', ds),
+        )
+
+    cached = len(ctc)
+    revs = None
+    if kind == b'literal' and isinstance(subset, fullreposet):
+        # search all the descriptions at once rather than one by one
+        revs = ctc.searchdescriptions(pattern)
+
+    def matches(r):
+        if not 0 <= r < cached:
+            return matcher(repo[r].description())
+        if revs is not None:
+            return r in revs
+        return matcher(ctc.description(r))
+
+    return subset.filter(matches, condrepr=(b'<desc %r>', ds))
 
 
 def _descendants(
@@ -1568,7 +1626,16 @@ def keyword(repo, subset, x):
     # i18n: "keyword" is a keyword
     kw = encoding.lower(getstring(x, _(b"keyword requires a string")))
 
+    ctc = _changelogtextcache(repo)
+    cached = len(ctc) if ctc is not None else 0
+
     def matches(r):
+        if 0 <= r < cached:
+            # look at the cached texts before reading the changeset
+            texts = [ctc.users()[ctc.userid(r)], ctc.description(r)]
+            if any(kw in encoding.lower(t) for t in texts):
+                return True
+            return any(kw in encoding.lower(f) for f in repo[r].files())
         c = repo[r]
         return any(
             kw in encoding.lower(t)
@@ -2860,8 +2927,291 @@ def matchany(ui, specs, lookup=None, localalias=None):
     return makematcher(tree)
 
 
+def _phaseestimate(*targets):
+    def estimate(repo, x):
+        return len(repo._phasecache.getrevset(repo, targets))
+
+    return estimate
+
+
+def _branchestimate(repo, x):
+    if x is None or x[0] not in (b'string', b'symbol'):
+        return None
+    bm = repo.branchmap()
+    if not bm.hasbranch(x[1]):
+        return None
+    # assume the revisions are evenly spread between the branches
+    return len(repo) // len(list(bm))
+
+
+def _listestimate(repo, x):
+    if x is None or x[0] != b'string':
+        return None
+    return len(x[1].split(b'\0'))
+
+
+def _symbolrev(repo, x):
+    """resolve a single revision argument, or return None"""
+    if x is None or x[0] not in (b'string', b'symbol'):
+        return None
+    try:
+        rev = scmutil.intrev(scmutil.revsymbol(repo, x[1]))
+    except (error.RepoLookupError, error.LookupError):
+        return None
+    if rev == wdirrev:
+        return None
+    return rev
+
+
+def _ancestorsestimate(repo, x):
+    rev = _symbolrev(repo, x)
+    if rev is None:
+        return None
+    # the rank is the exact number of ancestors, when it is stored
+    rank = repo.changelog.fast_rank(rev) if rev != nullrev else 0
+    if rank is not None:
+        return rank
+    return rev + 1
+
+
+def _descendantsestimate(repo, x):
+    rev = _symbolrev(repo, x)
+    if rev is None:
+        return None
+    return len(repo) - max(rev, 0)
+
+
+def _phaseandancestorsestimate(repo, x):
+    # what the optimizer turns 'draft() and ancestors(x)' into
+    args = getlist(x)
+    if len(args) != 2 or args[0][0] != b'symbol':
+        return None
+    estimates = [
+        _estimators[args[0][1]](repo, None),
+        _ancestorsestimate(repo, args[1]),
+    ]
+    return min(e for e in estimates if e is not None)
+
+
+# functions estimating the number of revisions matched by a predicate from
+# its arguments, without evaluating it (see _estimate())
+_estimators = {
+    b'all': lambda repo, x: len(repo),
+    b'ancestors': _ancestorsestimate,
+    b'branch': _branchestimate,
+    b'descendants': _descendantsestimate,
+    b'draft': _phaseestimate(phases.draft),
+    b'secret': _phaseestimate(phases.secret),
+    b'_notpublic': _phaseestimate(*phases.not_public_phases),
+    b'_phaseandancestors': _phaseandancestorsestimate,
+    b'_list': _listestimate,
+    b'_intlist': _listestimate,
+    b'_hexlist': _listestimate,
+}
+
+
+def _estimate(repo, x):
+    """estimate the number of revisions an optimized tree evaluates to
+
+    Return None when no estimate can be made cheaply."""
+    if x is None:
+        return None
+    op = x[0]
+    if op in (b'string', b'symbol'):
+        return 1
+    elif op == b'rangeall':
+        return len(repo)
+    elif op in (b'and', b'andsmally'):
+        estimates = [_estimate(repo, x[1]), _estimate(repo, x[2])]
+        estimates = [e for e in estimates if e is not None]
+        if not estimates:
+            return None
+        return min(estimates)
+    elif op == b'difference':
+        return _estimate(repo, x[1])
+    elif op == b'or':
+        estimates = [_estimate(repo, y) for y in getlist(x[1])]
+        if None in estimates:
+            return None
+        return min(sum(estimates), len(repo))
+    elif op == b'not':
+        estimate = _estimate(repo, x[1])
+        if estimate is None:
+            return None
+        return max(len(repo) - estimate, 0)
+    elif op == b'func':
+        estimate = _estimators.get(getsymbol(x[1]))
+        if estimate is not None:
+            return estimate(repo, x[2])
+    return None
+
+
+def _plan(repo, x):
+    """reorder the operands of 'and' by their estimated number of revisions
+
+    The static weights of the optimizer do not know the content of the
+    repository: 'draft() and branch(stable)' always starts with the draft
+    changesets, even when there are many more of them than changesets on the
+    stable branch."""
+    if not isinstance(x, tuple):
+        return x
+    op = x[0]
+    if op in (b'string', b'symbol', b'smartset', b'nodeset'):
+        return x
+    x = (op,) + tuple(_plan(repo, y) for y in x[1:])
+    if op in (b'and', b'andsmally'):
+        wa, wb = _estimate(repo, x[1]), _estimate(repo, x[2])
+        if wa is not None and wb is not None:
+            # 'andsmally' evaluates its second operand first
+            op = b'andsmally' if wb < wa else b'and'
+            x = (op, x[1], x[2])
+    return x
+
+
+# operators whose result only depends on the result of their operands
+_pureops = {
+    b'ancestor',
+    b'and',
+    b'andsmally',
+    b'dagrange',
+    b'difference',
+    b'list',
+    b'not',
+    b'or',
+    b'parent',
+    b'parentpost',
+    b'range',
+    b'rangeall',
+    b'rangepost',
+    b'rangepre',
+}
+
+# predicates whose result only depends on the changesets of the repository
+# and the result of their arguments
+_purepredicates = {
+    b'all',
+    b'ancestor',
+    b'ancestors',
+    b'branchpoint',
+    b'children',
+    b'closed',
+    b'descendants',
+    b'first',
+    b'head',
+    b'heads',
+    b'last',
+    b'limit',
+    b'max',
+    b'merge',
+    b'min',
+    b'only',
+    b'p1',
+    b'p2',
+    b'parents',
+    b'reverse',
+    b'roots',
+    b'_firstancestors',
+    b'_firstdescendants',
+}
+
+# predicates whose arguments are literal values, like patterns matched
+# against the changesets, rather than revisions (date() is not one of them,
+# its intervals can be relative to the current time)
+_pureliteralpredicates = {
+    b'author',
+    b'desc',
+    b'keyword',
+    b'user',
+    b'_hexlist',
+    b'_intlist',
+}
+
+
+def _ispuresymbol(symbol):
+    """tell if a symbol is resolved without looking at names like bookmarks
+    or tags, which change independently of the changelog"""
+    if symbol in (b'tip', b'null'):
+        return True
+    try:
+        return b'%d' % int(symbol) == symbol
+    except ValueError:
+        pass
+    return len(symbol) == 40 and all(c in b'0123456789abcdef' for c in symbol)
+
+
+def _ispure(x):
+    """tell if the result of a tree only depends on the visible changesets
+    of the repository (and not on the working copy, phases, names...)"""
+    if x is None:
+        return True
+    op = x[0]
+    if op in (b'string', b'symbol'):
+        return _ispuresymbol(x[1])
+    elif op == b'func':
+        name = getsymbol(x[1])
+        if name in _pureliteralpredicates:
+            return True
+        if name == b'_list':
+            if x[2] is None or x[2][0] != b'string':
+                return False
+            return all(_ispuresymbol(s) for s in x[2][1].split(b'\0'))
+        return name in _purepredicates and _ispure(x[2])
+    elif op == b'keyvalue':
+        return _ispure(x[2])
+    elif op in _pureops:
+        return all(_ispure(y) for y in x[1:])
+    return False
+
+
+def _changelogkey(repo):
+    """return a key identifying the content of the changelog of repo as
+    seen through its filter"""
+    cl = repo.changelog
+    if repo.filtername is None:
+        return (len(cl), cl.tip())
+    # computed when accessing the filtered changelog
+    return repo._clcachekey
+
+
+def _cacheresult(cache, key, revs):
+    """store the revisions of a revset result in cache
+
+    Lazy sets (e.g. of ancestors or of a filter) are stored once they have
+    been fully iterated, computing them upfront would defeat first() or
+    limit(). Return the smartset to use instead of revs."""
+    if revs.isascending():
+        ascending = True
+    elif revs.isdescending():
+        ascending = False
+    else:
+        ascending = None
+    if isinstance(revs, baseset):
+        cache[key] = (tuple(revs), ascending, revs.istopo())
+        return revs
+    if ascending is None:
+        return revs
+    if revs.fastasc is not None:
+        it, iterasc = revs.fastasc(), True
+    elif revs.fastdesc is not None:
+        it, iterasc = revs.fastdesc(), False
+    else:
+        return revs
+
+    def gen():
+        computed = []
+        for r in it:
+            computed.append(r)
+            yield r
+        cache[key] = (tuple(computed), ascending, False)
+
+    result = generatorset(gen(), iterasc=iterasc)
+    result.sort(reverse=not ascending)
+    return result
+
+
 def makematcher(tree):
     """Create a matcher from an evaluatable tree"""
+    pure = _ispure(tree)
 
     def mfunc(repo, subset=None, order=None):
         if order is None:
@@ -2869,9 +3219,28 @@ def makematcher(tree):
                 order = defineorder  # 'x'
             else:
                 order = followorder  # 'subset & x'
+        cache = key = None
         if subset is None:
+            if pure and repo.ui.configint(
+                b'experimental', b'revset.cache-size'
+            ):
+                cache = repo._revsetcache
+                key = (repo.filtername, _changelogkey(repo), tree, order)
+                cached = cache.get(key)
+                if cached is not None:
+                    revs, ascending, istopo = cached
+                    revs = baseset(revs, istopo=istopo)
+                    if ascending is not None:
+                        revs.sort(reverse=not ascending)
+                    return revs
             subset = fullreposet(repo)
-        return getset(repo, subset, tree, order)
+        x = tree
+        if repo.ui.configbool(b'experimental', b'revset.planner'):
+            x = _plan(repo, x)
+        revs = getset(repo, subset, x, order)
+        if cache is not None:
+            revs = _cacheresult(cache, key, revs)
+        return revs
 
     return mfunc
 
@@ -17,6 +17,9 @@
 # s: "i hate that."
 
 
+import array
+import itertools
+
 from .i18n import _
 from . import (
     error,
@@ -24,6 +27,9 @@ from . import (
 )
 from .utils import stringutil
 
+# size of the pieces of text split into lines at once by _lineoffsets()
+_SPLITCHUNKSIZE = 1 << 20
+
 
 def intersect(ra, rb):
     """Given two ranges return the range where they intersect or None.
@@ -49,23 +55,33 @@ def intersect(ra, rb):
 
 
 def compare_range(a, astart, aend, b, bstart, bend):
-    """Compare a[astart:aend] == b[bstart:bend], without slicing."""
+    """Compare a[astart:aend] == b[bstart:bend]."""
     if (aend - astart) != (bend - bstart):
         return False
-    for ia, ib in zip(range(astart, aend), range(bstart, bend)):
-        if a[ia] != b[ib]:
-            return False
-    else:
-        return True
+    return _samerange(a, astart, aend, b, bstart, bend)
+
+
+def _samerange(a, astart, aend, b, bstart, bend):
+    """Compare a[astart:aend] == b[bstart:bend] with C level comparisons.
+
+    Lists of lines are sliced, _textlines compare the text of the ranges."""
+    if isinstance(a, _textlines) and isinstance(b, _textlines):
+        return a.chunk(astart, aend) == b.chunk(bstart, bend)
+    return a[astart:aend] == b[bstart:bend]
 
 
 class Merge3Text:
     """3-way merge of texts.
 
     Given strings BASE, OTHER, THIS, tries to produce a combined text
-    incorporating the changes from both BASE->OTHER and BASE->THIS."""
+    incorporating the changes from both BASE->OTHER and BASE->THIS.
+
+    The algorithm matching the lines of OTHER and THIS to BASE is the one
+    selected by the `diffopts` mdiff.diffopts, if any."""
 
-    def __init__(self, basetext, atext, btext, base=None, a=None, b=None):
+    def __init__(
+        self, basetext, atext, btext, base=None, a=None, b=None, diffopts=None
+    ):
         self.basetext = basetext
         self.atext = atext
         self.btext = btext
@@ -78,6 +94,7 @@ class Merge3Text:
         self.base = base
         self.a = a
         self.b = b
+        self.diffopts = diffopts
 
     def merge_groups(self):
         """Yield sequence of line groups.  Each one is a tuple:
@@ -214,8 +231,12 @@ class Merge3Text:
         """
 
         ia = ib = 0
-        amatches = mdiff.get_matching_blocks(self.basetext, self.atext)
-        bmatches = mdiff.get_matching_blocks(self.basetext, self.btext)
+        amatches = mdiff.get_matching_blocks(
+            self.basetext, self.atext, self.diffopts
+        )
+        bmatches = mdiff.get_matching_blocks(
+            self.basetext, self.btext, self.diffopts
+        )
         len_a = len(amatches)
         len_b = len(bmatches)
 
@@ -245,12 +266,16 @@ class Merge3Text:
                 aend = asub + intlen
                 bend = bsub + intlen
 
-                assert self.base[intbase:intend] == self.a[asub:aend], (
+                assert _samerange(
+                    self.base, intbase, intend, self.a, asub, aend
+                ), (
                     self.base[intbase:intend],
                     self.a[asub:aend],
                 )
 
-                assert self.base[intbase:intend] == self.b[bsub:bend]
+                assert _samerange(
+                    self.base, intbase, intend, self.b, bsub, bend
+                )
 
                 sl.append((intbase, intend, asub, aend, bsub, bend))
 
@@ -268,6 +293,97 @@ class Merge3Text:
         return sl
 
 
+def _lineoffsets(text):
+    """return an array of the offsets of the lines of text, and of its end"""
+    offsets = array.array('q', [0])
+    pos = 0
+    while pos < len(text):
+        # split a piece of the text at a time to bound the memory used
+        end = text.find(b'\n', pos + _SPLITCHUNKSIZE)
+        end = len(text) if end == -1 else end + 1
+        lines = mdiff.splitnewlines(text[pos:end])
+        sizes = itertools.chain([pos], map(len, lines))
+        offsets.extend(itertools.islice(itertools.accumulate(sizes), 1, None))
+        pos = end
+    return offsets
+
+
+class _textlines:
+    """The lines of a text, without holding them as separate objects
+
+    It behaves like the list of the lines of the text, slices being split
+    when requested. `chunk()` returns the text of a range of lines.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._offsets = _lineoffsets(text)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            assert step == 1
+            if start >= stop:
+                return []
+            return mdiff.splitnewlines(self.chunk(start, stop))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self.chunk(key, key + 1)
+
+    def chunk(self, start, end):
+        offsets = self._offsets
+        return self._text[offsets[start] : offsets[end]]
+
+
+class ChunkedMerge3Text(Merge3Text):
+    """Merge3Text variant for large texts
+
+    The texts are not split into lists of lines: only the offsets of the
+    lines are kept, and the lines of a region are only split when it is in
+    conflict. The regions taken from either side without conflict are
+    yielded by merge_groups() as a single chunk of text, so rendering the
+    merge gives the same result with fewer objects.
+    """
+
+    def __init__(self, basetext, atext, btext, diffopts=None):
+        Merge3Text.__init__(
+            self,
+            basetext,
+            atext,
+            btext,
+            base=_textlines(basetext),
+            a=_textlines(atext),
+            b=_textlines(btext),
+            diffopts=diffopts,
+        )
+
+    def merge_groups(self):
+        for t in self.merge_regions():
+            what = t[0]
+            if what == b'unchanged':
+                yield what, [self.base.chunk(t[1], t[2])]
+            elif what == b'a' or what == b'same':
+                yield what, [self.a.chunk(t[1], t[2])]
+            elif what == b'b':
+                yield what, [self.b.chunk(t[1], t[2])]
+            elif what == b'conflict':
+                yield (
+                    what,
+                    (
+                        self.base[t[1] : t[2]],
+                        self.a[t[3] : t[4]],
+                        self.b[t[5] : t[6]],
+                    ),
+                )
+            else:
+                raise ValueError(what)
+
+
 def _verifytext(input):
     """verifies that text is non-binary (unless opts[text] is passed,
     then we just warn)"""
@@ -497,10 +613,14 @@ def simplemerge(
     other,
     mode=b'merge',
     allow_binary=False,
+    diffopts=None,
+    chunked=False,
 ):
     """Performs the simplemerge algorithm.
 
-    The merged result is written into `localctx`.
+    The merged result is written into `localctx`. `diffopts` selects the diff
+    algorithm used to match the lines of the inputs. `chunked` merges with
+    ChunkedMerge3Text, to use less memory on large inputs.
     """
 
     if not allow_binary:
@@ -508,7 +628,14 @@ def simplemerge(
         _verifytext(base)
         _verifytext(other)
 
-    m3 = Merge3Text(base.text(), local.text(), other.text())
+    if chunked:
+        m3 = ChunkedMerge3Text(
+            base.text(), local.text(), other.text(), diffopts=diffopts
+        )
+    else:
+        m3 = Merge3Text(
+            base.text(), local.text(), other.text(), diffopts=diffopts
+        )
     conflicts = False
     if mode == b'union':
         lines = _resolve(m3, (1, 2))
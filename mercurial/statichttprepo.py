@@ -224,6 +224,9 @@ class statichttprepository(
         self.nodetagscache = None
         self._branchcaches = branchmap.BranchMapCache()
         self._revbranchcache = None
+        self._manifestrevcache = None
+        self._changelogtextcache = None
+        self._childrencache = None
         self.encodepats = None
         self.decodepats = None
         self._transref = None
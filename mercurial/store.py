@@ -403,6 +403,7 @@ _data = [
     b'phaseroots',
     b'obsstore',
     b'requires',
+    b'zstd-dictionaries',
 ]
 
 REVLOG_FILES_EXT = (
@@ -864,6 +865,13 @@ class basicstore:
                 is_volatile=True,
             )
 
+        # needed to decompress the revlogs, see revlogutils.compressiondicts
+        if self.vfs.exists(b'zstd-dictionaries'):
+            yield SimpleStoreEntry(
+                entry_path=b'zstd-dictionaries',
+                is_volatile=True,
+            )
+
         files = reversed(self._walk(b'', False))
 
         changelogs = collections.defaultdict(dict)
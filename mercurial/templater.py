@@ -68,6 +68,7 @@ mappedgenerator
 
 import abc
 import os
+import threading
 
 from typing import (
     BinaryIO,
@@ -383,11 +384,25 @@ def _unnesttemplatelist(tree):
         return (op,) + xs
 
 
+# parsed trees only depend on the template text and are never modified, so
+# they can be shared by all the templaters of a process (e.g. across the
+# requests served by hgweb or the command server). hgweb serves requests in
+# threads, and lookups reorder the lru, hence the lock.
+_parsecache = util.lrucachedict(200)
+_parsecachelock = threading.Lock()
+
+
 def parse(tmpl):
     """Parse template string into tree"""
-    parsed, pos = _parsetemplate(tmpl, 0, len(tmpl))
-    assert pos == len(tmpl), b'unquoted template should be consumed'
-    return _unnesttemplatelist((b'template', parsed))
+    with _parsecachelock:
+        tree = _parsecache.get(tmpl)
+    if tree is None:
+        parsed, pos = _parsetemplate(tmpl, 0, len(tmpl))
+        assert pos == len(tmpl), b'unquoted template should be consumed'
+        tree = _unnesttemplatelist((b'template', parsed))
+        with _parsecachelock:
+            _parsecache[tmpl] = tree
+    return tree
 
 
 def parseexpr(expr):
@@ -476,8 +491,39 @@ def _runrecursivesymbol(context, mapping, key):
 
 
 def buildtemplate(exp, context):
-    ctmpl = [compileexp(e, context, methods) for e in exp[1:]]
-    return (templateutil.runtemplate, ctmpl)
+    """Compile template fragments, folding adjacent literals together
+
+    >>> context = engine(lambda t: (templateutil.runsymbol, t))
+    >>> def build(tmpl):
+    ...     func, data = buildtemplate(parse(tmpl), context)
+    ...     if func is templateutil.runstring:
+    ...         return data
+    ...     return [(pycompat.sysbytes(f.__name__), d) for f, d in data]
+    >>> build(b'a{"b"}c')
+    'abc'
+    >>> build(b'{rev}:{"x"}{"y"}')
+    [('runsymbol', 'rev'), ('runstring', ':xy')]
+    """
+    ctmpl = []
+    for e in exp[1:]:
+        arg = compileexp(e, context, methods)
+        if arg[0] is templateutil.runtemplate:
+            # the output of a nested template is flattened anyway
+            ctmpl.extend(arg[1])
+        elif (
+            arg[0] is templateutil.runstring
+            and ctmpl
+            and ctmpl[-1][0] is templateutil.runstring
+        ):
+            # fold adjacent literals, e.g. from expanded aliases
+            ctmpl[-1] = (templateutil.runstring, ctmpl[-1][1] + arg[1])
+        else:
+            ctmpl.append(arg)
+    if not ctmpl:
+        return (templateutil.runstring, b'')
+    if len(ctmpl) == 1 and ctmpl[0][0] is templateutil.runstring:
+        return ctmpl[0]
+    return (templateutil.runtemplate, tuple(ctmpl))
 
 
 def buildfilter(exp, context):
@@ -1114,6 +1160,8 @@ class templater:
         """Return a generator that renders the specified named template and
         yields chunks"""
         stream = self._proc.process(t, mapping)
+        # the output is only grouped when asked to (e.g. by hgweb), render()
+        # otherwise joins the stream as it is produced
         if self._minchunk:
             stream = util.increasingchunks(
                 stream, min=self._minchunk, max=self._maxchunk
@@ -1063,8 +1063,9 @@ def runsymbol(context, mapping, key, default=b''):
 
 
 def runtemplate(context, mapping, template):
-    for arg in template:
-        yield evalrawexp(context, mapping, arg)
+    # same as evalrawexp(), inlined as this is run for every item
+    for func, data in template:
+        yield func(context, mapping, data)
 
 
 def runfilter(context, mapping, data):
@@ -42,6 +42,7 @@ def preservedrequirements(repo):
     preserved = {
         requirements.SHARED_REQUIREMENT,
         requirements.NARROW_REQUIREMENT,
+        requirements.ZSTD_DICTIONARIES_REQUIREMENT,
     }
     return preserved & repo.requirements
 
@@ -1069,6 +1070,7 @@ def supporteddestrequirements(repo):
             supported.add(b'exp-compression-%s' % name)
             if engine.name() == b'zstd':
                 supported.add(b'revlog-compression-zstd')
+                supported.add(requirements.ZSTD_DICTIONARIES_REQUIREMENT)
     return supported
 
 
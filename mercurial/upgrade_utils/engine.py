@@ -20,6 +20,7 @@ from .. import (
     vfs as vfsmod,
 )
 from ..revlogutils import (
+    compressiondicts,
     constants as revlogconst,
     flagutil,
     nodemap,
@@ -507,6 +508,17 @@ def upgrade(ui, srcrepo, dstrepo, upgrade_op):
             )
         scmutil.writereporequirements(srcrepo, upgrade_op.new_requirements)
     else:
+        dicts_req = requirements.ZSTD_DICTIONARIES_REQUIREMENT
+        if dicts_req in upgrade_op.new_requirements and srcrepo.svfs.exists(
+            compressiondicts.FILENAME
+        ):
+            # compress the new revlogs with the dictionaries of the source
+            util.copyfile(
+                srcrepo.store.rawvfs.join(compressiondicts.FILENAME),
+                dstrepo.store.rawvfs.join(compressiondicts.FILENAME),
+            )
+            feature_config = dstrepo.svfs.options[b'feature-config']
+            feature_config.compression_dictionaries = True
         with dstrepo.transaction(b'upgrade') as tr:
             _clonerevlogs(
                 ui,
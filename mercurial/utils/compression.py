@@ -334,6 +334,14 @@ class compressionengine:
         """
         raise NotImplementedError()
 
+    def traindictionary(self, samples, size):
+        """Train a dictionary of at most ``size`` bytes on ``samples``.
+
+        Returns a ``(id, data)`` tuple. Engines that do not support
+        dictionaries return ``None``.
+        """
+        return None
+
 
 class _CompressedStreamReader:
     def __init__(self, fh):
@@ -696,15 +704,53 @@ class _zstdengine(compressionengine):
         return _ZstdCompressedStreamReader(fh, self._module)
 
     class zstdrevlogcompressor:
-        def __init__(self, zstd, level=3):
+        def __init__(self, zstd, level=3, dictionaries=None, dictclass=None):
+            self._zstd = zstd
+            self._level = level
+            self._dictionaries = dictionaries
+            self._dictclass = dictclass
+            self._dctx = zstd.ZstdDecompressor()
+            # dictionary id -> decompression context
+            self._dictdctxs = {}
+            self._compinsize = zstd.COMPRESSION_RECOMMENDED_INPUT_SIZE
+            self._decompinsize = zstd.DECOMPRESSION_RECOMMENDED_INPUT_SIZE
+
+        @propertycache
+        def _cctx(self):
             # TODO consider omitting frame magic to save 4 bytes.
             # This writes content sizes into the frame header. That is
             # extra storage. But it allows a correct size memory allocation
             # to hold the result.
-            self._cctx = zstd.ZstdCompressor(level=level)
-            self._dctx = zstd.ZstdDecompressor()
-            self._compinsize = zstd.COMPRESSION_RECOMMENDED_INPUT_SIZE
-            self._decompinsize = zstd.DECOMPRESSION_RECOMMENDED_INPUT_SIZE
+            zstd = self._zstd
+            data = None
+            if self._dictionaries is not None and self._dictclass is not None:
+                data = self._dictionaries.current(self._dictclass)
+            if data is None:
+                return zstd.ZstdCompressor(level=self._level)
+            d = zstd.ZstdCompressionDict(data)
+            return zstd.ZstdCompressor(level=self._level, dict_data=d)
+
+        def _decompressor(self, data):
+            """return the decompression context for a frame
+
+            Frames compressed with a dictionary record its id."""
+            if self._dictionaries is None:
+                return self._dctx
+            zstd = self._zstd
+            dictid = zstd.get_frame_parameters(data).dict_id
+            if not dictid:
+                return self._dctx
+            dctx = self._dictdctxs.get(dictid)
+            if dctx is None:
+                raw = self._dictionaries.get(dictid)
+                if raw is None:
+                    raise error.StorageError(
+                        _(b'unknown zstd dictionary: %d') % dictid
+                    )
+                d = zstd.ZstdCompressionDict(raw)
+                dctx = zstd.ZstdDecompressor(dict_data=d)
+                self._dictdctxs[dictid] = dctx
+            return dctx
 
         def compress(self, data):
             insize = len(data)
@@ -741,7 +787,7 @@ class _zstdengine(compressionengine):
             try:
                 # This was measured to be faster than other streaming
                 # decompressors.
-                dobj = self._dctx.decompressobj()
+                dobj = self._decompressor(data).decompressobj()
                 chunks = []
                 pos = 0
                 while pos < insize:
@@ -766,7 +812,17 @@ class _zstdengine(compressionengine):
             level = opts.get(b'level')
         if level is None:
             level = 3
-        return self.zstdrevlogcompressor(self._module, level=level)
+        return self.zstdrevlogcompressor(
+            self._module,
+            level=level,
+            dictionaries=opts.get(b'zstd.dictionaries'),
+            dictclass=opts.get(b'zstd.dictionary-class'),
+        )
+
+    def traindictionary(self, samples, size):
+        zstd = self._module
+        d = zstd.train_dictionary(size, samples)
+        return d.dict_id(), d.as_bytes()
 
 
 compengines.register(_zstdengine())
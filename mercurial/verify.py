@@ -10,7 +10,10 @@ import os
 
 from .i18n import _
 from .node import short
-from .utils import stringutil
+from .utils import (
+    hashutil,
+    stringutil,
+)
 
 from . import (
     error,
@@ -19,18 +22,76 @@ from . import (
     revlog,
     transaction,
     util,
+    worker,
 )
 
 VERIFY_DEFAULT = 0
 VERIFY_FULL = 1
 
+# The revisions verified in each revlog, recorded after a verification
+# without errors. Each line is `<revisions> <checksum> <radix>`, the checksum
+# covering the index entries of the verified revisions.
+WATERMARKS_FILE = b'verify-watermarks-v1'
+
 
-def verify(repo, level=None):
+def verify(repo, level=None, incremental=False):
     with repo.lock():
-        v = verifier(repo, level)
+        v = verifier(repo, level, incremental=incremental)
         return v.verify()
 
 
+def _readwatermarks(repo):
+    """return a {radix: (revisions, checksum)} dict"""
+    marks = {}
+    try:
+        data = repo.cachevfs.read(WATERMARKS_FILE)
+    except FileNotFoundError:
+        return marks
+    for line in data.splitlines():
+        try:
+            count, checksum, radix = line.split(b' ', 2)
+            marks[radix] = (int(count), checksum)
+        except ValueError:
+            # a corrupted file only means verifying everything again
+            return {}
+    return marks
+
+
+def _writewatermarks(repo, marks):
+    lines = [b'%d %s %s\n' % (marks[r] + (r,)) for r in sorted(marks)]
+    with repo.cachevfs(WATERMARKS_FILE, b'w', atomictemp=True) as fp:
+        fp.write(b''.join(lines))
+
+
+def _revlogof(obj):
+    """return the revlog behind a storage object, or None"""
+    rl = getattr(obj, '_revlog', obj)
+    if isinstance(rl, revlog.revlog):
+        return rl
+    return None
+
+
+def _hashindex(rl, h, start, end):
+    for rev in range(start, end):
+        h.update(rl.index.entry_binary(rev))
+
+
+def _checkprefix(rl, mark):
+    """check the revisions of `rl` below the watermark `mark`
+
+    Return the hash of their index entries if they did not change, None
+    otherwise.
+    """
+    count, checksum = mark
+    if count > len(rl):
+        return None
+    h = hashutil.sha1()
+    _hashindex(rl, h, 0, count)
+    if h.hexdigest().encode('ascii') != checksum:
+        return None
+    return h
+
+
 def _normpath(f: bytes) -> bytes:
     # under hg < 2.4, convert didn't sanitize paths properly, so a
     # converted repo may contain repeated slashes
@@ -57,7 +118,7 @@ WARN_NULLID_COPY_SOURCE = _(
 
 
 class verifier:
-    def __init__(self, repo, level=None):
+    def __init__(self, repo, level=None, incremental=False):
         self.repo = repo.unfiltered()
         self.ui = repo.ui
         self.match = repo.narrowmatch()
@@ -76,14 +137,31 @@ class verifier:
         # developer config: verify.skipflags
         self.skipflags = repo.ui.configint(b'verify', b'skipflags')
         self.warnorphanstorefiles = True
+        # when not None, issues are appended here instead of being reported
+        self._deferred = None
+        # revisions verified by a previous run are only checked when the
+        # index entries leading to them did not change
+        self._incremental = incremental
+        self._watermarks = {}
+        if incremental:
+            self._watermarks = _readwatermarks(self.repo)
+        # {radix: (revisions, checksum)} of the revlogs checked by this run
+        self._verified = {}
+        self._checkedchangesets = 0
 
     def _warn(self, msg):
         """record a "warning" level issue"""
+        if self._deferred is not None:
+            self._deferred.append((b'warn', (msg,)))
+            return
         self.ui.warn(msg + b"\n")
         self.warnings += 1
 
     def _err(self, linkrev, msg, filename=None):
         """record a "error" level issue"""
+        if self._deferred is not None:
+            self._deferred.append((b'err', (linkrev, msg, filename)))
+            return
         if linkrev is not None:
             self.badrevs.add(linkrev)
             linkrev = b"%d" % linkrev
@@ -102,6 +180,53 @@ class verifier:
             fmsg = pycompat.byterepr(inst)
         self._err(linkrev, b"%s: %s" % (msg, fmsg), filename)
 
+    def _note(self, msg):
+        """report an informative message"""
+        if self._deferred is not None:
+            self._deferred.append((b'note', (msg,)))
+            return
+        self.ui.note(msg)
+
+    def _replay(self, deferred):
+        """report the issues recorded in `deferred`"""
+        for kind, args in deferred:
+            if kind == b'warn':
+                self._warn(*args)
+            elif kind == b'err':
+                self._err(*args)
+            else:
+                self._note(*args)
+
+    def _startrev(self, obj, name):
+        """return the first revision of `obj` to verify
+
+        This is 0 unless verifying incrementally and the revisions below the
+        watermark recorded for `obj` have not changed since. Also record the
+        watermark to write at the end of a successful verification.
+        """
+        rl = _revlogof(obj)
+        if rl is None:
+            return 0
+        start = 0
+        h = None
+        mark = self._watermarks.get(rl.radix)
+        if mark is not None:
+            h = _checkprefix(rl, mark)
+            if h is None:
+                msg = _(b"%s changed since last verification\n") % name
+                self._note(msg)
+            else:
+                start = mark[0]
+        if h is None:
+            h = hashutil.sha1()
+        _hashindex(rl, h, start, len(rl))
+        self._verified[rl.radix] = (len(rl), h.hexdigest().encode('ascii'))
+        return start
+
+    def _seennodes(self, obj, start):
+        """return the `seen` mapping of the revisions below `start`"""
+        return {obj.node(r): r for r in range(start)}
+
     def _checkrevlog(self, obj, name, linkrev):
         """verify high level property of a revlog
 
@@ -211,6 +336,8 @@ class verifier:
         del mflinkrevs
         self._crosscheckfiles(filelinkrevs, filenodes)
         totalfiles, filerevisions = self._verifyfiles(filenodes, filelinkrevs)
+        if self._incremental:
+            self._checkwatermarks()
 
         if self.errors:
             ui.warn(_(b"not checking dirstate because of previous errors\n"))
@@ -218,10 +345,16 @@ class verifier:
         else:
             dirstate_errors = self._verify_dirstate()
 
+        if not self.errors and not self.skipflags:
+            # an incremental run does not visit every revlog
+            marks = dict(self._watermarks)
+            marks.update(self._verified)
+            _writewatermarks(repo, marks)
+
         # final report
         ui.status(
             _(b"checked %d changesets with %d changes to %d files\n")
-            % (len(repo.changelog), filerevisions, totalfiles)
+            % (self._checkedchangesets, filerevisions, totalfiles)
         )
         if self.warnings:
             ui.warn(_(b"%d warnings encountered!\n") % self.warnings)
@@ -265,13 +398,18 @@ class verifier:
         ui.status(_(b"checking changesets\n"))
         mflinkrevs = {}
         filelinkrevs = {}
-        seen = {}
         self._checkrevlog(cl, b"changelog", 0)
+        start = self._startrev(cl, b"changelog")
+        seen = self._seennodes(cl, start)
+        self._checkedchangesets = len(cl) - start
+        if start and self.havemf:
+            # the verified changesets refer to the manifest
+            self.refersmf = True
         progress = ui.makeprogress(
             _(b'checking'), unit=_(b'changesets'), total=len(repo)
         )
         with cl.reading():
-            for i in repo:
+            for i in range(start, len(cl)):
                 progress.update(i)
                 n = cl.node(i)
                 self._checkentry(cl, i, n, seen, [i], b"changelog")
@@ -331,7 +469,6 @@ class verifier:
 
         filenodes = {}
         subdirnodes = {}
-        seen = {}
         label = b"manifest"
         if dir:
             label = dir
@@ -343,10 +480,12 @@ class verifier:
             # Do not check manifest if there are only changelog entries with
             # null manifests.
             self._checkrevlog(mf._revlog, label, 0)
+        start = self._startrev(mf, label)
+        seen = self._seennodes(mf, start)
         progress = ui.makeprogress(
             _(b'checking'), unit=_(b'manifests'), total=len(mf)
         )
-        for i in mf:
+        for i in range(start, len(mf)):
             if not dir:
                 progress.update(i)
             n = mf.node(i)
@@ -394,6 +533,11 @@ class verifier:
         if self.havemf:
             # since we delete entry in `mflinkrevs` during iteration, any
             # remaining entries are "missing". We need to issue errors for them.
+            if start:
+                # unless they are revisions verified by a previous run
+                for m in list(mflinkrevs):
+                    if m in seen:
+                        del mflinkrevs[m]
             changesetpairs = [(c, m) for m in mflinkrevs for c in mflinkrevs[m]]
             for c, m in sorted(changesetpairs):
                 if dir:
@@ -406,16 +550,20 @@ class verifier:
         if not dir and subdirnodes:
             self.ui.status(_(b"checking directory manifests\n"))
             storefiles = set()
+            verifiedfiles = set()
             subdirs = set()
             revlogv1 = self.revlogv1
             undecodable = []
             for entry in repo.store.data_entries(undecodable=undecodable):
+                verified = self._entryverified(entry)
                 for file_ in entry.files():
                     f = file_.unencoded_path
                     size = file_.file_size(repo.store.vfs)
                     if (size > 0 or not revlogv1) and f.startswith(b'meta/'):
                         storefiles.add(_normpath(f))
                         subdirs.add(os.path.dirname(f))
+                        if verified:
+                            verifiedfiles.add(_normpath(f))
             for f in undecodable:
                 self._err(None, _(b"cannot decode filename '%s'") % f)
             subdirprogress = ui.makeprogress(
@@ -433,7 +581,7 @@ class verifier:
             assert subdirprogress is not None  # help pytype
             subdirprogress.complete()
             if self.warnorphanstorefiles:
-                for f in sorted(storefiles):
+                for f in sorted(storefiles - verifiedfiles):
                     self._warn(_(b"warning: orphan data file '%s'") % f)
 
         return filenodes
@@ -450,14 +598,14 @@ class verifier:
         if self.havemf:
             for f in sorted(filelinkrevs):
                 progress.increment()
-                if f not in filenodes:
+                if f not in filenodes and not self._hasmark(b'data/' + f):
                     lr = filelinkrevs[f][0]
                     self._err(lr, _(b"in changeset but not in manifest"), f)
 
         if self.havecl:
             for f in sorted(filenodes):
                 progress.increment()
-                if f not in filelinkrevs:
+                if f not in filelinkrevs and not self._hasmark(b'data/' + f):
                     try:
                         fl = repo.file(f)
                         lr = min([fl.linkrev(fl.rev(n)) for n in filenodes[f]])
@@ -467,22 +615,39 @@ class verifier:
 
         progress.complete()
 
+    def _hasmark(self, radix):
+        """whether revisions of `radix` were verified by a previous run
+
+        When verifying incrementally, the changesets and manifests verified
+        by a previous run are not read, so they cannot vouch for the files
+        and store files they reference.
+        """
+        return self._watermarks.get(radix, (0, None))[0] > 0
+
+    def _entryverified(self, entry):
+        """whether the revlog of a store entry was verified by a previous run"""
+        if not self._watermarks or not entry.is_revlog:
+            return False
+        return self._hasmark(entry.main_file_path()[: -len(b'.i')])
+
     def _verifyfiles(self, filenodes, filelinkrevs):
         repo = self.repo
         ui = self.ui
-        lrugetctx = self.lrugetctx
         revlogv1 = self.revlogv1
-        havemf = self.havemf
         ui.status(_(b"checking files\n"))
 
         storefiles = set()
+        verifiedfiles = set()
         undecodable = []
         for entry in repo.store.data_entries(undecodable=undecodable):
+            verified = self._entryverified(entry)
             for file_ in entry.files():
                 size = file_.file_size(repo.store.vfs)
                 f = file_.unencoded_path
                 if (size > 0 or not revlogv1) and f.startswith(b'data/'):
                     storefiles.add(_normpath(f))
+                    if verified:
+                        verifiedfiles.add(_normpath(f))
         for f in undecodable:
             self._err(None, _(b"cannot decode filename '%s'") % f)
 
@@ -499,112 +664,221 @@ class verifier:
         progress = ui.makeprogress(
             _(b'checking'), unit=_(b'files'), total=len(files)
         )
-        for i, f in enumerate(files):
-            progress.update(i, item=f)
+        if ui.configbool(b'experimental', b'worker.verify'):
+            results = self._verifyfilesparallel(
+                files, filenodes, filelinkrevs, state
+            )
+            for i, res in enumerate(results):
+                f, revlogfiles, deferred, count, verified = res
+                progress.update(i, item=f)
+                self._checkstorefiles(revlogfiles, storefiles)
+                self._replay(deferred)
+                self._verified.update(verified)
+                revisions += count
+        else:
+            for i, f in enumerate(files):
+                progress.update(i, item=f)
+                linkrevs = filelinkrevs.get(f, [])
+                fl = self._openfilelog(f, linkrevs)
+                if fl is None:
+                    continue
+                self._checkstorefiles(fl.files(), storefiles)
+                revisions += self._checkfilelog(
+                    fl, f, filenodes.get(f), linkrevs, state
+                )
+        progress.complete()
+
+        if self.warnorphanstorefiles:
+            for f in sorted(storefiles - verifiedfiles):
+                self._warn(_(b"warning: orphan data file '%s'") % f)
+
+        return len(files), revisions
+
+    def _checkstorefiles(self, revlogfiles, storefiles):
+        """remove the files of a filelog from the set of orphan files"""
+        for ff in revlogfiles:
             try:
-                linkrevs = filelinkrevs[f]
+                storefiles.remove(ff)
             except KeyError:
-                # in manifest but not in changelog
-                linkrevs = []
+                if self.warnorphanstorefiles:
+                    msg = _(b" warning: revlog '%s' not in fncache!")
+                    self._warn(msg % ff)
+                    self.fncachewarned = True
+
+    def _verifyfilesparallel(self, files, filenodes, filelinkrevs, state):
+        """check the filelogs in worker processes
+
+        Yield `(f, store files of the filelog, issues, number of revisions,
+        watermarks)` for each file, in order, so that the output does not
+        depend on the number of workers. The issues are replayed with
+        `_replay`.
+        """
+        # reading and hashing every revision is not thread safe
+        results = worker.worker(
+            self.ui,
+            0.01,
+            self._verifyfilesworker,
+            (filenodes, filelinkrevs, state),
+            files,
+            threadsafe=False,
+        )
+        index = {f: i for i, f in enumerate(files)}
+        pending = {}
+        nextidx = 0
+        for res in results:
+            pending[index[res[0]]] = res
+            while nextidx in pending:
+                yield pending.pop(nextidx)
+                nextidx += 1
+
+    def _verifyfilesworker(self, filenodes, filelinkrevs, state, files):
+        for f in files:
+            linkrevs = filelinkrevs.get(f, [])
+            self._deferred = deferred = []
+            verified = self._verified
+            self._verified = {}
+            try:
+                fl = self._openfilelog(f, linkrevs)
+                if fl is None:
+                    revlogfiles, revisions = [], 0
+                else:
+                    revlogfiles = fl.files()
+                    revisions = self._checkfilelog(
+                        fl, f, filenodes.get(f), linkrevs, state
+                    )
+            finally:
+                self._deferred = None
+                verified, self._verified = self._verified, verified
+            yield f, revlogfiles, deferred, revisions, verified
 
-            if linkrevs:
-                lr = linkrevs[0]
-            else:
-                lr = None
+    def _openfilelog(self, f, linkrevs):
+        """return the filelog of `f`, or None if it cannot be opened"""
+        try:
+            return self.repo.file(f)
+        except error.StorageError as e:
+            lr = linkrevs[0] if linkrevs else None
+            self._err(lr, _(b"broken revlog! (%s)") % e, f)
+            return None
 
-            try:
-                fl = repo.file(f)
-            except error.StorageError as e:
-                self._err(lr, _(b"broken revlog! (%s)") % e, f)
-                continue
+    def _checkfilelog(self, fl, f, filenodes, linkrevs, state):
+        """verify the revisions of the filelog `fl` of `f`
 
-            for ff in fl.files():
-                try:
-                    storefiles.remove(ff)
-                except KeyError:
-                    if self.warnorphanstorefiles:
-                        msg = _(b" warning: revlog '%s' not in fncache!")
-                        self._warn(msg % ff)
-                        self.fncachewarned = True
-
-            if not len(fl) and (self.havecl or self.havemf):
-                self._err(lr, _(b"empty or missing %s") % f)
-            else:
-                # Guard against implementations not setting this.
-                state[b'skipread'] = set()
-                state[b'safe_renamed'] = set()
+        - filenodes: {node: manifest linkrev} of the revisions referenced by
+                     the manifests, or None if `f` is not in any manifest
+        - linkrevs:  changelog revisions touching `f`
 
-                for problem in fl.verifyintegrity(state):
-                    if problem.node is not None:
-                        linkrev = fl.linkrev(fl.rev(problem.node))
-                    else:
-                        linkrev = None
+        Return the number of revisions checked.
+        """
+        repo = self.repo
+        ui = self.ui
+        lrugetctx = self.lrugetctx
+        havemf = self.havemf
 
-                    if problem.warning:
-                        self._warn(problem.warning)
-                    elif problem.error:
-                        linkrev_msg = linkrev if linkrev is not None else lr
-                        self._err(linkrev_msg, problem.error, f)
-                    else:
-                        raise error.ProgrammingError(
-                            b'problem instance does not set warning or error '
-                            b'attribute: %s' % problem.msg
-                        )
-
-            seen = {}
-            for i in fl:
-                revisions += 1
-                n = fl.node(i)
-                lr = self._checkentry(fl, i, n, seen, linkrevs, f)
-                if f in filenodes:
-                    if havemf and n not in filenodes[f]:
-                        self._err(lr, _(b"%s not in manifests") % (short(n)), f)
-                    else:
-                        del filenodes[f][n]
+        if linkrevs:
+            lr = linkrevs[0]
+        else:
+            # in manifest but not in changelog
+            lr = None
 
-                if n in state[b'skipread'] and n not in state[b'safe_renamed']:
-                    continue
+        start = self._startrev(fl, f)
+        if not len(fl) and (self.havecl or self.havemf):
+            self._err(lr, _(b"empty or missing %s") % f)
+        else:
+            # Guard against implementations not setting this.
+            state[b'skipread'] = set()
+            state[b'safe_renamed'] = set()
+            state[b'startrev'] = start
+
+            for problem in fl.verifyintegrity(state):
+                if problem.node is not None:
+                    linkrev = fl.linkrev(fl.rev(problem.node))
+                else:
+                    linkrev = None
 
-                # check renames
-                try:
-                    # This requires resolving fulltext (at least on revlogs,
-                    # though not with LFS revisions). We may want
-                    # ``verifyintegrity()`` to pass a set of nodes with
-                    # rename metadata as an optimization.
-                    rp = fl.renamed(n)
-                    if rp:
-                        if lr is not None and ui.verbose:
-                            ctx = lrugetctx(lr)
-                            if not any(rp[0] in pctx for pctx in ctx.parents()):
-                                self._warn(WARN_UNKNOWN_COPY_SOURCE % (f, ctx))
-                        fl2 = repo.file(rp[0])
-                        if not len(fl2):
-                            m = _(b"empty or missing copy source revlog %s:%s")
-                            self._err(lr, m % (rp[0], short(rp[1])), f)
-                        elif rp[1] == self.repo.nullid:
-                            msg = WARN_NULLID_COPY_SOURCE
-                            msg %= (f, lr, rp[0], short(rp[1]))
-                            ui.note(msg)
-                        else:
-                            fl2.rev(rp[1])
-                except Exception as inst:
-                    self._exc(
-                        lr, _(b"checking rename of %s") % short(n), inst, f
+                if problem.warning:
+                    self._warn(problem.warning)
+                elif problem.error:
+                    linkrev_msg = linkrev if linkrev is not None else lr
+                    self._err(linkrev_msg, problem.error, f)
+                else:
+                    raise error.ProgrammingError(
+                        b'problem instance does not set warning or error '
+                        b'attribute: %s' % problem.msg
                     )
 
-            # cross-check
-            if f in filenodes:
-                fns = [(v, k) for k, v in filenodes[f].items()]
-                for lr, node in sorted(fns):
-                    msg = _(b"manifest refers to unknown revision %s")
-                    self._err(lr, msg % short(node), f)
-        progress.complete()
+        revisions = 0
+        seen = self._seennodes(fl, start)
+        for i in range(start, len(fl)):
+            revisions += 1
+            n = fl.node(i)
+            lr = self._checkentry(fl, i, n, seen, linkrevs, f)
+            if filenodes is not None:
+                if havemf and n not in filenodes:
+                    self._err(lr, _(b"%s not in manifests") % (short(n)), f)
+                else:
+                    del filenodes[n]
 
-        if self.warnorphanstorefiles:
-            for f in sorted(storefiles):
-                self._warn(_(b"warning: orphan data file '%s'") % f)
+            if n in state[b'skipread'] and n not in state[b'safe_renamed']:
+                continue
 
-        return len(files), revisions
+            # check renames
+            try:
+                # This requires resolving fulltext (at least on revlogs,
+                # though not with LFS revisions). We may want
+                # ``verifyintegrity()`` to pass a set of nodes with
+                # rename metadata as an optimization.
+                rp = fl.renamed(n)
+                if rp:
+                    if lr is not None and ui.verbose:
+                        ctx = lrugetctx(lr)
+                        if not any(rp[0] in pctx for pctx in ctx.parents()):
+                            self._warn(WARN_UNKNOWN_COPY_SOURCE % (f, ctx))
+                    fl2 = repo.file(rp[0])
+                    if not len(fl2):
+                        m = _(b"empty or missing copy source revlog %s:%s")
+                        self._err(lr, m % (rp[0], short(rp[1])), f)
+                    elif rp[1] == self.repo.nullid:
+                        msg = WARN_NULLID_COPY_SOURCE
+                        msg %= (f, lr, rp[0], short(rp[1]))
+                        self._note(msg)
+                    else:
+                        fl2.rev(rp[1])
+            except Exception as inst:
+                self._exc(lr, _(b"checking rename of %s") % short(n), inst, f)
+
+        # cross-check
+        if filenodes is not None:
+            # revisions verified by a previous run are known
+            fns = [(v, k) for k, v in filenodes.items() if k not in seen]
+            for lr, node in sorted(fns):
+                msg = _(b"manifest refers to unknown revision %s")
+                self._err(lr, msg % short(node), f)
+        return revisions
+
+    def _checkwatermarks(self):
+        """check the revlogs not referenced by the new revisions
+
+        Their verified revisions must not have changed since the last
+        verification.
+        """
+        repo = self.repo
+        entries = []
+        for entry in repo.store.walk():
+            if self._entryverified(entry):
+                radix = entry.main_file_path()[: -len(b'.i')]
+                if radix not in self._verified:
+                    entries.append(entry)
+        progress = self.ui.makeprogress(
+            _(b'checking'), unit=_(b'revlogs'), total=len(entries)
+        )
+        for entry in entries:
+            progress.increment()
+            rl = entry.get_revlog_instance(repo).get_revlog()
+            if _checkprefix(rl, self._watermarks[rl.radix]) is not None:
+                continue
+            msg = _(b"verified revisions changed since last verification")
+            self._err(None, msg, entry.target_id)
+        progress.complete()
 
     def _verify_dirstate(self):
         """Check that the dirstate is consistent with the parent's manifest"""
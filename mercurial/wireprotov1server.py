@@ -547,10 +547,30 @@ def getbundle(repo, proto, others):
                     hint=_(b'remove --pull if specified or upgrade Mercurial'),
                 )
 
+        # Check if the same request was answered before. Only plain bundle2
+        # responses are cached, stream clones are sent from the store. The
+        # extensions wrapping getbundlechunks (e.g. to check permissions) would
+        # not see the requests answered from the cache, it is not used then.
+        cache = bundlecaches.getbundlecache(repo)
+        cachekey = None
+        if (
+            cache.size
+            and exchange.bundle2requested(opts.get(b'bundlecaps'))
+            and not opts.get(b'stream')
+            and not hasattr(exchange.getbundlechunks, '_origfunc')
+        ):
+            cachekey = cache.key(opts)
+            cached = cache.get(cachekey)
+            if cached is not None:
+                cached = _cachedbundle(repo, opts, cached)
+                return wireprototypes.streamres(gen=cached)
+
         info, chunks = exchange.getbundlechunks(
             repo, b'serve', **pycompat.strkwargs(opts)
         )
         prefercompressed = info.get(b'prefercompressed', True)
+        if cachekey is not None and prefercompressed:
+            chunks = cache.write(cachekey, chunks)
     except error.Abort as exc:
         # cleanly forward Abort error to the client
         if not exchange.bundle2requested(opts.get(b'bundlecaps')):
@@ -572,6 +592,27 @@ def getbundle(repo, proto, others):
     )
 
 
+def _cachedbundle(repo, opts, chunks):
+    """run the hooks of an outgoing changegroup around a cached response
+
+    Return the chunks to send."""
+    if not opts.get(b'cg', True):
+        return chunks
+    outgoing = exchange._computeoutgoing(
+        repo, opts.get(b'heads'), opts.get(b'common')
+    )
+    repo.hook(b'preoutgoing', throw=True, source=b'serve')
+
+    def generate():
+        for chunk in chunks:
+            yield chunk
+        if outgoing.missing:
+            node = hex(outgoing.missing[0])
+            repo.hook(b'outgoing', node=node, source=b'serve')
+
+    return generate()
+
+
 @wireprotocommand(b'heads', permission=b'pull')
 def heads(repo, proto):
     h = repo.heads()
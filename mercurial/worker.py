@@ -57,6 +57,11 @@ def _numworkers(ui):
     return min(max(countcpus(), 4), 32)
 
 
+def numworkers(ui):
+    """number of workers to use, for callers managing their own workers"""
+    return _numworkers(ui)
+
+
 def ismainthread():
     return threading.current_thread() == threading.main_thread()
 
@@ -54,6 +54,40 @@ class BdiffTests(unittest.TestCase):
         for a, b in cases:
             self.assert_bdiff(a, b)
 
+    def test_histogram_blocks(self):
+        cases = [
+            (b"a\nc\n\n\n\n", b"a\nb\n\n\n"),
+            (b"a\nb\nc\n", b"a\nc\n"),
+            (b"", b""),
+            (b"a\nb\nc", b"a\nb\nc"),
+            (b"a\nb\nc\nd\n", b"a\nc\ne\n"),
+            (b"a\n", b"c\na\nb\n"),
+            (b"a\n", b""),
+            (b"", b"ab"),
+            (b"a\n" * 100 + b"b\n", b"a\n" * 99 + b"c\n"),
+        ]
+        blocksfunc = mdiff.chooseblocksfunc(mdiff.diffopts(histogram=True))
+        for a, b in cases:
+            alines = mdiff.splitnewlines(a)
+            blines = mdiff.splitnewlines(b)
+            blocks = blocksfunc(a, b)
+            for a1, a2, b1, b2 in blocks:
+                self.assertEqual(alines[a1:a2], blines[b1:b2])
+            self.assertEqual(
+                blocks[-1],
+                (len(alines), len(alines), len(blines), len(blines)),
+            )
+
+    def test_histogram_prefers_unique_lines(self):
+        # bdiff matches as many blank lines as it can and loses "foo", the
+        # histogram algorithm anchors the match on it
+        a = b'\n\nfoo\n{\n'
+        b = b'\n{\n\nfoo\n\n\n\n{\n'
+        self.assertEqual(
+            mdiff.get_matching_blocks(a, b, mdiff.diffopts(histogram=True)),
+            [(0, 0, 1), (1, 2, 2), (3, 7, 1), (4, 8, 0)],
+        )
+
     def showdiff(self, a, b):
         bin = mdiff.textdiff(a, b)
         pos = 0
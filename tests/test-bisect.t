@@ -559,6 +559,72 @@ test the same case, this time with updating
   date:        Thu Jan 01 00:00:06 1970 +0000
   summary:     msg 6
   
+
+test checking several changesets at the same time, each in its own
+working copy, the output of the commands is shown in the order of the
+changesets
+
+  $ cat > "$TESTTMP/script.sh" <<'EOF'
+  > #!/bin/sh
+  > test "`hg log -r . --template {node}`" = "$HG_NODE" || exit 127
+  > rev="`hg log -r . --template {rev}`"
+  > echo "checking $rev" >&2
+  > test "$rev" -ge 6
+  > EOF
+  $ hg bisect -r
+  $ hg bisect --command true --jobs 0
+  abort: --jobs must be a positive number
+  [10]
+  $ hg bisect --good --jobs 3
+  abort: --jobs requires --command
+  [10]
+  $ hg up -qr 0
+  $ hg bisect --good tip
+  $ hg bisect --command "sh \"$TESTTMP/script.sh\"" --jobs 3
+  checking 0
+  changeset 0:b99c7b9c8e11 "msg 0": bad
+  checking 7
+  checking 15
+  checking 23
+  changeset 7:03750880c6b5 "msg 7": good
+  changeset 15:e7fa0811edb0 "msg 15": good
+  changeset 23:5ec79163bff4 "msg 23": good
+  checking 1
+  checking 3
+  checking 5
+  changeset 1:5cd978ea5149 "msg 1": bad
+  changeset 3:b53bea5e2fcb "msg 3": bad
+  changeset 5:7874a09ea728 "msg 5": bad
+  checking 6
+  changeset 6:a3d5c6fdf0d3 "msg 6": good
+  The first good revision is:
+  changeset:   6:a3d5c6fdf0d3
+  user:        test
+  date:        Thu Jan 01 00:00:06 1970 +0000
+  summary:     msg 6
+  
+  $ hg parents --template '{rev}\n'
+  6
+  $ ls .hg/bisect-jobs
+  0
+  1
+  2
+  $ hg -R .hg/bisect-jobs/0 parents --template '{rev}\n'
+  6
+  $ hg log -r 'bisect(good)' --template '{rev}\n'
+  6
+  7
+  15
+  23
+  31
+
+the working copies are removed with the bisect state
+
+  $ hg bisect --reset
+  $ test -d .hg/bisect-jobs
+  [1]
+  $ hg up -qr 6
+
   $ hg graft -q 15
   warning: conflicts while merging a! (edit, then use 'hg resolve --mark')
   abort: unresolved conflicts, can't continue
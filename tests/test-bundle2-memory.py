@@ -0,0 +1,169 @@
+# Check that serving a bundle2 does not hold its payload in memory
+
+import gc
+import os
+import tracemalloc
+import unittest
+
+import silenttestrunner
+
+from mercurial import (
+    bundle2,
+    exchange,
+    hg,
+    obsutil,
+    ui as uimod,
+    util,
+)
+from mercurial.utils import hashutil
+
+FILESIZE = 256 * 1024
+
+
+def makerepo(path, nbfiles, nbmarkers, filesize=FILESIZE):
+    """create a repository with `nbfiles` incompressible files and a chain of
+    `nbmarkers` obsolescence markers leading to its changeset"""
+    ui = uimod.ui.load()
+    ui.setconfig(b'experimental', b'evolution', b'all')
+    ui.setconfig(b'ui', b'username', b'test')
+    repo = hg.repository(ui, path, create=True)
+    files = [b'f%d' % i for i in range(nbfiles)]
+    for f in files:
+        with open(os.path.join(path, f), 'wb') as fp:
+            fp.write(os.urandom(filesize))
+    with repo.wlock(), repo.dirstate.changing_files(repo):
+        repo[None].add(files)
+    node = repo.commit(text=b'files', date=b'0 0')
+    markers = []
+    successor = node
+    for i in range(nbmarkers):
+        predecessor = hashutil.sha1(b'%s-%d' % (path, i)).digest()
+        markers.append((predecessor, (successor,), 0, (), (0.0, 0), None))
+        successor = predecessor
+    with repo.lock(), repo.transaction(b'markers') as tr:
+        repo.obsstore.add(tr, markers)
+    return hg.repository(ui, path)
+
+
+def servebundle(repo):
+    """return the size of the bundle served to a client, and the peak of the
+    memory allocated while generating it"""
+    caps = bundle2.encodecaps(bundle2.getrepocaps(repo, role=b'client'))
+    bundlecaps = {b'HG20', b'bundle2=' + util.urlreq.quote(caps)}
+    # the obsolescence markers are loaded by any request using them
+    repo.obsstore.predecessors
+    repo.obsstore.successors
+    repo.obsstore.children
+    tracemalloc.start()
+    try:
+        info, chunks = exchange.getbundlechunks(
+            repo,
+            b'serve',
+            heads=repo.heads(),
+            common=[repo.nullid],
+            bundlecaps=bundlecaps,
+            obsmarkers=True,
+        )
+        size = 0
+        for i, chunk in enumerate(chunks):
+            size += len(chunk)
+            # the revlogs of the files already sent are only freed by the
+            # cycle collector, which does not account for their caches
+            if not i % 64:
+                gc.collect()
+        return size, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def iterationpeak(func):
+    """return the peak of the memory allocated while iterating over the
+    result of `func()`"""
+    tracemalloc.start()
+    try:
+        for item in func():
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class testbundle2memory(unittest.TestCase):
+    def testpayloadframing(self):
+        data = b'x' * (3 * bundle2.preferedchunksize + 1)
+        part = bundle2.bundlepart(b'test:data', data=data)
+        chunks = list(part._payloadchunks())
+        self.assertEqual(b''.join(chunks), data)
+        self.assertEqual(len(chunks), 4)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), bundle2.preferedchunksize)
+
+    def testlazyparts(self):
+        repo = makerepo(b'lazy', 1, 10)
+        calls = []
+        sortedrelevantmarkers = repo.obsstore.sortedrelevantmarkers
+
+        def wrapped(nodes):
+            calls.append(True)
+            return sortedrelevantmarkers(nodes)
+
+        repo.obsstore.sortedrelevantmarkers = wrapped
+        caps = bundle2.encodecaps(bundle2.getrepocaps(repo, role=b'client'))
+        info, chunks = exchange.getbundlechunks(
+            repo,
+            b'serve',
+            heads=repo.heads(),
+            common=[repo.nullid],
+            bundlecaps={b'HG20', b'bundle2=' + util.urlreq.quote(caps)},
+            obsmarkers=True,
+        )
+        # the markers are gathered when the part is sent
+        self.assertEqual(calls, [])
+        for chunk in chunks:
+            pass
+        self.assertEqual(calls, [True])
+
+    def testsortedmarkers(self):
+        repo = makerepo(b'sorted', 1, 20)
+        tip = repo[b'tip'].node()
+        other = hashutil.sha1(b'other').digest()
+        markers = [
+            # a split, a divergence and prunes of a child and of a changeset
+            (b'\x01' * 20, (tip, other), 0, (), (0.0, 0), None),
+            (b'\x02' * 20, (tip,), 0, (), (0.0, 0), None),
+            (b'\x02' * 20, (other,), 0, (), (0.0, 0), None),
+            (b'\x03' * 20, (), 0, (), (0.0, 0), (tip,)),
+            (tip, (), 0, (), (0.0, 0), None),
+            (b'\x04' * 20, (other,), 0, (), (0.0, 0), None),
+        ]
+        with repo.lock(), repo.transaction(b'markers') as tr:
+            repo.obsstore.add(tr, markers)
+        # the obsstore of a repository does not keep it alive
+        reloaded = hg.repository(repo.ui, b'sorted')
+        obsstore = reloaded.obsstore
+        for nodes in ([tip], [other], [tip, other], []):
+            expected = obsutil.sortedmarkers(obsstore.relevantmarkers(nodes))
+            markers = list(obsstore.sortedrelevantmarkers(nodes))
+            self.assertEqual(markers, expected)
+
+    def testboundedmemory(self):
+        nbmarkers = 4000
+        repo = makerepo(b'markers', 1, nbmarkers, 1024)
+        size, streamed = servebundle(repo)
+        obsstore = repo.obsstore
+        nodes = repo.heads()
+        # sorting all the markers at once takes about 145 bytes per marker,
+        # mostly for their sort keys, the lazy sort only keeps the nodes they
+        # relate to
+        peak = iterationpeak(lambda: obsstore.sortedrelevantmarkers(nodes))
+        self.assertLess(peak, 100 * nbmarkers)
+        # the same markers are sent as when they are sorted at once
+        obsstore.sortedrelevantmarkers = lambda nodes: (
+            obsutil.sortedmarkers(obsstore.relevantmarkers(nodes))
+        )
+        eagersize, eager = servebundle(repo)
+        self.assertEqual(size, eagersize)
+
+
+if __name__ == '__main__':
+    silenttestrunner.main(__name__)
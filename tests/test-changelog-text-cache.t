@@ -0,0 +1,135 @@
+Test the persistent cache of the changeset users and descriptions
+
+  $ cat >> $HGRCPATH << EOF
+  > [storage]
+  > changelog-text-cache = yes
+  > manifest-rev-cache = yes
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 1 2 3 4; do
+  >   echo $i > f$i
+  >   hg commit -qAm "Commit $i
+  > 
+  > fixes bug$i" -u "User$(expr $i % 2) <user@example.com>" -d "$i 0"
+  > done
+
+The cache is written when the transaction closes
+
+  $ f --size .hg/cache/ctc-*
+  .hg/cache/ctc-descs-v1: size=80
+  .hg/cache/ctc-revs-v1: size=64
+  .hg/cache/ctc-users-v1: size=50
+
+The revset predicates give the same results with and without the cache
+
+  $ cat > revsets << EOF
+  > user(user1)
+  > author('re:User[01]')
+  > user(nobody)
+  > desc(commit)
+  > desc(BUG2)
+  > desc('2 fixes')
+  > desc('bug1commit')
+  > desc('re:bug[34]')
+  > desc(bug) and 1:2
+  > desc('')
+  > keyword(user0)
+  > keyword(f3)
+  > keyword(bug4)
+  > date('>2 0')
+  > date('<2 0') and desc(commit)
+  > EOF
+  $ while read r; do
+  >   echo "$r: `hg log -r "$r" -T '{rev} '`"
+  >   echo "$r: `hg log -r "$r" -T '{rev} ' \
+  >     --config storage.changelog-text-cache=no \
+  >     --config storage.manifest-rev-cache=no`"
+  > done < revsets
+  user(user1): 0 2 
+  user(user1): 0 2 
+  author('re:User[01]'): 0 1 2 3 
+  author('re:User[01]'): 0 1 2 3 
+  user(nobody): 
+  user(nobody): 
+  desc(commit): 0 1 2 3 
+  desc(commit): 0 1 2 3 
+  desc(BUG2): 1 
+  desc(BUG2): 1 
+  desc('2 fixes'): 
+  desc('2 fixes'): 
+  desc('bug1commit'): 
+  desc('bug1commit'): 
+  desc('re:bug[34]'): 2 3 
+  desc('re:bug[34]'): 2 3 
+  desc(bug) and 1:2: 1 2 
+  desc(bug) and 1:2: 1 2 
+  desc(''): 0 1 2 3 
+  desc(''): 0 1 2 3 
+  keyword(user0): 1 3 
+  keyword(user0): 1 3 
+  keyword(f3): 2 
+  keyword(f3): 2 
+  keyword(bug4): 3 
+  keyword(bug4): 3 
+  date('>2 0'): 1 2 3 
+  date('>2 0'): 1 2 3 
+  date('<2 0') and desc(commit): 0 1 
+  date('<2 0') and desc(commit): 0 1 
+
+The working directory is not in the cache
+
+  $ hg log -r 'wdir() and desc(commit) and user(user0)' -T '{rev}\n'
+  $ hg log -r 'wdir() and keyword(f3)' -T '{rev}\n'
+
+Non-ASCII descriptions are supported
+
+  $ echo 5 > f5
+  $ "$PYTHON" -c "open('../msg', 'wb').write('caf\\u00e9 Au Lait'.encode('utf-8'))"
+  $ HGENCODING=utf-8 hg commit -qAl ../msg -d "5 0"
+  $ HGENCODING=utf-8 hg log -r 'desc("lait")' -T '{rev} {desc}\n'
+  4 caf\xc3\xa9 Au Lait (esc)
+  $ HGENCODING=utf-8 hg log -r 'desc("commit")' -T '{rev} '
+  0 1 2 3  (no-eol)
+
+Evaluating a revset does not fill the cache, the revisions it does not cover
+are read from the changelog
+
+  $ mv .hg/cache/ctc-revs-v1 ctc-revs
+  $ hg log -r 'user(user1) and desc(commit)' -T '{rev} '
+  0 2  (no-eol)
+  $ hg log -r 'keyword(lait)' -T '{rev}\n'
+  4
+  $ test -f .hg/cache/ctc-revs-v1
+  [1]
+  $ mv ctc-revs .hg/cache/ctc-revs-v1
+
+Rewriting history is detected and the cache gets fixed
+
+  $ hg strip 3 --config devel.strip-obsmarkers=no --debug 2>&1 \
+  >   | grep "changelog text cache"
+  history modification detected - truncating changelog text cache to revision 3
+  $ hg up -q 0
+  $ echo 6 > f6
+  $ hg commit -qAm "rewritten" -u "User2 <user@example.com>" -d "6 0"
+  $ hg log -r 'desc(commit) or desc(rewritten)' -T '{rev} {desc|firstline}\n'
+  0 Commit 1
+  1 Commit 2
+  2 Commit 3
+  3 rewritten
+  $ hg log -r 'user(user2)' -T '{rev}\n'
+  3
+  $ f --size .hg/cache/ctc-revs-v1
+  .hg/cache/ctc-revs-v1: size=64
+
+A corrupted cache file is not trusted
+
+  $ printf 'garbage' > .hg/cache/ctc-revs-v1
+  $ hg log -r 'desc(rewritten)' -T '{rev}\n'
+  3
+  $ hg debugupdatecaches
+  $ f --size .hg/cache/ctc-revs-v1
+  .hg/cache/ctc-revs-v1: size=64
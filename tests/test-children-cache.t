@@ -0,0 +1,131 @@
+Test the persistent index of the children of the changesets
+
+  $ cat >> $HGRCPATH << EOF
+  > [storage]
+  > children-cache = yes
+  > [extensions]
+  > strip =
+  > [experimental]
+  > evolution.createmarkers = yes
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ hg debugbuilddag '+2:f +3:p2 @branch1 *f+2 /p2 +2 <f +1 $ +3'
+
+The cache is written when the transaction closes
+
+  $ f --size .hg/cache/children-v1
+  .hg/cache/children-v1: size=156
+  $ hg log -G -T '{rev} {children}\n'
+  o  14
+  |
+  o  13 14:95b6350d1605
+  |
+  o  12 13:4335f75e70e1
+  
+  o  11
+  |
+  | o  10
+  | |
+  | o  9 10:cfb3c5ed84f2
+  | |
+  | o    8 9:8957dfb1c355
+  | |\
+  | | o  7 8:d89cba682636
+  | | |
+  | | o  6 7:acc9d53f2318
+  | | |
+  +---o  5 6:b5f3f6a5e5e7
+  | |
+  | o  4 8:d89cba682636
+  | |
+  | o  3 4:bebd167eb94d
+  | |
+  | o  2 3:2dc09a01254d
+  |/
+  o  1 2:01241442b3c2 5:e02e774504c5 11:f389e87a0a85
+  |
+  o  0 1:66f7d451a68b
+  
+
+The revsets give the same results with and without the cache
+
+  $ cat > revsets << EOF
+  > children(0)
+  > children(1)
+  > children(2 + 5)
+  > children(null)
+  > children(all())
+  > descendants(2)
+  > descendants(5)
+  > descendants(1 + 8)
+  > 2::
+  > _firstdescendants(0)
+  > descendants(1, depth=2)
+  > descendants(0, startdepth=3)
+  > 1%
+  > EOF
+  $ while read r; do
+  >   echo "$r: `hg log -r "$r" -T '{rev} '`"
+  >   echo "$r: `hg log -r "$r" -T '{rev} ' \
+  >     --config storage.children-cache=no`"
+  > done < revsets
+  children(0): 1 
+  children(0): 1 
+  children(1): 2 5 11 
+  children(1): 2 5 11 
+  children(2 + 5): 3 6 
+  children(2 + 5): 3 6 
+  children(null): 0 12 
+  children(null): 0 12 
+  children(all()): 1 2 3 4 5 6 7 8 9 10 11 13 14 
+  children(all()): 1 2 3 4 5 6 7 8 9 10 11 13 14 
+  descendants(2): 2 3 4 8 9 10 
+  descendants(2): 2 3 4 8 9 10 
+  descendants(5): 5 6 7 8 9 10 
+  descendants(5): 5 6 7 8 9 10 
+  descendants(1 + 8): 1 2 3 4 5 6 7 8 9 10 11 
+  descendants(1 + 8): 1 2 3 4 5 6 7 8 9 10 11 
+  2::: 2 3 4 8 9 10 
+  2::: 2 3 4 8 9 10 
+  _firstdescendants(0): 0 1 2 3 4 5 6 7 8 9 10 11 
+  _firstdescendants(0): 0 1 2 3 4 5 6 7 8 9 10 11 
+  descendants(1, depth=2): 1 2 3 5 6 11 
+  descendants(1, depth=2): 1 2 3 5 6 11 
+  descendants(0, startdepth=3): 3 4 6 7 8 9 10 
+  descendants(0, startdepth=3): 3 4 6 7 8 9 10 
+  1%: 0 1 
+  1%: 0 1 
+
+Hidden changesets are not children
+
+  $ hg debugobsolete -q `hg log -r 10 -T '{node}'`
+  $ hg log -r 'children(9) + descendants(7)' -T '{rev} '
+  7 8 9  (no-eol)
+  $ hg log -r 'children(9) + descendants(7)' -T '{rev} ' --hidden
+  10 7 8 9  (no-eol)
+
+Rewriting history is detected and the cache gets rebuilt
+
+  $ hg strip -q 7 --config devel.strip-obsmarkers=no
+  $ hg up -q 3
+  $ echo a > a
+  $ hg commit -qAm new
+  $ hg log -r 'children(3) + descendants(5)' -T '{rev} '
+  4 11 5 6  (no-eol)
+  $ hg log -r 'children(3) + descendants(5)' -T '{rev} ' \
+  >   --config storage.children-cache=no
+  4 11 5 6  (no-eol)
+
+A corrupted cache file is not trusted
+
+  $ printf 'garbage' > .hg/cache/children-v1
+  $ hg log -r 'children(3)' -T '{rev}\n' --debug | grep -v '^couldn'
+  children cache is invalid, ignoring it
+  4
+  11
+  $ hg debugupdatecaches
+  $ hg log -r 'children(3)' -T '{rev}\n' --debug
+  4
+  11
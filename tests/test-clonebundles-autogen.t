@@ -514,3 +514,126 @@ Check the url is correct
   searching for changes
   no changes found
   15 local changesets published
+
+Report the staleness of the bundles
+===================================
+
+  $ hg -R ../server admin::clone-bundles-status -v
+  bzip2-v1: 0 revisions behind
+    peer-bundle-cache://full-bzip2-v1-15_revs-17615b3984c2_tip-*_acbr.hg (glob)
+  bzip2-v2: 0 revisions behind
+    peer-bundle-cache://full-bzip2-v2-15_revs-17615b3984c2_tip-*_acbr.hg (glob)
+
+  $ touch "staleness"
+  $ hg -q commit -A -m 'add staleness'
+  $ hg push -q
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 1 revisions behind (stale)
+  bzip2-v2: 1 revisions behind (stale)
+  [1]
+  $ hg -R ../server admin::clone-bundles-status -T json
+  [
+   {
+    "bundle_type": "bzip2-v1",
+    "revs_behind": 1,
+    "stale": true,
+    "url": "peer-bundle-cache://full-bzip2-v1-15_revs-17615b3984c2_tip-*_acbr.hg" (glob)
+   },
+   {
+    "bundle_type": "bzip2-v2",
+    "revs_behind": 1,
+    "stale": true,
+    "url": "peer-bundle-cache://full-bzip2-v2-15_revs-17615b3984c2_tip-*_acbr.hg" (glob)
+   }
+  ]
+  [1]
+
+  $ touch "staleness2"
+  $ hg -q commit -A -m 'add staleness2'
+  $ hg push -q
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 2 revisions behind (stale)
+  bzip2-v2: 2 revisions behind (stale)
+  [1]
+
+Refreshing them brings them up to date
+
+  $ hg -R ../server/ admin::clone-bundles-refresh
+  clone-bundles: deleting inline bundle full-bzip2-v1-13_revs-8a81f9be54ea_tip-*_acbr.hg (glob)
+  clone-bundles: deleting inline bundle full-bzip2-v2-13_revs-8a81f9be54ea_tip-*_acbr.hg (glob)
+  clone-bundles: starting bundle generation: bzip2-v1
+  17 changesets found
+  clone-bundles: starting bundle generation: bzip2-v2
+  17 changesets found
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 0 revisions behind
+  bzip2-v2: 0 revisions behind
+
+Trigger the generation on the growth of the store
+=================================================
+
+  $ cat >> ../server/.hg/hgrc << EOF
+  > [clone-bundles]
+  > trigger.revs = 100
+  > trigger.below-bundled-ratio = 0.5
+  > trigger.bytes = 10 KB
+  > EOF
+
+The size of the store is only known for bundles generated with the option set
+
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 0 revisions behind
+  bzip2-v2: 0 revisions behind
+  $ hg -R ../server/ admin::clone-bundles-clear
+  clone-bundles: deleting inline bundle full-bzip2-v1-15_revs-17615b3984c2_tip-*_acbr.hg (glob)
+  clone-bundles: deleting inline bundle full-bzip2-v1-17_revs-9b5f65b473b6_tip-*_acbr.hg (glob)
+  clone-bundles: deleting inline bundle full-bzip2-v2-15_revs-17615b3984c2_tip-*_acbr.hg (glob)
+  clone-bundles: deleting inline bundle full-bzip2-v2-17_revs-9b5f65b473b6_tip-*_acbr.hg (glob)
+  $ hg -R ../server/ admin::clone-bundles-refresh
+  clone-bundles: starting bundle generation: bzip2-v1
+  17 changesets found
+  clone-bundles: starting bundle generation: bzip2-v2
+  17 changesets found
+  $ grep -c DONE-v2 ../server/.hg/clonebundles.auto-gen
+  2
+
+  $ "$PYTHON" -c 'print("x" * 4000)' > small
+  $ hg -q commit -A -m 'add small'
+  $ hg push -q
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 1 revisions behind, * bytes behind (glob)
+  bzip2-v2: 1 revisions behind, * bytes behind (glob)
+  $ "$PYTHON" -c 'import random; open("large", "wb").write(random.Random(0).randbytes(20000))'
+  $ hg -q commit -A -m 'add large'
+  $ hg push -q
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 2 revisions behind, * bytes behind (stale) (glob)
+  bzip2-v2: 2 revisions behind, * bytes behind (stale) (glob)
+  [1]
+  $ hg -R ../server/ admin::clone-bundles-refresh
+  clone-bundles: starting bundle generation: bzip2-v1
+  19 changesets found
+  clone-bundles: starting bundle generation: bzip2-v2
+  19 changesets found
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 0 revisions behind, 0 bytes behind
+  bzip2-v2: 0 revisions behind, 0 bytes behind
+  $ cat ../server/.hg/clonebundles.manifest
+  peer-bundle-cache://full-bzip2-v1-19_revs-bfaf7378a3ff_tip-*_acbr.hg BUNDLESPEC=bzip2-v1 (glob)
+  peer-bundle-cache://full-bzip2-v2-19_revs-bfaf7378a3ff_tip-*_acbr.hg BUNDLESPEC=bzip2-v2 (glob)
+
+The size of the store is cached, the transactions add their growth to it
+instead of looking at all the files of the store again
+
+  $ cat ../server/.hg/cache/clonebundles-store-size
+  \d+ bfaf7378a3ff[0-9a-f]+ (re)
+  $ "$PYTHON" -c 'print("y" * 4000)' >> small
+  $ hg -q commit -m 'grow small'
+  $ hg push -q
+  $ cp ../server/.hg/cache/clonebundles-store-size tracked-size
+  $ rm ../server/.hg/cache/clonebundles-store-size
+  $ hg -R ../server admin::clone-bundles-status
+  bzip2-v1: 1 revisions behind, * bytes behind (glob)
+  bzip2-v2: 1 revisions behind, * bytes behind (glob)
+  $ cmp tracked-size ../server/.hg/cache/clonebundles-store-size
+  $ rm tracked-size
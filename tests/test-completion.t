@@ -79,9 +79,11 @@ Do not show debug commands if there are other candidates
 Show debug commands if there are no other candidates
   $ hg debugcomplete debug
   debug-delta-find
+  debug-optimize-revlogs
   debug-repair-issue6528
   debug-revlog-index
   debug-revlog-stats
+  debug-train-zstd-dictionaries
   debug::stable-tail-sort
   debug::stable-tail-sort-leaps
   debug::unbundle
@@ -267,7 +269,7 @@ Show all commands + options
   annotate: rev, follow, no-follow, text, user, file, date, number, changeset, line-number, skip, line-range, ignore-all-space, ignore-space-change, ignore-blank-lines, ignore-space-at-eol, include, exclude, template
   archive: no-decode, prefix, rev, type, subrepos, include, exclude
   backout: merge, commit, no-commit, parent, rev, edit, tool, include, exclude, message, logfile, date, user
-  bisect: reset, good, bad, skip, extend, command, noupdate
+  bisect: reset, good, bad, skip, extend, command, noupdate, jobs
   bookmarks: force, rev, delete, rename, inactive, list, template
   branch: force, clean, rev
   branches: active, closed, rev, template
@@ -279,9 +281,11 @@ Show all commands + options
   continue: dry-run
   copy: forget, after, at-rev, force, include, exclude, dry-run
   debug-delta-find: changelog, manifest, dir, template, source
+  debug-optimize-revlogs: re-delta, pause, time-limit, max-revlogs, restart, hot-chains
   debug-repair-issue6528: to-report, from-report, paranoid, dry-run
   debug-revlog-index: changelog, manifest, dir, template
   debug-revlog-stats: changelog, manifest, filelogs, template
+  debug-train-zstd-dictionaries: size, samples, dry-run
   debug::stable-tail-sort: template
   debug::stable-tail-sort-leaps: template, specific
   debug::unbundle: 
@@ -396,7 +400,7 @@ Show all commands + options
   unbundle: update
   unshelve: abort, continue, interactive, keep, name, tool, date
   update: clean, check, merge, date, rev, tool
-  verify: full
+  verify: full, incremental
   version: template
 
   $ hg init a
@@ -188,6 +188,8 @@ perfstatus
    perf::revrange
                  (no help text available)
    perf::revset  benchmark the execution time of a revset
+   perf::simplemerge
+                 benchmark the 3-way merge of the content of a file
    perf::startup
                  (no help text available)
    perf::status  benchmark the performance of a single status call
@@ -287,6 +289,9 @@ perfstatus
   $ hg perfrevlogchunks -c
   $ hg perfrevrange
   $ hg perfrevset 'all()'
+  $ hg perfsimplemerge -r 3 a
+  $ hg perfsimplemerge --chunked --memory -r 3 a
+  peak memory: * bytes (glob)
   $ hg perfstartup
   $ hg perfstatus
   $ hg perfstatus --dirstate
@@ -0,0 +1,94 @@
+#require no-reposimplestore
+
+Rewrite the revlogs of a repository one at a time
+=================================================
+
+  $ cat >> $HGRCPATH <<EOF
+  > [experimental]
+  > revlogv2=enable-unstable-format-and-corrupt-my-data
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ mkdir dir
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 1 20`; do
+  >   "$PYTHON" $TESTDIR/seq.py $i 100 >> a
+  >   "$PYTHON" $TESTDIR/seq.py 1 $i > b
+  >   echo $i > dir/c
+  >   hg commit -qAm $i
+  > done
+  $ hg debugdeltachain a | tail -1
+       19      18      -1       1       20       18      p1
+
+Only some revlogs are rewritten when the run is limited
+
+  $ hg debug-optimize-revlogs --max-revlogs 2
+  optimized 2 revlogs \(\d+ bytes -> \d+ bytes\) (re)
+  2 revlogs left to optimize
+  [1]
+
+The next run resumes where the previous one stopped
+
+  $ hg debug-optimize-revlogs
+  skipping 2 revlogs already optimized
+  optimized 2 revlogs \(\d+ bytes -> \d+ bytes\) (re)
+  $ hg debug-optimize-revlogs
+  skipping 4 revlogs already optimized
+  optimized 0 revlogs (0 bytes -> 0 bytes)
+
+Deltas are recomputed with the current configuration
+
+  $ hg debug-optimize-revlogs --re-delta all --config format.maxchainlen=4
+  optimized 4 revlogs \(\d+ bytes -> \d+ bytes\) (re)
+  $ hg debugdeltachain a | tail -1
+       19      18      -1       3        3       15    snap
+  $ hg verify -q
+  $ hg cat -r 10 b | tail -1
+  11
+
+A reader that loaded the revlog before the rewrite keeps reading the old
+files
+
+  $ cat > $TESTTMP/reader.py <<EOF
+  > from mercurial import hg, ui as uimod
+  > from mercurial.revlogutils import rewrite
+  > repo = hg.repository(uimod.ui.load(), b'.')
+  > fl = repo.file(b'a')
+  > before = fl.revision(19)
+  > with repo.lock(), repo.transaction(b'test') as tr:
+  >     other = repo.file(b'a')
+  >     rewrite.v2_rewrite(other._revlog, tr, b'never')
+  > fl._revlog.clearcaches()
+  > assert fl.revision(19) == before
+  > print(fl._revlog._datafile != other._revlog._datafile)
+  > EOF
+  $ "$PYTHON" $TESTTMP/reader.py
+  True
+  $ hg verify -q
+
+Only the files of the previous rewrite are kept
+
+  $ ls .hg/store/data/a-* | wc -l
+  \s*6 (re)
+  $ hg debug-optimize-revlogs --restart
+  optimized 4 revlogs \(\d+ bytes -> \d+ bytes\) (re)
+  $ hg debug-optimize-revlogs --restart
+  optimized 4 revlogs \(\d+ bytes -> \d+ bytes\) (re)
+  $ ls .hg/store/data/a-* | wc -l
+  \s*6 (re)
+  $ hg verify -q
+  $ hg cat -r 10 b | tail -1
+  11
+
+Invalid mode and unsupported repositories
+
+  $ hg debug-optimize-revlogs --re-delta some
+  abort: invalid --re-delta value: some
+  (use "none", "parent" or "all")
+  [10]
+  $ cd ..
+  $ hg init v1 --config experimental.revlogv2=no
+  $ hg -R v1 debug-optimize-revlogs
+  abort: can only optimize revlog-v2 repositories in place
+  (see "hg help debugupgraderepo")
+  [255]
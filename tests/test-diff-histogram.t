@@ -0,0 +1,53 @@
+Test the histogram diff algorithm
+
+  $ hg init repo
+  $ cd repo
+  $ printf '\n\nfoo\n{\n' > a
+  $ hg commit -qAm 0
+  $ printf '\n{\n\nfoo\n\n\n\n{\n' > a
+  $ hg commit -qm 1
+
+The histogram algorithm anchors the matches on the lines that are not repeated
+
+  $ hg diff -c 1 --config experimental.histogram-diff=yes
+  diff -r 84245892090e -r c9559e6bf86b a
+  --- a/a	Thu Jan 01 00:00:00 1970 +0000
+  +++ b/a	Thu Jan 01 00:00:00 1970 +0000
+  @@ -1,4 +1,8 @@
+   
+  +{
+   
+   foo
+  +
+  +
+  +
+   {
+
+Annotate uses it too
+
+  $ hg annotate a --config experimental.histogram-diff=yes
+  0: 
+  1: {
+  0: 
+  0: foo
+  1: 
+  1: 
+  1: 
+  0: {
+
+And so does the internal merge
+
+  $ hg up -q 0
+  $ printf '\n\nfoo\n{\nbar\n' > a
+  $ hg commit -qm 2
+  $ hg merge -q 1 --config experimental.histogram-diff=yes
+  $ cat a
+  
+  {
+  
+  foo
+  
+  
+  
+  {
+  bar
@@ -0,0 +1,86 @@
+Test computing the diffs of files in worker threads
+
+  $ cat >> $HGRCPATH << EOF
+  > [diff]
+  > git = yes
+  > [worker]
+  > numcpus = 3
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 0 1 2 3 4 5 6 7 8 9; do
+  >   $TESTDIR/seq.py 1 100 > f$i
+  > done
+  $ printf 'bin\0ary' > binary
+  $ hg commit -qAm 0
+  $ for i in 0 2 4 6 8; do
+  >   $TESTDIR/seq.py 10 110 > f$i
+  > done
+  $ hg rm -q f1
+  $ hg mv -q f3 moved
+  $ echo 1 >> moved
+  $ chmod +x f5
+  $ echo new > added
+  $ printf 'other\0bin' > binary
+  $ hg commit -qAm 1
+
+The output is the same, in the same order, as the sequential diff
+
+  $ hg log -p -r 1 > sequential.out
+  $ hg log -p -r 1 --config experimental.parallel-diff=yes > parallel.out
+  $ cmp sequential.out parallel.out
+  $ hg --config experimental.parallel-diff=yes export -r 1 | grep '^diff'
+  diff --git a/added b/added
+  diff --git a/binary b/binary
+  diff --git a/f0 b/f0
+  diff --git a/f1 b/f1
+  diff --git a/f2 b/f2
+  diff --git a/f4 b/f4
+  diff --git a/f5 b/f5
+  diff --git a/f6 b/f6
+  diff --git a/f8 b/f8
+  diff --git a/f3 b/moved
+  $ hg diff -c 1 --stat --config experimental.parallel-diff=yes
+   added       |    1 +
+   binary      |  Bin 
+   f0          |   19 ++++++-----
+   f1          |  100 ------------------------------------------------------------
+   f2          |   19 ++++++-----
+   f4          |   19 ++++++-----
+   f5          |    0 
+   f6          |   19 ++++++-----
+   f8          |   19 ++++++-----
+   f3 => moved |    1 +
+   10 files changed, 52 insertions(+), 145 deletions(-)
+
+Upgrading to the git format restarts the diff
+
+  $ hg diff -c 1 --config diff.git=no --config diff.upgrade=yes \
+  >   --config experimental.parallel-diff=yes > parallel.out
+  $ hg diff -c 1 --config diff.git=no --config diff.upgrade=yes \
+  >   > sequential.out
+  $ cmp sequential.out parallel.out
+
+Stopping to read the diff early is fine
+
+  $ hg diff -c 1 --config experimental.parallel-diff=yes | head -n 2
+  diff --git a/added b/added
+  new file mode 100644
+
+The working directory is diffed the same way, with the index lines that depend
+on which files exist
+
+  $ hg up -q 0
+  $ $TESTDIR/seq.py 5 105 > f1
+  $ hg rm -q f9
+  $ echo new > untracked
+  $ hg add -q untracked
+  $ hg diff --config experimental.extendedheader.index=12 > sequential.out
+  $ hg diff --config experimental.extendedheader.index=12 \
+  >   --config experimental.parallel-diff=yes > parallel.out
+  $ cmp sequential.out parallel.out
+  $ grep '^index' parallel.out
+  index 190423f88f82..54634f35dde0 100644
+  index 190423f88f82..000000000000 100644
+  index 000000000000..3e757656cf36 100644
@@ -0,0 +1,211 @@
+Test the cache of the responses to getbundle
+
+  $ cat >> $HGRCPATH << EOF
+  > [experimental]
+  > evolution = all
+  > EOF
+
+  $ hg init server
+  $ cd server
+  $ cat >> .hg/hgrc << EOF
+  > [extensions]
+  > blackbox =
+  > mock = $TESTDIR/mockblackbox.py
+  > [blackbox]
+  > track = getbundlecache
+  > [phases]
+  > publish = False
+  > [server]
+  > getbundle-cache.size = 1 MB
+  > EOF
+  $ for i in 0 1 2; do
+  >   echo $i > f
+  >   hg commit -qAm $i
+  > done
+  $ cd ..
+
+  $ cachelog() {
+  >   hg -R server blackbox -l 100 | grep 'bundle ' | cut -d '>' -f 2
+  >   rm -f server/.hg/blackbox.log
+  > }
+
+The first clone generates the bundle and keeps it, the second one gets it from
+the cache
+
+  $ hg clone -q ssh://user@dummy/server client1
+  $ hg clone -q ssh://user@dummy/server client2
+  $ hg -R client2 log -T '{rev} {desc}\n'
+  2 2
+  1 1
+  0 0
+  $ cachelog
+   caching bundle 1124dc0512539a84c2069394c2927562689c671a (1546 bytes)
+   sending cached bundle 1124dc0512539a84c2069394c2927562689c671a
+  $ ls server/.hg/cache/getbundle | wc -l
+  \s*1 (re)
+
+Pulls of the same range share an entry
+
+  $ hg clone -q -r 0 ssh://user@dummy/server pull1
+  $ hg clone -q -r 0 ssh://user@dummy/server pull2
+  $ hg -R pull1 pull -q
+  $ hg -R pull2 pull -q
+  $ hg -R pull2 log -T '{rev} {desc}\n'
+  2 2
+  1 1
+  0 0
+  $ cachelog
+   caching bundle ed46070fe521a8f2f4c8d5e89be35272b4c06d95 (640 bytes)
+   sending cached bundle ed46070fe521a8f2f4c8d5e89be35272b4c06d95
+   caching bundle 9aecf4659fe480d3c540d296927fa41b831f3666 (1093 bytes)
+   sending cached bundle 9aecf4659fe480d3c540d296927fa41b831f3666
+  $ ls server/.hg/cache/getbundle | wc -l
+  \s*3 (re)
+
+Changing the visible changesets, the phases, the bookmarks or the obsolescence
+markers of the server invalidates the entries, going back to a previous state
+uses its entries again
+
+  $ hg -R server phase -q --secret --force -r 2
+  $ hg clone -q ssh://user@dummy/server client3
+  $ hg -R client3 log -T '{rev} {desc} {phase}\n'
+  1 1 draft
+  0 0 draft
+  $ cachelog
+   caching bundle 45f6f14a5b4115b0dcece01880cdebecc8422e7c (1093 bytes)
+  $ hg -R server phase -q --draft --force -r 2
+  $ hg clone -q ssh://user@dummy/server client4
+  $ hg -R client4 log -T '{rev} {desc} {phase}\n'
+  2 2 draft
+  1 1 draft
+  0 0 draft
+  $ cachelog
+   sending cached bundle 1124dc0512539a84c2069394c2927562689c671a
+  $ hg -R server bookmark -r 1 book
+  $ hg clone -q ssh://user@dummy/server client5
+  $ hg -R client5 bookmarks
+     book                      1:c4c1f08311dd
+  $ cachelog
+   caching bundle 13e3cf04bcd8d57fed63d1522b51de77ad4689b0 (1649 bytes)
+  $ hg -R server debugobsolete `hg -R server log -r 2 -T '{node}'`
+  1 new obsolescence markers
+  obsoleted 1 changesets
+  $ hg clone -q ssh://user@dummy/server client6
+  $ hg -R client6 log -T '{rev} {desc}\n'
+  1 1
+  0 0
+  $ cachelog
+   caching bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60 (1728 bytes)
+  $ ls server/.hg/cache/getbundle | wc -l
+  \s*6 (re)
+
+The least recently used entries are removed to keep the cache under its size,
+and responses larger than the cache are not kept
+
+  $ hg clone -q ssh://user@dummy/server client7
+  $ cachelog
+   sending cached bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60
+  $ cat >> server/.hg/hgrc << EOF
+  > [server]
+  > getbundle-cache.size = 2100
+  > EOF
+  $ hg -R client6 pull -q
+  $ cachelog
+   caching bundle cc042571e16fb6ed184623e8a92f3754f4589cc6 (291 bytes)
+   removing cached bundle ed46070fe521a8f2f4c8d5e89be35272b4c06d95
+   removing cached bundle 9aecf4659fe480d3c540d296927fa41b831f3666
+   removing cached bundle 45f6f14a5b4115b0dcece01880cdebecc8422e7c
+   removing cached bundle 1124dc0512539a84c2069394c2927562689c671a
+   removing cached bundle 13e3cf04bcd8d57fed63d1522b51de77ad4689b0
+  $ ls server/.hg/cache/getbundle | wc -l
+  \s*2 (re)
+  $ cat >> server/.hg/hgrc << EOF
+  > [server]
+  > getbundle-cache.size = 100
+  > EOF
+  $ hg clone -q -r 0 ssh://user@dummy/server client8
+  $ cachelog
+  $ ls server/.hg/cache/getbundle | wc -l
+  \s*2 (re)
+
+The cache is not used when it is disabled
+
+  $ cat >> server/.hg/hgrc << EOF
+  > [server]
+  > getbundle-cache.size = 0
+  > EOF
+  $ hg clone -q ssh://user@dummy/server client9
+  $ hg -R client9 log -T '{rev} {desc}\n'
+  1 1
+  0 0
+  $ cachelog
+
+The outgoing hooks run for the responses sent from the cache too
+
+  $ cat >> server/.hg/hgrc << EOF
+  > [server]
+  > getbundle-cache.size = 1 MB
+  > [hooks]
+  > outgoing.log = echo outgoing \$HG_NODE \$HG_SOURCE >> $TESTTMP/outgoing
+  > EOF
+  $ hg clone -q ssh://user@dummy/server client10
+  $ hg clone -q ssh://user@dummy/server client11
+  $ cachelog
+   sending cached bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60
+   sending cached bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60
+  $ cat outgoing
+  outgoing bc414dfb9ccc0ff1e6c8d04b5dbb7a3ef15ea6af serve
+  outgoing bc414dfb9ccc0ff1e6c8d04b5dbb7a3ef15ea6af serve
+  $ cat >> server/.hg/hgrc << EOF
+  > preoutgoing.deny = false
+  > EOF
+  $ hg clone -q ssh://user@dummy/server client12
+  remote: abort: preoutgoing.deny hook exited with status 1
+  abort: pull failed on remote
+  [100]
+  $ cat >> server/.hg/hgrc << EOF
+  > outgoing.log =
+  > preoutgoing.deny =
+  > EOF
+  $ cachelog
+   sending cached bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60
+
+The configuration changing the content of the response is part of the key
+
+  $ hg clone -q ssh://user@dummy/server client13
+  $ hg -R client13 log -T '{rev} {phase}\n'
+  1 draft
+  0 draft
+  $ cat >> server/.hg/hgrc << EOF
+  > [phases]
+  > publish = yes
+  > EOF
+  $ hg clone -q ssh://user@dummy/server client14
+  $ hg -R client14 log -T '{rev} {phase}\n'
+  2 public
+  1 public
+  0 public
+  $ cachelog
+   sending cached bundle ec19c2835a5a9e1fcab1dbbee220db165cfd7a60
+   caching bundle * (glob)
+
+The cache is not used when an extension wraps the generation of the bundles,
+it could check the permissions of the clients
+
+  $ cat > wrap.py << EOF
+  > from mercurial import exchange, extensions
+  > def wrapped(orig, *args, **kwargs):
+  >     return orig(*args, **kwargs)
+  > def extsetup(ui):
+  >     extensions.wrapfunction(exchange, 'getbundlechunks', wrapped)
+  > EOF
+  $ cat >> server/.hg/hgrc << EOF
+  > [extensions]
+  > wrap = $TESTTMP/wrap.py
+  > EOF
+  $ hg clone -q ssh://user@dummy/server client15
+  $ hg -R client15 log -T '{rev} {desc}\n'
+  2 2
+  1 1
+  0 0
+  $ cachelog
@@ -997,6 +997,8 @@ Test list of internal help commands
   
    debug-delta-find
                  display the computation to get to a valid delta for storing REV
+   debug-optimize-revlogs
+                 rewrite the revlogs of a repository one at a time
    debug-repair-issue6528
                  find affected revisions and repair them. See issue6528 for more
                  details.
@@ -1004,6 +1006,8 @@ Test list of internal help commands
                  dump index data for a revlog
    debug-revlog-stats
                  display statistics about revlogs in the store
+   debug-train-zstd-dictionaries
+                 train the zstd dictionaries used to compress revlog chunks
    debug::stable-tail-sort
                  display the stable-tail sort of the ancestors of a given node
    debug::stable-tail-sort-leaps
@@ -1807,6 +1811,7 @@ Test keyword search help
    admin::clone-bundles-clear   remove existing clone bundle caches
    admin::clone-bundles-refresh generate clone bundles according to the
                                 configuration
+   admin::clone-bundles-status  report how up to date the clone bundles are
    qclone                       clone main and patch repository at same time
 
 Test unfound topic
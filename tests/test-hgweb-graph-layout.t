@@ -0,0 +1,82 @@
+#require serve
+
+The graph of hgweb is laid out once for all the pages scrolled down from tip
+
+  $ hg init test
+  $ cd test
+  $ hg debugbuilddag '+2:a +3 <a +2 /3 +2'
+  $ hg log -G -T '{rev}\n'
+  o  9
+  |
+  o  8
+  |
+  o    7
+  |\
+  | o  6
+  | |
+  | o  5
+  | |
+  o |  4
+  | |
+  o |  3
+  | |
+  o |  2
+  |/
+  o  1
+  |
+  o  0
+  
+  $ hg serve -n test -p $HGPORT -d --pid-file=hg.pid -E errors.log
+  $ cat hg.pid >> $DAEMON_PIDS
+
+  $ graphdata() {
+  >   get-with-headers.py $LOCALIP:$HGPORT "graph/$1?revcount=4&graphtop=$2" \
+  >     | grep '^var data' \
+  >     | "$PYTHON" -c '
+  > import json, sys
+  > for row in json.loads(sys.stdin.read()[11:-2]):
+  >     print(row["node"], row["vertex"], row["edges"])'
+  > }
+  $ top=`hg log -r tip -T '{node}'`
+
+  $ graphdata tip $top
+  6076c38d2897 [0, 1] [[0, 0, 1, -1, '']]
+  e6da33e17aa2 [0, 1] [[0, 0, 1, -1, '']]
+  f6e5ba75445a [0, 1] [[0, 0, 1, -1, ''], [0, 1, 1, -1, '']]
+  8bbe846c2602 [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  $ f --size .hg/cache/graphlayout-v1-served
+  .hg/cache/graphlayout-v1-served: size=236
+
+The next pages extend the layout. The rows of the first page are unchanged,
+the line from 7 to 4 keeps its column.
+
+  $ graphdata 3 $top
+  6076c38d2897 [0, 1] [[0, 0, 1, -1, '']]
+  e6da33e17aa2 [0, 1] [[0, 0, 1, -1, '']]
+  f6e5ba75445a [0, 1] [[0, 0, 1, -1, ''], [0, 1, 1, -1, '']]
+  8bbe846c2602 [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  914970512d65 [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  bebd167eb94d [0, 1] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  2dc09a01254d [0, 1] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  01241442b3c2 [0, 1] [[0, 0, 1, -1, ''], [1, 0, 2, -1, '']]
+  66f7d451a68b [0, 2] [[0, 0, 2, -1, '']]
+  1ea73414a91b [0, 2] []
+  $ f --size .hg/cache/graphlayout-v1-served
+  .hg/cache/graphlayout-v1-served: size=460
+
+A new tip gives a new layout
+
+  $ hg up -q 5
+  $ echo a > a
+  $ hg add a
+  $ hg commit -qm 10 -d "0 0" a
+  $ top=`hg log -r tip -T '{node}'`
+  $ graphdata tip $top
+  9c440b39c2bc [0, 1] [[0, 0, 1, -1, '']]
+  6076c38d2897 [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  e6da33e17aa2 [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, '']]
+  f6e5ba75445a [1, 2] [[0, 0, 1, -1, ''], [1, 1, 2, -1, ''], [1, 2, 2, -1, '']]
+  $ f --size .hg/cache/graphlayout-v1-served
+  .hg/cache/graphlayout-v1-served: size=276
+
+  $ cat errors.log
@@ -2977,3 +2977,55 @@ Log -f on B should reports current changesets
   </log>
 
   $ cd ..
+
+json and cbor changesets are formatted a batch at a time, the working directory
+one is still formatted on its own
+
+  $ hg init batches
+  $ cd batches
+  $ hg debugbuilddag '+300'
+  $ hg bookmark -r 10 book
+  $ hg phase --public -r 100
+  $ hg log -Tjson > log.json
+  $ hg log -Tcbor > log.cbor
+  $ "$PYTHON" << EOF
+  > import json
+  > from mercurial.utils import cborutil
+  > def tostr(v):
+  >     if isinstance(v, bytes):
+  >         return v.decode()
+  >     if isinstance(v, list):
+  >         return [tostr(e) for e in v]
+  >     if isinstance(v, dict):
+  >         return {tostr(k): tostr(e) for k, e in v.items()}
+  >     return v
+  > with open('log.json') as fp:
+  >     items = json.load(fp)
+  > with open('log.cbor', 'rb') as fp:
+  >     data = fp.read()
+  > # the decoder does not support indefinite-length arrays
+  > assert data[:1] == cborutil.BEGIN_INDEFINITE_ARRAY
+  > assert data[-1:] == cborutil.BREAK
+  > cboritems = cborutil.decodeall(data[1:-1])
+  > print(len(items), tostr(cboritems) == items)
+  > print([(i['rev'], i['phase'], i['bookmarks']) for i in items[-102::91]])
+  > EOF
+  300 True
+  [(101, 'draft', []), (10, 'public', ['book'])]
+  $ hg log -r '1+wdir()+0' -Tjson -q
+  [
+   {
+    "node": "*", (glob)
+    "rev": 1
+   },
+   {
+    "node": "ffffffffffffffffffffffffffffffffffffffff",
+    "rev": 2147483647
+   },
+   {
+    "node": "*", (glob)
+    "rev": 0
+   }
+  ]
+
+  $ cd ..
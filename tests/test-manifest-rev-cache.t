@@ -0,0 +1,70 @@
+Test the persistent changelog to manifest revision cache
+
+  $ cat >> $HGRCPATH << EOF
+  > [storage]
+  > manifest-rev-cache = yes
+  > [extensions]
+  > strip =
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 1 2 3; do
+  >   echo $i > f$i
+  >   hg commit -qAm "commit $i" -d "$i 3600"
+  > done
+
+The cache is written when the transaction closes
+
+  $ f --size .hg/cache/mrc-revs-v1
+  .hg/cache/mrc-revs-v1: size=84
+  $ hg log -T '{rev} {date|hgdate} {manifest}\n'
+  2 3 3600 2:de15c33ebe3f
+  1 2 3600 1:abea233454aa
+  0 1 3600 0:481a2a9a54c3
+  $ hg files -r 1
+  f1
+  f2
+
+The data is the same when the cache is disabled
+
+  $ hg log -T '{rev} {date|hgdate} {manifest}\n' \
+  >   --config storage.manifest-rev-cache=no
+  2 3 3600 2:de15c33ebe3f
+  1 2 3600 1:abea233454aa
+  0 1 3600 0:481a2a9a54c3
+
+Rewriting history is detected and the cache gets fixed
+
+  $ hg up -q 0
+  $ echo 4 > f4
+  $ hg commit -qAm "commit 4" -d "4 0"
+  $ hg strip 1 --config devel.strip-obsmarkers=no --debug 2>&1 \
+  >   | grep 'manifest revision cache'
+  history modification detected - truncating manifest revision cache to revision 1
+  $ hg log -T '{rev} {date|hgdate} {manifest}\n' --debug
+  1 4 0 1:b6b57b5d116133bf555b368b17c0cf46a7b186f1
+  0 1 3600 0:481a2a9a54c341787afa6cb7213b4d18d00f228a
+  $ f --size .hg/cache/mrc-revs-v1
+  .hg/cache/mrc-revs-v1: size=56
+
+Revisions added through a changegroup are added when the transaction closes
+
+  $ cd ..
+  $ hg init pulled
+  $ hg -R pulled pull -q repo
+  $ f --size pulled/.hg/cache/mrc-revs-v1
+  pulled/.hg/cache/mrc-revs-v1: size=56
+  $ hg -R pulled files -r tip
+  pulled/f1
+  pulled/f4
+
+A corrupted cache file is not trusted
+
+  $ printf 'garbage' > pulled/.hg/cache/mrc-revs-v1
+  $ hg -R pulled log -T '{rev} {date|hgdate} {manifest}\n'
+  1 4 0 1:b6b57b5d1161
+  0 1 3600 0:481a2a9a54c3
+  $ hg -R pulled debugupdatecaches
+  $ f --size pulled/.hg/cache/mrc-revs-v1
+  pulled/.hg/cache/mrc-revs-v1: size=56
@@ -0,0 +1,75 @@
+Test the manifest full text cache shared between processes
+
+  $ cat >> $HGRCPATH << EOF
+  > [storage]
+  > manifest-shared-cache = yes
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 1 2 3; do
+  >   echo $i > f$i
+  >   hg commit -qAm "commit $i"
+  > done
+
+The manifests created while the lock was held are shared on lock release
+
+  $ f --size .hg/cache/manifestsharedcache-v1
+  .hg/cache/manifestsharedcache-v1: size=348
+  $ hg debugmanifestfulltextcache
+  cache contains 3 manifest entries, in order of most to least recent:
+  id: de15c33ebe3f0d09c6a9f3f59a35dfa5f2e37fd1, size 132 bytes
+  id: abea233454aa3a3946ebf92b277255dc3ab01185, size 88 bytes
+  id: 481a2a9a54c341787afa6cb7213b4d18d00f228a, size 44 bytes
+  total cache data size 336 bytes, on-disk 336 bytes
+  shared cache contains 3 manifest entries
+
+Reading from the shared cache does not write to it
+
+  $ rm .hg/wcache/manifestfulltextcache
+  $ hg files -r 1
+  f1
+  f2
+  $ f --size .hg/cache/manifestsharedcache-v1
+  .hg/cache/manifestsharedcache-v1: size=348
+
+A partially written record is ignored, and dropped by the next write
+
+  $ printf 'garbage' >> .hg/cache/manifestsharedcache-v1
+  $ hg files -r 2
+  f1
+  f2
+  f3
+  $ echo 4 > f4
+  $ hg commit -qAm "commit 4"
+  $ f --size .hg/cache/manifestsharedcache-v1
+  .hg/cache/manifestsharedcache-v1: size=552
+  $ hg debugmanifestfulltextcache | tail -1
+  shared cache contains 4 manifest entries
+
+Corrupted data is not used
+
+  $ rm .hg/wcache/manifestfulltextcache
+  $ "$PYTHON" -c "
+  > with open('.hg/cache/manifestsharedcache-v1', 'r+b') as fp:
+  >     fp.seek(40)
+  >     fp.write(b'X')
+  > "
+  $ hg files -r 0
+  f1
+
+The oldest entries are evicted to keep the file under the configured size
+
+  $ hg debugmanifestfulltextcache --clear
+  $ for r in 3 0 1 2; do
+  >   rm -f .hg/wcache/manifestfulltextcache
+  >   hg files -r $r --config storage.manifest-shared-cache.max-size=500 \
+  >     > /dev/null
+  >   f --size .hg/cache/manifestsharedcache-v1
+  > done
+  .hg/cache/manifestsharedcache-v1: size=204
+  .hg/cache/manifestsharedcache-v1: size=276
+  .hg/cache/manifestsharedcache-v1: size=392
+  .hg/cache/manifestsharedcache-v1: size=232
+  $ hg debugmanifestfulltextcache | tail -1
+  shared cache contains 2 manifest entries
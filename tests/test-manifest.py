@@ -9,6 +9,7 @@ from mercurial.node import sha1nodeconstants
 from mercurial import (
     manifest as manifestmod,
     match as matchmod,
+    mdiff,
     util,
 )
 
@@ -434,6 +435,43 @@ class testmanifestdict(unittest.TestCase, basemanifesttests):
             self.parsemanifest(20, data)
 
 
+class testpurelazymanifest(testmanifestdict):
+    def parsemanifest(self, nodelen, text):
+        m = manifestmod.manifestdict(nodelen)
+        m._lm = manifestmod._LazyManifest(nodelen, text)
+        return m
+
+    def testBufferIsNotCopied(self):
+        text = A_SHORT_MANIFEST
+        lm = manifestmod._LazyManifest(20, text)
+        self.assertIs(text, lm.data)
+        self.assertEqual((BIN_HASH_1, b''), lm[b'foo'])
+        lm[b'bar/baz/qux.py'] = BIN_HASH_3, b''
+        # modifications go to the overlay until the text is needed
+        self.assertIs(text, lm.data)
+        self.assertEqual(
+            b'bar/baz/qux.py\0%s\nfoo\0%s\n' % (HASH_3, HASH_1), lm.text()
+        )
+
+    def testOverlayDiff(self):
+        m1 = self.parsemanifest(20, A_DEEPER_MANIFEST)
+        m2 = m1.copy()
+        m2[b'a/b/c/bar.py'] = BIN_HASH_1
+        m2[b'a/b/e/new.py'] = BIN_HASH_2
+        del m2[b'a/b/d/qux.py']
+        self.assertIs(m1._lm.data, m2._lm.data)
+        want = {
+            b'a/b/c/bar.py': ((BIN_HASH_3, b''), (BIN_HASH_1, b'')),
+            b'a/b/e/new.py': ((None, b''), (BIN_HASH_2, b'')),
+            b'a/b/d/qux.py': ((BIN_HASH_1, b'l'), (None, b'')),
+        }
+        self.assertEqual(want, m1.diff(m2))
+        # same result once the overlay has been merged into the text
+        m3 = self.parsemanifest(20, m2.text())
+        self.assertEqual(want, m1.diff(m3))
+        self.assertEqual(list(m2.iterentries()), list(m3.iterentries()))
+
+
 class testtreemanifest(unittest.TestCase, basemanifesttests):
     def parsemanifest(self, nodelen, text):
         return manifestmod.treemanifest(sha1nodeconstants, b'', text)
@@ -454,5 +492,55 @@ class testtreemanifest(unittest.TestCase, basemanifesttests):
         self.assertEqual(sorted([b'a/b/', b'a/b/c/', b'a/b/d/']), sorted(dirs))
 
 
+class testdeltachaindiff(unittest.TestCase):
+    def _manifest(self, files):
+        m = manifestmod.manifestdict(sha1nodeconstants.nodelen)
+        for f, (n, fl) in files.items():
+            m.set(f, n, fl)
+        return m
+
+    def _chaindiff(self, texts):
+        deltas = [mdiff.textdiff(a, b) for a, b in zip(texts, texts[1:])]
+        hunks = manifestmod._composedeltas(len(texts[0]), deltas)
+        return manifestmod._diffhunks(
+            sha1nodeconstants.nodelen, texts[0], hunks
+        )
+
+    def testComposedDeltas(self):
+        files = {
+            b'a': (BIN_HASH_1, b''),
+            b'b/c': (BIN_HASH_2, b'l'),
+            b'b/d': (BIN_HASH_3, b''),
+            b'e': (BIN_HASH_1, b'x'),
+        }
+        steps = [
+            {b'b/c': (BIN_HASH_1, b'l')},
+            {b'f': (BIN_HASH_2, b'')},
+            {b'a': None, b'b/d': (BIN_HASH_3, b'x')},
+            {b'b/c': (BIN_HASH_2, b'l'), b'0': (BIN_HASH_1, b'')},
+        ]
+        manifests = [self._manifest(files)]
+        for step in steps:
+            files = dict(files)
+            for f, v in step.items():
+                if v is None:
+                    del files[f]
+                else:
+                    files[f] = v
+            manifests.append(self._manifest(files))
+        texts = [bytes(m.text()) for m in manifests]
+        for i in range(len(texts)):
+            for j in range(i, len(texts)):
+                expected = manifests[i].diff(manifests[j])
+                self.assertEqual(expected, self._chaindiff(texts[i : j + 1]))
+
+    def testUnalignedDelta(self):
+        text = A_SHORT_MANIFEST
+        hunks = [(1, 2, b'x')]
+        self.assertIsNone(
+            manifestmod._diffhunks(sha1nodeconstants.nodelen, text, hunks)
+        )
+
+
 if __name__ == '__main__':
     silenttestrunner.main(__name__)
@@ -0,0 +1,76 @@
+Test the block cache of the revlog data files
+
+  $ cat > gen.py << EOF
+  > import random, sys
+  > r = random.Random(int(sys.argv[1]))
+  > for i in range(400):
+  >     print('%032x' % r.getrandbits(128))
+  > EOF
+
+  $ cat > interleaved.py << EOF
+  > from mercurial import registrar
+  > cmdtable = {}
+  > command = registrar.command(cmdtable)
+  > @command(b'debuginterleaved', [], b'')
+  > def debuginterleaved(ui, repo):
+  >     rl = repo.file(b'f')._revlog
+  >     for i in range(10):
+  >         for r in (0, len(rl) - 1):
+  >             rl._inner.get_segment_for_revs(r, r)
+  >     st = rl._inner._segmentfile.read_stats()
+  >     for k in (b'requests', b'cache-hits', b'cache-misses'):
+  >         ui.write(b'%s: %d\n' % (k, st[k]))
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 20`; do
+  >   "$PYTHON" ../gen.py $i > f
+  >   hg commit -qAm $i
+  > done
+  $ ls .hg/store/data/f.*
+  .hg/store/data/f.d
+  .hg/store/data/f.i
+
+  $ cat >> $HGRCPATH << EOF
+  > [extensions]
+  > interleaved = $TESTTMP/interleaved.py
+  > [format]
+  > chunkcachesize = 4096
+  > EOF
+
+Alternating between two distant revisions throws away the single cached window
+
+  $ hg debuginterleaved
+  requests: 20
+  cache-hits: 0
+  cache-misses: 20
+
+The block cache keeps both
+
+  $ hg debuginterleaved --config storage.revlog.block-cache.size=1MB
+  requests: 20
+  cache-hits: 18
+  cache-misses: 2
+
+Including when it is shared with the other revlogs
+
+  $ hg debuginterleaved --config storage.revlog.block-cache.size=1MB \
+  >   --config storage.revlog.block-cache.shared=yes
+  requests: 20
+  cache-hits: 18
+  cache-misses: 2
+
+A cache too small for the data does not flush itself on large reads
+
+  $ hg debuginterleaved --config storage.revlog.block-cache.size=16KB
+  requests: 20
+  cache-hits: 0
+  cache-misses: 20
+
+The content is the same with or without the cache
+
+  $ hg log -p > window.out
+  $ hg log -p --config storage.revlog.block-cache.size=1MB > blocks.out
+  $ cmp window.out blocks.out
+  $ hg verify -q --config storage.revlog.block-cache.size=64KB
@@ -0,0 +1,60 @@
+Test reading the revlog data files through a memory mapping
+
+  $ cat >> $HGRCPATH << EOF
+  > [storage]
+  > revlog.mmap.data = yes
+  > EOF
+
+  $ cat > readstats.py << EOF
+  > from mercurial import registrar
+  > cmdtable = {}
+  > command = registrar.command(cmdtable)
+  > def show(ui, repo):
+  >     rl = repo.file(b'big')._revlog
+  >     for r in rl:
+  >         rl.revision(r)
+  >     st = rl._inner._segmentfile.read_stats()
+  >     ui.write(b'requests: %d\n' % st[b'requests'])
+  >     safe = rl.opener.is_mmap_safe(rl._datafile)
+  >     ui.write(b'mapped if safe: %d\n' % ((st[b'mapped-bytes'] > 0) == safe))
+  > @command(b'debugreadstats', [], b'')
+  > def debugreadstats(ui, repo):
+  >     show(ui, repo)
+  >     # append to the data file while it is mapped
+  >     with repo.wlock(), repo.lock():
+  >         repo.wvfs.append(b'big', b'appended\n')
+  >         repo.commit(b'appended', user=b'test', date=b'0 0')
+  >     show(ui, repo)
+  > EOF
+
+  $ cat > gen.py << EOF
+  > import random, sys
+  > r = random.Random(int(sys.argv[1]))
+  > for i in range(10000):
+  >     print('%032x' % r.getrandbits(128))
+  > EOF
+  $ hg init repo
+  $ cd repo
+  $ "$PYTHON" ../gen.py 1 > big
+  $ hg commit -qAm 'big file'
+  $ "$PYTHON" ../gen.py 2 > big
+  $ hg commit -qm 'rewritten'
+  $ ls .hg/store/data/big.*
+  .hg/store/data/big.d
+  .hg/store/data/big.i
+
+The data file is mapped, and remapped after an append, unless the file system
+is not known to be safe to map.
+
+  $ hg debugreadstats --config extensions.readstats=../readstats.py
+  requests: 2
+  mapped if safe: 1
+  requests: 3
+  mapped if safe: 1
+
+The content is the same with and without the mapping
+
+  $ hg log -p > mapped.out
+  $ hg log -p --config storage.revlog.mmap.data=no > read.out
+  $ cmp mapped.out read.out
+  $ hg verify -q
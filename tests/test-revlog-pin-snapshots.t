@@ -0,0 +1,131 @@
+Test pinning snapshots in the revlogs read through long delta chains
+
+  $ cat > gen.py << EOF
+  > import sys
+  > rev = int(sys.argv[1])
+  > for i in range(200):
+  >     print('line %d %d' % (i, rev if i == rev % 200 else 0))
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 20`; do
+  >   "$PYTHON" ../gen.py $i > f
+  >   cp f g
+  >   hg commit -qAm $i
+  > done
+  $ hg debugdeltachain f -T '{rev} {chainlen} {deltatype}\n' | tail -2
+  18 19 p1
+  19 20 p1
+
+Without the option, nothing is tracked
+
+  $ hg cat -r tip f > /dev/null
+  $ ls .hg/cache/hot-chains-v1
+  ls: cannot access '.hg/cache/hot-chains-v1': $ENOENT$
+  [2]
+
+  $ cat >> .hg/hgrc << EOF
+  > [storage]
+  > revlog.pin-snapshots.chain-length = 5
+  > revlog.pin-snapshots.min-reads = 2
+  > EOF
+
+The reads through long chains are recorded, a revlog is pinned once it has
+been read often enough
+
+  $ hg cat -r tip f > /dev/null
+  $ hg cat -r tip g > /dev/null
+  $ hg cat -r 2 f > /dev/null
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  0 1 19 data/f
+  0 1 19 data/g
+  $ hg cat -r tip f > /dev/null
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  1 2 19 data/f
+  0 1 19 data/g
+
+New revisions of the pinned revlog get snapshots to bound their chain length
+
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 21 30`; do
+  >   "$PYTHON" ../gen.py $i > f
+  >   hg commit -qm $i
+  > done
+  $ hg debugdeltachain f -T '{rev} {chainlen} {deltatype}\n' | tail -10
+  20 2 snap
+  21 3 p1
+  22 4 p1
+  23 5 p1
+  24 6 p1
+  25 2 snap
+  26 3 p1
+  27 4 p1
+  28 5 p1
+  29 6 p1
+  $ hg debugdeltachain g -T '{rev} {chainlen} {deltatype}\n' | tail -1
+  19 20 p1
+
+The pinned revlogs are limited by the budget
+
+  $ hg cat -r tip g > /dev/null --config storage.revlog.pin-snapshots.budget=1
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  0 2 19 data/f
+  0 2 19 data/g
+
+  $ hg verify -q
+
+hgweb keeps its repositories open, the reads are recorded once each response
+has been sent
+
+  $ rm .hg/cache/hot-chains-v1
+  $ hg serve -p $HGPORT -d --pid-file=$TESTTMP/hg.pid
+  $ cat $TESTTMP/hg.pid >> $DAEMON_PIDS
+  $ get-with-headers.py --headeronly $LOCALIP:$HGPORT 'raw-file/tip/g'
+  200 Script output follows
+  $ $RUNTESTDIR/testlib/wait-on-file 10 .hg/cache/hot-chains-v1
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  0 1 19 data/g
+  $ killdaemons.py
+
+The existing revisions of the pinned revlogs are rewritten with bounded chains
+in repositories using revlog-v2
+
+  $ cd ..
+  $ hg init v2 --config experimental.revlogv2=enable-unstable-format-and-corrupt-my-data
+  $ cd v2
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 20`; do
+  >   "$PYTHON" ../gen.py $i > f
+  >   cp f g
+  >   hg commit -qAm $i
+  > done
+  $ hg debug-optimize-revlogs --hot-chains
+  abort: storage.revlog.pin-snapshots.chain-length is not set
+  [255]
+  $ cat >> .hg/hgrc << EOF
+  > [storage]
+  > revlog.pin-snapshots.chain-length = 5
+  > revlog.pin-snapshots.min-reads = 2
+  > EOF
+  $ hg cat -r tip f > /dev/null
+  $ hg cat -r tip f > /dev/null
+  $ hg cat -r tip g > /dev/null
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  1 2 19 data/f
+  0 1 19 data/g
+  $ hg debug-optimize-revlogs --hot-chains -v
+  f: rewritten
+  rewrote 1 pinned revlogs
+  $ cat .hg/cache/hot-chains-v1 | grep data/
+  1 2 0 data/f
+  0 1 19 data/g
+  $ hg debugdeltachain f -T '{chainlen}\n' | sort -n | tail -1
+  6
+  $ hg debugdeltachain g -T '{chainlen}\n' | sort -n | tail -1
+  20
+
+Nothing is left to rewrite until long chains are read again
+
+  $ hg debug-optimize-revlogs --hot-chains
+  rewrote 0 pinned revlogs
+  $ hg verify -q
+  $ hg cat -r tip f | cmp - f
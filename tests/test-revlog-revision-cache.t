@@ -0,0 +1,58 @@
+Test the revision cache shared by the revlogs of a process
+
+  $ cat > readtwice.py << EOF
+  > from mercurial import registrar
+  > cmdtable = {}
+  > command = registrar.command(cmdtable)
+  > @command(b'debugreadtwice', [], b'')
+  > def debugreadtwice(ui, repo):
+  >     for i in range(2):
+  >         # a new revlog object every time, as hgweb does
+  >         fl = repo.file(b'f')
+  >         texts = [fl.revision(r) for r in fl]
+  >         ui.write(b'%d texts, %d bytes\n' % (len(texts), sum(map(len, texts))))
+  >     inner = fl._revlog._inner
+  >     cache = inner._revision_cache
+  >     if cache is not None:
+  >         stats = cache.stats(inner.revision_cache_owner)
+  >         for k, v in sorted(stats.items()):
+  >             ui.write(b'%s: %d\n' % (k, v))
+  > EOF
+  $ cat >> $HGRCPATH << EOF
+  > [extensions]
+  > readtwice = $TESTTMP/readtwice.py
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `"$PYTHON" $TESTDIR/seq.py 10`; do
+  >   "$PYTHON" $TESTDIR/seq.py $i 100 > f
+  >   hg commit -qAm $i
+  > done
+
+  $ hg debugreadtwice
+  10 texts, 2830 bytes
+  10 texts, 2830 bytes
+
+The second pass is served from the cache
+
+  $ hg debugreadtwice --config storage.revlog.revision-cache.size=1MB
+  10 texts, 2830 bytes
+  10 texts, 2830 bytes
+  revision-cache-hits: 10
+  revision-cache-misses: 10
+  revision-cache-size: 2830
+
+A revlog only uses a slice of the budget
+
+  $ hg debugreadtwice --config storage.revlog.revision-cache.size=2KB
+  10 texts, 2830 bytes
+  10 texts, 2830 bytes
+  revision-cache-hits: 0
+  revision-cache-misses: 20
+  revision-cache-size: 274
+
+  $ hg log -p > uncached.out
+  $ hg log -p --config storage.revlog.revision-cache.size=1MB > cached.out
+  $ cmp uncached.out cached.out
+  $ hg verify -q --config storage.revlog.revision-cache.size=1MB
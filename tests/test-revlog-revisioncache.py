@@ -0,0 +1,109 @@
+import unittest
+
+import silenttestrunner
+
+from mercurial.revlogutils import revisioncache
+
+
+class testrevisioncache(unittest.TestCase):
+    def testsimple(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'n1', b'x' * 50, 1)
+        c.insert(b'b', b'n1', b'y' * 50, 1)
+        self.assertEqual(len(c), 2)
+        self.assertEqual(c.totalcost, 100)
+        self.assertEqual(c.get(b'a', b'n1'), b'x' * 50)
+        self.assertEqual(c.get(b'b', b'n1'), b'y' * 50)
+        self.assertIsNone(c.get(b'a', b'n2'))
+        self.assertEqual(
+            c.stats(b'a'),
+            {
+                b'revision-cache-hits': 1,
+                b'revision-cache-misses': 1,
+                b'revision-cache-size': 50,
+            },
+        )
+
+    def testtoolarge(self):
+        c = revisioncache.revisioncache(400)
+        # larger than the slice of a revlog
+        c.insert(b'a', b'n1', b'x' * 101, 1)
+        self.assertEqual(len(c), 0)
+        self.assertIsNone(c.get(b'a', b'n1'))
+
+    def testslice(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'n1', b'x' * 60, 10)
+        c.insert(b'a', b'n2', b'x' * 30, 1)
+        c.insert(b'b', b'n1', b'y' * 60, 1)
+        # the revlog is over its slice, its cheapest text is evicted even
+        # if the other revlog has a cheaper one
+        c.insert(b'a', b'n3', b'x' * 30, 5)
+        self.assertIsNone(c.get(b'a', b'n2'))
+        self.assertIsNotNone(c.get(b'a', b'n1'))
+        self.assertIsNotNone(c.get(b'a', b'n3'))
+        self.assertIsNotNone(c.get(b'b', b'n1'))
+        self.assertEqual(c.totalcost, 150)
+
+    def testcostbenefit(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'long', b'x' * 100, 50)
+        c.insert(b'b', b'short', b'x' * 100, 1)
+        c.insert(b'c', b'medium', b'x' * 100, 10)
+        c.insert(b'd', b'n1', b'x' * 100, 20)
+        # the text with the shortest chain is evicted first
+        c.insert(b'e', b'n1', b'x' * 100, 20)
+        self.assertIsNone(c.get(b'b', b'short'))
+        # then the medium one, as it is not used
+        c.insert(b'f', b'n1', b'x' * 100, 20)
+        self.assertIsNone(c.get(b'c', b'medium'))
+        self.assertIsNotNone(c.get(b'a', b'long'))
+        self.assertEqual(c.totalcost, 400)
+
+    def testaging(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'long', b'x' * 100, 20)
+        for i in range(40):
+            # texts with a short chain evict each other and raise the
+            # priority of the new entries, until the unused long chain is
+            # the cheapest entry
+            c.insert(b'b%d' % i, b'n1', b'x' * 100, 3)
+        self.assertIsNone(c.get(b'a', b'long'))
+        self.assertEqual(c.totalcost, 400)
+
+    def testclearowner(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'n1', b'x' * 50, 1)
+        c.insert(b'a', b'n2', b'x' * 50, 1)
+        c.insert(b'b', b'n1', b'y' * 50, 1)
+        c.clear_owner(b'a')
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.totalcost, 50)
+        self.assertIsNone(c.get(b'a', b'n1'))
+        self.assertEqual(c.stats(b'a')[b'revision-cache-size'], 0)
+        # the cache is still usable
+        c.insert(b'a', b'n1', b'x' * 50, 1)
+        self.assertEqual(c.get(b'a', b'n1'), b'x' * 50)
+
+    def testmanyhits(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'n1', b'x' * 50, 1)
+        for i in range(10000):
+            c.get(b'a', b'n1')
+        # outdated priorities do not accumulate
+        self.assertLess(len(c._heap), 2000)
+        self.assertEqual(c.stats(b'a')[b'revision-cache-hits'], 10000)
+
+    def testmanyowners(self):
+        c = revisioncache.revisioncache(400)
+        c.insert(b'a', b'n1', b'x' * 50, 1)
+        for i in range(10000):
+            c.get(b'b%d' % i, b'n1')
+        # the revlogs without entries are forgotten
+        self.assertLessEqual(len(c._owners), revisioncache._MIN_OWNERS)
+        self.assertEqual(c.get(b'a', b'n1'), b'x' * 50)
+        self.assertEqual(c.stats(b'a')[b'revision-cache-hits'], 1)
+
+
+if __name__ == '__main__':
+    silenttestrunner.main(__name__)
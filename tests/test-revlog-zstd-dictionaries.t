@@ -0,0 +1,101 @@
+#require zstd no-reposimplestore
+
+Compress revlog chunks with trained zstd dictionaries
+=====================================================
+
+  $ cat > $TESTTMP/gen.py <<EOF
+  > import random, sys
+  > seed, count = int(sys.argv[1]), int(sys.argv[2])
+  > random.seed(seed)
+  > words = [b'def', b'return', b'self', b'import', b'class', b'for', b'in',
+  >          b'if', b'else', b'value', b'data', b'node', b'revlog', b'None']
+  > for i in range(count):
+  >     with open('f%d.py' % i, 'ab') as f:
+  >         for l in range(random.randint(2, 12)):
+  >             line = b' '.join(random.choice(words) for _ in range(8))
+  >             f.write(b'    ' + line + b'\n')
+  > EOF
+
+  $ hg init repo --config format.revlog-compression=zstd
+  $ cd repo
+  $ "$PYTHON" $TESTTMP/gen.py 0 60
+  $ hg commit -qAm base
+  $ for i in 1 2 3; do
+  >   "$PYTHON" $TESTTMP/gen.py $i 60
+  >   hg commit -qm "commit $i"
+  > done
+
+Training reports the gain of the dictionaries, classes with too few samples
+are skipped
+
+  $ hg debug-train-zstd-dictionaries --size 2048 --samples 200 --dry-run -v
+  skipping class changelog: cannot train dict: Src size is incorrect
+  skipping class manifest: cannot train dict: Src size is incorrect
+  file:py: 200 samples, \d+ bytes, \d+ compressed, \d+ with dictionary (re)
+    decompression: *s, *s with dictionary (glob)
+  $ hg debugrequires | grep zstd
+  revlog-compression-zstd
+  $ hg debug-train-zstd-dictionaries --size 2048 --samples 200
+  file:py: 200 samples, \d+ bytes, \d+ compressed, \d+ with dictionary (re)
+  1 dictionaries added
+  $ hg debugrequires | grep zstd
+  exp-zstd-dictionaries
+  revlog-compression-zstd
+  $ ls .hg/store | grep zstd
+  zstd-dictionaries
+
+New chunks are compressed with the dictionary of their class
+
+  $ "$PYTHON" $TESTTMP/gen.py 4 70
+  $ hg commit -qAm "commit 4"
+  $ hg verify -q
+  $ mv .hg/store/zstd-dictionaries $TESTTMP/
+  $ hg cat f65.py
+  abort: revlog decompress error: unknown zstd dictionary: * (glob)
+  [50]
+  $ mv $TESTTMP/zstd-dictionaries .hg/store/
+
+Existing chunks can be recompressed by an upgrade
+
+  $ hg debugupgraderepo --optimize re-delta-all --run --quiet --no-backup
+  upgrade will perform the following actions:
+  
+  requirements
+     preserved: * (glob)
+  
+  optimisations: re-delta-all
+  
+  processed revlogs:
+    - all-filelogs
+    - changelog
+    - manifest
+  
+  $ hg debugrequires | grep zstd
+  exp-zstd-dictionaries
+  revlog-compression-zstd
+  $ hg verify -q
+
+A new training keeps the previous dictionaries for the existing chunks
+
+  $ hg debug-train-zstd-dictionaries --size 1024 --samples 100
+  file:py: 100 samples, \d+ bytes, \d+ compressed, \d+ with dictionary (re)
+  1 dictionaries added
+  $ "$PYTHON" $TESTTMP/gen.py 5 80
+  $ hg commit -qAm "commit 5"
+  $ hg verify -q
+
+The dictionaries are part of stream clones
+
+  $ cd ..
+  $ hg clone --stream -q file://`pwd`/repo clone
+  $ ls clone/.hg/store | grep zstd
+  zstd-dictionaries
+  $ hg -R clone verify -q
+
+Dictionaries are only used with zstd compression
+
+  $ hg init zlib --config format.revlog-compression=zlib
+  $ hg -R zlib debug-train-zstd-dictionaries
+  abort: the repository does not use zstd compression
+  (see "hg help config.format.revlog-compression")
+  [255]
@@ -0,0 +1,222 @@
+Test the revset planner and the revset result cache
+
+  $ hg init repo
+  $ cd repo
+  $ for i in 0 1 2 3 4 5; do
+  >   echo $i > a
+  >   hg commit -qAm $i
+  > done
+  $ hg branch -q stable
+  $ for i in 6 7 8; do
+  >   echo $i > a
+  >   hg commit -qm $i
+  > done
+  $ hg phase -p 1
+  $ hg log -G -T '{rev} {branch} {phase}\n'
+  @  8 stable draft
+  |
+  o  7 stable draft
+  |
+  o  6 stable draft
+  |
+  o  5 default draft
+  |
+  o  4 default draft
+  |
+  o  3 default draft
+  |
+  o  2 default draft
+  |
+  o  1 default public
+  |
+  o  0 default public
+  
+
+The planner evaluates the operand of 'and' expected to be the smallest first
+
+  $ hg debugrevspec -s 'draft() and branch(stable)'
+  * set:
+  <filteredset
+    <baseset+ [2, 3, 4, 5, 6, 7, 8]>,
+    <branch 'stable'>>
+  6
+  7
+  8
+  $ hg debugrevspec -s 'draft() and branch(stable)' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <filteredset
+      <fullreposet+ 0:9>,
+      <branch 'stable'>>,
+    <baseset+ [2, 3, 4, 5, 6, 7, 8]>>
+  6
+  7
+  8
+  $ hg debugrevspec -s 'secret() and branch(stable)' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <baseset+ []>,
+    <branch 'stable'>>
+  $ hg debugrevspec -s '(0 or 1 or 2) and draft()' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <baseset [0, 1, 2]>,
+    <baseset+ [2, 3, 4, 5, 6, 7, 8]>>
+  2
+
+The number of ancestors or descendants of a single revision is estimated too
+
+  $ hg debugrevspec -s 'branch(stable) and ::7'
+  * set:
+  <filteredset
+    <generatorsetdesc+>,
+    <branch 'stable'>>
+  6
+  7
+  $ hg debugrevspec -s 'branch(stable) and ::7' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <filteredset
+      <fullreposet+ 0:9>,
+      <branch 'stable'>>,
+    <generatorsetdesc+>>
+  6
+  7
+  $ hg debugrevspec -s 'branch(stable) and ::1' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <generatorsetdesc+>,
+    <branch 'stable'>>
+  $ hg debugrevspec -s 'draft() and descendants(7)'
+  * set:
+  <filteredset
+    <baseset+ [2, 3, 4, 5, 6, 7, 8]>,
+    <generatorsetasc+>>
+  7
+  8
+  $ hg debugrevspec -s 'draft() and descendants(7)' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <generatorsetasc+>,
+    <baseset+ [2, 3, 4, 5, 6, 7, 8]>>
+  7
+  8
+
+'draft() and ancestors(x)' is turned into '_phaseandancestors(draft, x)' by the
+optimizer, its estimate is the smallest of the two: the 7 draft ancestors of 8
+are more than the changesets estimated on the stable branch, which go first
+
+  $ hg debugrevspec -s 'branch(stable) and (draft() and ::8)'
+  * set:
+  <filteredset
+    <filteredset
+      <generatorsetdesc+>>,
+    <branch 'stable'>>
+  6
+  7
+  8
+  $ hg debugrevspec -s 'branch(stable) and (draft() and ::8)' \
+  >   --config experimental.revset.planner=yes
+  * set:
+  <filteredset
+    <filteredset
+      <fullreposet+ 0:9>,
+      <branch 'stable'>>,
+    <filteredset
+      <generatorsetdesc+>>>
+  6
+  7
+  8
+
+The results of the revsets only depending on the changesets are cached
+
+  $ cat > showrevs.py << EOF
+  > from mercurial import registrar
+  > cmdtable = {}
+  > command = registrar.command(cmdtable)
+  > @command(b'showrevs', [(b'', b'first', False, b'')], norepo=False)
+  > def showrevs(ui, repo, *specs, **opts):
+  >     cache = repo._revsetcache
+  >     for spec in specs:
+  >         revs = repo.revs(spec)
+  >         if opts['first']:
+  >             revs = [revs.first()]
+  >         ui.write(b"%s: %s (%d cached)\\n" % (
+  >             spec, b" ".join(b"%d" % r for r in revs), len(cache)
+  >         ))
+  >     for key in cache:
+  >         ui.write(b"%s: %s\\n" % (key[0] or b"unfiltered", key[2][0]))
+  > EOF
+  $ cat >> .hg/hgrc << EOF
+  > [extensions]
+  > showrevs = $TESTTMP/repo/showrevs.py
+  > [experimental]
+  > revset.cache-size = 3
+  > EOF
+
+  $ hg showrevs "::7 - ::2" "::7 - ::2" "user(test) and 3:4" "0 or 8"
+  ::7 - ::2: 3 4 5 6 7 (1 cached)
+  ::7 - ::2: 3 4 5 6 7 (1 cached)
+  user(test) and 3:4: 3 4 (2 cached)
+  0 or 8: 0 8 (3 cached)
+  visible: func
+  visible: andsmally
+  visible: func
+
+Revsets depending on phases, the working copy or names are not cached
+
+  $ hg showrevs "draft()" "." "stable" "0 or ." "heads(tip) and draft()"
+  draft(): 2 3 4 5 6 7 8 (0 cached)
+  .: 8 (0 cached)
+  stable: 8 (0 cached)
+  0 or .: 0 8 (0 cached)
+  heads(tip) and draft(): 8 (0 cached)
+
+Lazy results are cached once they have been fully iterated, taking the first
+revision only does not compute the others
+
+  $ hg showrevs --first "descendants(3)" "user(test)" "desc(3) or desc(4)"
+  descendants(3): 3 (0 cached)
+  user(test): 0 (0 cached)
+  desc(3) or desc(4): 3 (0 cached)
+  $ hg showrevs "::7" "user(test)" "first(::7)" "::7"
+  ::7: 0 1 2 3 4 5 6 7 (1 cached)
+  user(test): 0 1 2 3 4 5 6 7 8 (2 cached)
+  first(::7): 0 (3 cached)
+  ::7: 0 1 2 3 4 5 6 7 (3 cached)
+  visible: func
+  visible: func
+  visible: func
+
+A result read from the cache keeps the order of the original one
+
+  $ hg showrevs "reverse(user(test))" "reverse(user(test))"
+  reverse(user(test)): 8 7 6 5 4 3 2 1 0 (1 cached)
+  reverse(user(test)): 8 7 6 5 4 3 2 1 0 (1 cached)
+  visible: func
+
+The least recently used results are dropped
+
+  $ hg showrevs "::7 - ::2" "roots(all())" "parents(4)" "p1(5)" "p1(5)"
+  ::7 - ::2: 3 4 5 6 7 (1 cached)
+  roots(all()): 0 (2 cached)
+  parents(4): 3 (3 cached)
+  p1(5): 4 (3 cached)
+  p1(5): 4 (3 cached)
+  visible: func
+  visible: func
+  visible: func
+
+The key includes the repository filter
+
+  $ hg showrevs "::7 - ::2" --hidden
+  ::7 - ::2: 3 4 5 6 7 (1 cached)
+  unfiltered: func
+  $ hg showrevs "::7 - ::2" --config experimental.revset.cache-size=0
+  ::7 - ::2: 3 4 5 6 7 (0 cached)
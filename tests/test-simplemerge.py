@@ -389,6 +389,51 @@ bbb
         )
 
 
+class TestChunkedMerge3(TestCase):
+    def assertSameMerge(self, base, a, b):
+        texts = [b''.join(lines) for lines in (base, a, b)]
+        m3 = simplemerge.Merge3Text(*texts)
+        cm3 = simplemerge.ChunkedMerge3Text(*texts)
+        self.assertEqual(
+            list(cm3.find_sync_regions()), list(m3.find_sync_regions())
+        )
+        for render, args in (
+            (simplemerge.render_minimized, (b'A', b'B')),
+            (simplemerge.render_merge3, (b'A', b'B', b'BASE')),
+            (simplemerge.render_mergediff, (b'A', b'B', b'BASE')),
+        ):
+            lines, conflicts = render(m3, *args)
+            clines, cconflicts = render(cm3, *args)
+            self.assertEqual(b''.join(clines), b''.join(lines))
+            self.assertEqual(cconflicts, conflicts)
+
+    def test_merge_poem(self):
+        self.assertSameMerge(TZU, LAO, TAO)
+        self.assertSameMerge(TZU, TAO, LAO)
+
+    def test_no_conflicts(self):
+        self.assertSameMerge(
+            [b'aaa\n', b'bbb\n'],
+            [b'aaa\n', b'111\n', b'bbb\n'],
+            [b'aaa\n', b'bbb\n', b'222\n'],
+        )
+
+    def test_no_trailing_newline(self):
+        self.assertSameMerge([b'a\n', b'b'], [b'a\n', b'c'], [b'a\n', b'd'])
+        self.assertSameMerge([], [b'a'], [b'a'])
+
+    def test_lines(self):
+        text = b'a\nbb\n\nccc'
+        lines = simplemerge._textlines(text)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[1], b'bb\n')
+        self.assertEqual(lines[-1], b'ccc')
+        self.assertEqual(lines[1:3], [b'bb\n', b'\n'])
+        self.assertEqual(lines.chunk(0, 2), b'a\nbb\n')
+        with self.assertRaises(IndexError):
+            lines[4]
+
+
 if __name__ == '__main__':
     import silenttestrunner
 
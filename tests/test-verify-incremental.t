@@ -0,0 +1,109 @@
+#require reporevlogstore
+
+A successful verification records how far each revlog was verified
+
+  $ hg init repo
+  $ cd repo
+  $ echo a > a
+  $ echo b > b
+  $ hg commit -qAm 0
+  $ echo a >> a
+  $ hg commit -qm 1
+  $ hg verify -q
+  $ cat .hg/cache/verify-watermarks-v1
+  2 * 00changelog (glob)
+  2 * 00manifest (glob)
+  2 * data/a (glob)
+  1 * data/b (glob)
+
+Only the new revisions are checked by an incremental verification, including
+changesets reusing a verified manifest and files only referenced by verified
+changesets
+
+  $ echo c > c
+  $ hg copy a a-copy
+  $ hg remove b
+  $ hg commit -qAm 2
+  $ hg commit -q --config ui.allowemptycommit=yes -m empty
+  $ hg verify --incremental
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+  checking dirstate
+  checked 2 changesets with 2 changes to 3 files
+  $ hg verify --incremental
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+  checking dirstate
+  checked 0 changesets with 0 changes to 0 files
+
+A plain verification still checks everything
+
+  $ hg verify
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+  checking dirstate
+  checked 4 changesets with 5 changes to 4 files
+
+Revlogs whose verified revisions changed are checked again
+
+  $ hg --config extensions.strip= strip -q --no-backup -r 2
+  $ hg verify --incremental -v
+  repository uses revlog format 1
+  checking changesets
+  changelog changed since last verification
+  checking manifests
+  manifest changed since last verification
+  crosschecking files in changesets and manifests
+  checking files
+  checking dirstate
+  checked 2 changesets with 0 changes to 2 files
+
+The revisions below the watermark are trusted, only the index entries leading
+to them are checked
+
+  $ echo a >> a
+  $ hg commit -qm 2
+  $ hg verify -q
+  $ cat >> corrupt.py << EOF
+  > import sys
+  > path, offset = sys.argv[1], int(sys.argv[2])
+  > with open(path, 'r+b') as fp:
+  >     fp.seek(offset)
+  >     byte = fp.read(1)
+  >     fp.seek(offset)
+  >     fp.write(bytes([0xff - byte[0]]))
+  > EOF
+
+Damaging the data of a verified revision goes unnoticed
+
+  $ hg debugindex a
+     rev linkrev       nodeid    p1-nodeid    p2-nodeid
+       0       0 b789fdd96dc2 000000000000 000000000000
+       1       1 a80d06849b33 b789fdd96dc2 000000000000
+       2       2 544ee3484b75 a80d06849b33 000000000000
+  $ cp .hg/store/data/a.i a.i.orig
+  $ "$PYTHON" corrupt.py .hg/store/data/a.i 66
+  $ hg verify --incremental -q
+  $ hg verify -q
+   a@0: unpacking b789fdd96dc2: integrity check failed on a:0
+  not checking dirstate because of previous errors
+  1 integrity errors encountered!
+  (first damaged changeset appears to be 0)
+  [1]
+
+Damaging the index entry of a verified revision does not
+
+  $ cp a.i.orig .hg/store/data/a.i
+  $ hg verify -q
+  $ "$PYTHON" corrupt.py .hg/store/data/a.i 100
+  $ hg verify --incremental -q
+   a@?: verified revisions changed since last verification
+  not checking dirstate because of previous errors
+  1 integrity errors encountered!
+  [1]
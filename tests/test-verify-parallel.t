@@ -0,0 +1,55 @@
+#require reporevlogstore no-windows
+
+Checking the filelogs in worker processes gives the same report as the
+sequential verification
+
+  $ cat >> $HGRCPATH << EOF
+  > [worker]
+  > numcpus = 4
+  > EOF
+
+  $ hg init repo
+  $ cd repo
+  $ for i in `$TESTDIR/seq.py 40`; do
+  >   echo "content $i" > file-$i
+  > done
+  $ hg commit -qAm initial
+  $ for i in `$TESTDIR/seq.py 10 20`; do
+  >   echo "more content $i" >> file-$i
+  > done
+  $ hg copy file-1 copied
+  $ hg commit -qm second
+
+  $ hg verify --config experimental.worker.verify=yes
+  checking changesets
+  checking manifests
+  crosschecking files in changesets and manifests
+  checking files
+  checking dirstate
+  checked 2 changesets with 52 changes to 41 files
+
+Break some filelogs
+
+  $ rm .hg/store/data/file-13.i
+  $ cp .hg/store/data/file-15.i .hg/store/data/file-25.i
+  $ hg verify -q
+   warning: revlog 'data/file-13.i' not in fncache!
+   0: empty or missing file-13
+   file-13@0: manifest refers to unknown revision 5ebe09cd9b30
+   file-13@1: manifest refers to unknown revision e92494463b76
+   file-25@0: e9915e7c4926 not in manifests
+   file-25@?: rev 1 points to unexpected changeset 1
+   (expected 0)
+   file-25@?: f05554d51217 not in manifests
+   file-25@0: manifest refers to unknown revision 7fb47fba1011
+  not checking dirstate because of previous errors
+  2 warnings encountered!
+  hint: run "hg debugrebuildfncache" to recover from corrupt fncache
+  7 integrity errors encountered!
+  (first damaged changeset appears to be 0)
+  [1]
+  $ hg verify > ../sequential.out 2>&1
+  [1]
+  $ hg verify --config experimental.worker.verify=yes > ../parallel.out 2>&1
+  [1]
+  $ cmp ../sequential.out ../parallel.out